@@ -0,0 +1,93 @@
+"""
+Compare encode/decode cost and payload size of the wire codecs for a
+typical ping, against the cPickle format nerve used to send.
+
+    $ python bench/bench_codec.py -n 20000
+    $ python bench/bench_codec.py --json > codec.json
+"""
+import json
+import sys
+import timeit
+from cPickle import dumps as pickle_dumps, loads as pickle_loads
+from datetime import datetime
+from optparse import OptionParser
+
+from nerve import codec
+
+
+def sample_ping():
+    return dict(
+        uuid='5f1c0a8e2b3a11e3a1b2001c42c0ffee',
+        center='9c0f7d0a2b3a11e3a1b2001c42c0ffee',
+        uptime=1234.5,
+        state_name='RUNNING',
+        state=20,
+        ping_time=datetime.utcnow(),
+        cmdline='/usr/bin/python worker.py --queue default',
+        create_time=datetime.now(),
+        cpu_percent=3.2,
+        cpu_user=12.34,
+        cpu_system=1.02,
+        ionice_class=0,
+        ionice_value=0,
+        memory_rss=31457280,
+        memory_vms=248512512,
+        memory_percent=0.39,
+        num_threads=4,
+        gid_real=1000,
+        gid_effective=1000,
+        gid_saved=1000,
+        is_running=True,
+        name='python',
+        nice=0,
+        pid=12998,
+        ppid=12990,
+        status=1,
+        terminal='/dev/pts/3',
+        uid_real=1000,
+        uid_effective=1000,
+        uid_saved=1000,
+        username='worker',
+        )
+
+
+def measure(name, dumps, loads, data, number):
+    encoded = dumps(data)
+    encode = timeit.timeit(lambda: dumps(data), number=number)
+    decode = timeit.timeit(lambda: loads(encoded), number=number)
+    return dict(codec=name,
+                bytes=len(encoded),
+                encode_us=encode / number * 1e6,
+                decode_us=decode / number * 1e6)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-n', '--number', dest='number', type='int', default=10000,
+                      help='Iterations per measurement.')
+    parser.add_option('-j', '--json', action='store_true', dest='json', default=False,
+                      help='Print machine readable results.')
+    (options, args) = parser.parse_args()
+
+    data = sample_ping()
+    results = [measure('cPickle (legacy)',
+                       lambda d: pickle_dumps(d), pickle_loads,
+                       data, options.number)]
+    for name in codec.available():
+        results.append(measure(name,
+                               lambda d, name=name: codec.dumps(d, name),
+                               codec.loads, data, options.number))
+
+    if options.json:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+
+    print '%-18s %8s %12s %12s' % ('codec', 'bytes', 'encode us', 'decode us')
+    for r in results:
+        print '%-18s %8d %12.2f %12.2f' % (
+            r['codec'], r['bytes'], r['encode_us'], r['decode_us'])
+
+
+if __name__ == '__main__':
+    main()
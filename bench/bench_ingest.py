@@ -0,0 +1,267 @@
+"""
+Measure how many watchers a center sustains.
+
+Starts a center in a child process with an in-memory table and drives
+it from this one with simulated watchers, each its own DEALER socket
+sending a full 'state' record then deltas and periodic keyframe pings,
+as `Process._report_delta` does.  While they run, a control client
+times queries.  Reports pings/sec, heartbeat round trip percentiles
+(ping sent to the center's reply received), query latency percentiles,
+and CPU and RSS of the center process alone.  The CPU of the load
+generator is reported separately.
+
+    $ python bench/bench_ingest.py -w 2000 -t 30
+    $ python bench/bench_ingest.py -w 2000 --json > ingest.json
+
+Many watchers need a high open file limit, see ulimit -n.
+"""
+import gevent
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zmq.green as zmq
+from collections import deque
+from datetime import datetime
+from optparse import OptionParser
+from uuid import uuid1
+
+import psutil
+
+from nerve import codec
+from nerve.center import Center
+from nerve.client import Control
+from nerve.eventlog import TextLog
+from nerve.table import ProcessTable
+
+
+def percentiles(values, points=(50, 90, 99)):
+    values = sorted(values)
+    result = dict(('p%d' % p, None) for p in points)
+    result['max'] = None
+    if values:
+        for p in points:
+            index = min(len(values) - 1, int(len(values) * p / 100.0))
+            result['p%d' % p] = values[index] * 1000
+        result['max'] = values[-1] * 1000
+    return result
+
+
+class Watcher(object):
+    """
+    One simulated watcher speaking the process protocol.
+    """
+
+    def __init__(self, context, endpoint, codec_name, interval,
+                 keyframe_interval, stats):
+        self.socket = context.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(endpoint)
+        self.codec = codec_name
+        self.interval = interval
+        self.keyframe_interval = keyframe_interval
+        self.stats = stats
+        self.sent = deque()
+        self.keyframe = False
+        self.row = dict(
+            uuid=uuid1().hex,
+            state=20,
+            state_name='RUNNING',
+            pid=random.randint(2, 65535),
+            username=random.choice(('bob', 'sue', 'www', 'worker')),
+            cmdline='/usr/bin/python worker.py',
+            cpu_percent=0.0,
+            memory_rss=31457280,
+            memory_percent=.39,
+            num_threads=4,
+            uptime=0.0,
+            )
+
+    def _send(self, op, data):
+        self.sent.append(time.time())
+        self.socket.send_multipart(['', 'process', op, codec.dumps(data, self.codec)])
+
+    def run(self):
+        gevent.spawn(self._recv)
+        # spread the watchers over the interval
+        gevent.sleep(random.random() * self.interval)
+        self._send('state', dict(self.row, ping_time=datetime.utcnow()))
+        deltas = 0
+        while True:
+            gevent.sleep(self.interval)
+            self.row['cpu_percent'] = round(random.random() * 100, 1)
+            self.row['uptime'] += self.interval
+            if deltas >= self.keyframe_interval or self.keyframe:
+                deltas = 0
+                self.keyframe = False
+                self._send('ping', dict(self.row, ping_time=datetime.utcnow()))
+            else:
+                deltas += 1
+                self._send('delta', dict(uuid=self.row['uuid'],
+                                         cpu_percent=self.row['cpu_percent'],
+                                         uptime=self.row['uptime'],
+                                         ping_time=datetime.utcnow()))
+
+    def _recv(self):
+        while True:
+            msg = self.socket.recv_multipart()
+            if msg[1] == 'keyframe':
+                self.keyframe = True
+            if msg[1] in ('center', 'keyframe') and self.sent:
+                self.stats.reply(time.time() - self.sent.popleft())
+
+
+class Stats(object):
+
+    def __init__(self):
+        self.recording = False
+        self.replies = 0
+        self.latencies = []
+        self.queries = []
+
+    def reply(self, latency):
+        if self.recording:
+            self.replies += 1
+            self.latencies.append(latency)
+
+    def query(self, latency):
+        if self.recording:
+            self.queries.append(latency)
+
+
+def query_load(controlpoint, stats, interval):
+    control = Control(controlpoint)
+    select = ('uuid', 'pid', 'cpu_percent')
+    where = [('username', '=', 'bob'), ('cpu_percent', '>=', 50)]
+    while True:
+        started = time.time()
+        keys, rows = control.query(select, where)
+        for row in rows:
+            pass
+        stats.query(time.time() - started)
+        gevent.sleep(interval)
+
+
+def serve(tmp):
+    gevent.reinit()
+    center = Center(None, 'bench', 'ipc://%s/center.sock' % tmp,
+                    'ipc://%s/control.sock' % tmp, 'ipc://%s/sync.sock' % tmp,
+                    None, TextLog(open(os.devnull, 'w')),
+                    table=ProcessTable(), accept=codec.SAFE)
+    center.start()
+
+
+def cpu_seconds(process):
+    times = process.cpu_times()
+    return times.user + times.system
+
+
+def run(options):
+    tmp = tempfile.mkdtemp(prefix='nrv-bench-')
+    # the center gets its own process, so its cost is measured apart
+    # from the simulated watchers
+    server = multiprocessing.Process(target=serve, args=(tmp,))
+    server.daemon = True
+    server.start()
+    try:
+        endpoint = 'ipc://%s/center.sock' % tmp
+        controlpoint = 'ipc://%s/control.sock' % tmp
+
+        context = zmq.Context()
+        context.set(zmq.MAX_SOCKETS, options.watchers + 64)
+        stats = Stats()
+        watchers = [Watcher(context, endpoint, options.codec, options.interval,
+                            options.keyframe_interval, stats)
+                    for _ in xrange(options.watchers)]
+        for watcher in watchers:
+            gevent.spawn(watcher.run)
+        if options.query_interval > 0:
+            gevent.spawn(query_load, controlpoint, stats, options.query_interval)
+
+        gevent.sleep(options.warmup)
+        center = psutil.Process(server.pid)
+        me = psutil.Process(os.getpid())
+        cpu, driver_cpu = cpu_seconds(center), cpu_seconds(me)
+        started = time.time()
+        stats.recording = True
+        gevent.sleep(options.seconds)
+        stats.recording = False
+        elapsed = time.time() - started
+        used = cpu_seconds(center) - cpu
+        driver_used = cpu_seconds(me) - driver_cpu
+        memory = (center.memory_info() if hasattr(center, 'memory_info')
+                  else center.get_memory_info())
+        rows = Control(controlpoint).request('stats')['table']['rows']
+
+        return dict(
+            version=open(os.path.join(os.path.dirname(__file__), '..',
+                                      'VERSION')).read().strip(),
+            watchers=options.watchers,
+            interval=options.interval,
+            codec=options.codec,
+            seconds=elapsed,
+            pings_per_sec=stats.replies / elapsed,
+            expected_per_sec=options.watchers / options.interval,
+            heartbeat_ms=percentiles(stats.latencies),
+            queries=len(stats.queries),
+            query_ms=percentiles(stats.queries),
+            rows=rows,
+            cpu_percent=used / elapsed * 100,
+            rss_bytes=memory.rss,
+            driver_cpu_percent=driver_used / elapsed * 100,
+            )
+    finally:
+        server.terminate()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-w', '--watchers', dest='watchers', type='int', default=1000,
+                      help='Number of simulated watchers.')
+    parser.add_option('-i', '--interval', dest='interval', type='float', default=1.0,
+                      help='Seconds between pings from each watcher.')
+    parser.add_option('-k', '--keyframe-interval', dest='keyframe_interval', type='int',
+                      default=30, help='Deltas between full pings.')
+    parser.add_option('-t', '--seconds', dest='seconds', type='float', default=10,
+                      help='Seconds to measure for.')
+    parser.add_option('-W', '--warmup', dest='warmup', type='float', default=2,
+                      help='Seconds to run before measuring.')
+    parser.add_option('-q', '--query-interval', dest='query_interval', type='float',
+                      default=.1, help='Seconds between control queries, 0 for none.')
+    parser.add_option('-C', '--codec', dest='codec', default=codec.DEFAULT,
+                      help='Wire codec the watchers use (%s).' % ', '.join(codec.available()))
+    parser.add_option('-j', '--json', action='store_true', dest='json', default=False,
+                      help='Print machine readable results.')
+    (options, args) = parser.parse_args()
+
+    result = run(options)
+    if options.json:
+        json.dump(result, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+        return
+
+    print 'watchers          %d every %.1fs (%s)' % (
+        result['watchers'], result['interval'], result['codec'])
+    print 'pings/sec         %.0f of %.0f' % (
+        result['pings_per_sec'], result['expected_per_sec'])
+    for name in ('heartbeat_ms', 'query_ms'):
+        p = result[name]
+        if p['p50'] is None:
+            print '%-17s none' % name
+        else:
+            print '%-17s p50 %.2f  p90 %.2f  p99 %.2f  max %.2f' % (
+                name, p['p50'], p['p90'], p['p99'], p['max'])
+    print 'queries           %d' % result['queries']
+    print 'rows              %d' % result['rows']
+    print 'center cpu        %.0f%%' % result['cpu_percent']
+    print 'center rss        %.1f MB' % (result['rss_bytes'] / 1048576.0)
+    print 'load cpu          %.0f%%' % result['driver_cpu_percent']
+
+
+if __name__ == '__main__':
+    main()
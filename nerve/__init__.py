@@ -1,5 +1,6 @@
+from .agent import Agent
 from .center import Center
 from .process import Process
 
 
-__all__ = ['Center', 'Process']
+__all__ = ['Agent', 'Center', 'Process']
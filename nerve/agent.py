@@ -0,0 +1,216 @@
+import gevent
+import logging
+import shlex
+import sys
+import zmq.green as zmq
+from gevent.queue import Queue
+
+from . import codec
+from .process import Process
+
+
+logger = logging.getLogger(__name__)
+
+
+class Link(object):
+    """
+    One process's end of an agent's shared center connection.  It
+    looks enough like a DEALER socket for `Process` to use it as its
+    `io`.
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.inbox = Queue()
+        self.closed = False
+        self.process = None
+
+    def send_multipart(self, frames, **kwargs):
+        self.agent.io.send_multipart(frames, **kwargs)
+
+    def recv_multipart(self):
+        return self.inbox.get()
+
+    def close(self):
+        self.closed = True
+        self.agent.links.discard(self)
+
+
+class Agent(object):
+    """
+    Supervise many programs from one interpreter, sharing a single
+    0mq context and connection to the center.
+    """
+
+    def __init__(self,
+                 programs,
+                 endpoint,
+                 identity=None,
+                 linger=0,
+                 ssh_server=None):
+        self.endpoint = endpoint
+        self.context = zmq.Context()
+        self.io = self.context.socket(zmq.DEALER)
+        if identity is not None:
+            self.io.setsockopt(zmq.IDENTITY, identity)
+
+        if ssh_server is not None:
+            from zmq import ssh
+            self.tunnel = ssh.tunnel_connection(self.io, self.endpoint,
+                                                ssh_server)
+        else:
+            self.io.connect(self.endpoint)
+
+        self.io.setsockopt(zmq.LINGER, linger)
+
+        self.links = set()
+        self.processes = []
+        for args, kwargs in programs:
+            self.add(args, **kwargs)
+
+    def add(self, args, **kwargs):
+        link = Link(self)
+        link.process = process = Process(args,
+                                         nrv_endpoint=self.endpoint,
+                                         nrv_link=link,
+                                         **kwargs)
+        self.links.add(link)
+        self.processes.append(process)
+        return process
+
+    def start(self):
+        reader = gevent.spawn(self._read)
+        try:
+            gevent.joinall([gevent.spawn(p.start) for p in self.processes])
+        finally:
+            reader.kill()
+            self.io.close()
+            self.context.term()
+
+    def _read(self):
+        """
+        Hand messages from the center to the processes they name, or
+        to every process if they name none.
+        """
+        links = {} # uuid to link
+        while True:
+            msg = self.io.recv_multipart()
+            targets = msg[3:]
+            if not targets:
+                for link in list(self.links):
+                    link.inbox.put(msg)
+                continue
+            for uuid in targets:
+                link = links.get(uuid)
+                if link is None or link.process.uuid != uuid or link.closed:
+                    # processes get a new uuid each time they start
+                    links = dict((l.process.uuid, l) for l in self.links)
+                    link = links.get(uuid)
+                if link is not None:
+                    link.inbox.put(msg)
+
+
+_autorestart = {'true': True, 'false': False, 'unexpected': 'unexpected'}
+
+
+def read_programs(config, section_prefix='program:'):
+    """
+    Build (args, kwargs) pairs for `Agent` from the ``[program:name]``
+    sections of ConfigParser `config`.
+    """
+    programs = []
+    for section in config.sections():
+        if not section.startswith(section_prefix):
+            continue
+
+        get = lambda o, d=None: (config.get(section, o)
+                                 if config.has_option(section, o) else d)
+        args = shlex.split(get('command', ''))
+        if not args:
+            raise ValueError('%s has no command' % section)
+
+        kwargs = dict(
+            cwd=get('cwd'),
+            nrv_autorestart=_autorestart[get('autorestart', 'false').lower()],
+            nrv_restart_retries=int(get('restart-retries', 3)),
+            nrv_startsecs=float(get('startsecs', 1)),
+            nrv_backoff=float(get('backoff', 1)),
+            nrv_backoff_max=float(get('backoff-max', 60)),
+            nrv_backoff_jitter=float(get('backoff-jitter', .5)),
+            nrv_restart_window=float(get('restart-window', 300)),
+            nrv_restart_budget=int(get('restart-budget', 10)),
+            nrv_exitcodes=[int(c) for c in get('exitcodes', '0,2').split(',')],
+            nrv_send_all=get('send-all', 'false').lower() == 'true',
+            nrv_ping_interval=float(get('ping-interval', 3.0)),
+            nrv_ping_interval_max=float(get('ping-interval-max', 10.0)),
+            nrv_ping_change=float(get('ping-change', .2)),
+            nrv_keyframe_interval=int(get('keyframe-interval', 30)),
+            nrv_wait_to_die=int(get('wait-to-die', 3)),
+            nrv_codec=get('codec', codec.DEFAULT),
+            nrv_output_queue=int(get('output-queue', 64)),
+            nrv_output_policy=get('output-policy', 'block'),
+            )
+        fields = get('fields')
+        if fields:
+            kwargs['nrv_sample_fields'] = fields.split(',')
+        programs.append((args, kwargs))
+    return programs
+
+
+def main():
+    import argparse
+    import ConfigParser
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        'config',
+        help='Config file with an [agent] section and [program:name] sections.')
+
+    parser.add_argument(
+        '-e', '--endpoint',
+        dest='endpoint',
+        default=None,
+        help='Specify center endpoint, overrides the config file.')
+
+    parser.add_argument(
+        '-d', '--debug',
+        action='store_true',
+        dest='debug',
+        default=False,
+        help='Debug on unhandled error.')
+
+    args = parser.parse_args()
+
+    config = ConfigParser.ConfigParser()
+    if not config.read(args.config):
+        sys.exit('cannot read %s' % args.config)
+
+    options = {}
+    if config.has_section('agent'):
+        options = dict(config.items('agent'))
+
+    agent = Agent(
+        read_programs(config),
+        args.endpoint or options.get('endpoint', 'ipc://zerovisor.sock'),
+        identity=options.get('identity'),
+        linger=int(options.get('linger', 1)),
+        ssh_server=options.get('ssh-server'),
+        )
+
+    g = gevent.spawn(agent.start)
+    try:
+        g.join()
+    except KeyboardInterrupt:
+        g.kill()
+        gevent.joinall([gevent.spawn(p.terminate)
+                        for p in agent.processes if p.process])
+    except Exception:
+        if args.debug:
+            import pdb; pdb.pm()
+        else:
+            raise
+
+
+if __name__ == '__main__':
+    main()
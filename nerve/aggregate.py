@@ -0,0 +1,53 @@
+import logging
+from cliff.lister import Lister
+
+from .query import parse_where
+
+
+def parse_aggregate(text):
+    """
+    Turn ``sum:memory_rss`` or ``count`` into ``(function, column)``.
+    """
+    function, _, column = text.partition(':')
+    return function, column or None
+
+
+class Aggregate(Lister):
+    """
+    Group processes and aggregate their columns on the center, like
+    "-g username -a sum:memory_rss" or "-g center -a max:cpu_percent -t 20".
+    """
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = Lister.get_parser(self, prog_name)
+        parser.add_argument(
+            '-g', '--group-by', dest='group_by', default='',
+            help='Comma separated columns to group by.',
+            )
+        parser.add_argument(
+            '-a', '--aggregate', dest='aggregates', action='append', default=[],
+            help='FUNCTION:COLUMN to compute per group, one of count, sum, '
+                 'avg, min or max.  Give once per aggregate.  Default is count.',
+            )
+        parser.add_argument(
+            '-W', '--where', dest='where', default=None,
+            help='Only aggregate the processes matching these conditions.',
+            )
+        parser.add_argument(
+            '-t', '--top', dest='top', type=int, default=None,
+            help='Only show this many groups, those with the largest '
+                 'value of the first aggregate.',
+            )
+        return parser
+
+    def take_action(self, parsed_args):
+        args = parsed_args
+        group_by = tuple(n.strip() for n in args.group_by.split(',') if n.strip())
+        aggregates = [parse_aggregate(a) for a in args.aggregates or ['count']]
+        order = 0 if args.top else None
+        control = self.app.control()
+        return control.request(
+            'aggregate', (group_by, aggregates, parse_where(args.where),
+                          order, args.top))
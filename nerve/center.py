@@ -2,22 +2,51 @@ import collections
 import gevent
 import logging
 import sys
+import time
 import zmq.green as zmq
-from cPickle import dumps, loads
-from sqlalchemy.sql import text
+from itertools import chain, count
+from gevent.event import Event
 from uuid import uuid1
 
-from . import db
+from . import codec, db, topics
+from .client import Control, closing
+from .columns import Snapshot, merge, partials
+from .control import ControlServer, pending
+from .eventlog import MAX_NAME, EventLog, TextLog
+from .timeseries import History, TIERS, parse_tiers
+from .lines import OutputStore
+from .metrics import Metrics
+from .query import QueryCache
+from .shard import Partitioning
+from .states import state
+from .sync import Replica
+from .wheel import TimerWheel
+from .table import ProcessTable
+from .writebehind import WriteBehind
 
 
 logger = logging.getLogger(__name__)
 
+# commands whose payload frames are sent as is, [uuid, data]
+raw_commands = ('out', 'err')
 
-class Center(object):
+UNKNOWN = state.to_str[state.UNKNOWN]
+
+# commands watchers send, others are counted together
+process_commands = raw_commands + ('ping', 'state', 'delta', 'return',
+                                   'signal', 'ack')
+
+
+class Center(ControlServer):
     """
     Process event collection.
     """
     synced = False
+    sync_interval = 1    # seconds between deltas sent to the ring
+    sync_batch = 1000    # most rows in one delta
+    digest_interval = 30 # seconds between anti-entropy digests
+    shard_timeout = 5    # seconds to wait for a shard to answer a query
+    snapshot_age = 1     # seconds to reuse a columnar snapshot for rollups
 
     def __init__(self,
                  session,
@@ -26,7 +55,26 @@ class Center(object):
                  controlpoint,
                  syncpoint,
                  ring,
-                 logfile):
+                 logfile,
+                 batch_window=.5,
+                 batch_size=1000,
+                 table=None,
+                 accept=codec.SAFE,
+                 tail_bytes=65536,
+                 tail_streams=10000,
+                 pubpoint=None,
+                 publish_pings=None,
+                 pub_hwm=10000,
+                 buckets=256,
+                 tombstone_ttl=3600,
+                 shards=None,
+                 replicas=2,
+                 lost_after=30,
+                 history_series=None,
+                 history_tiers=TIERS,
+                 history_bytes=64 << 20,
+                 max_report_rate=10000,
+                 router_type=zmq.ROUTER):
 
         self.session = session
         self.name = name
@@ -35,95 +83,695 @@ class Center(object):
         self.syncpoint = syncpoint
         self.logfile = logfile
         self.ring = ring
+        self.table = table
+        self.accept = accept
+        self.pubpoint = pubpoint
+        self.publish_pings = publish_pings
+        self.known = {} # uuid to last state name
+        self.pinged = {} # uuid to when its last ping was published
+        self.routes = {} # uuid to router identity of its watcher
+        self.acks = {}   # (uuid, cmd) to requests waiting for its ack
+        self.lost_after = lost_after
+        self.deadlines = TimerWheel()
+        self.history = None
+        if history_series != 0:
+            self.history = History(tiers=history_tiers, max_series=history_series,
+                                   max_bytes=history_bytes)
+        self.output = OutputStore(tail_bytes, tail_streams)
+        self.followers = {}
+        self.cursors = {}
+        self.queries = QueryCache()
+        self.metrics = Metrics()
+        self.max_report_rate = max_report_rate
+        self.reports = 0 # since the last load measurement
+        self.report_rate = 0
+        self.suggested_interval = 0
+        self.center_reply = self._center_reply()
+        self.snapshot = (None, 0, None) # columns, time taken, Snapshot
+        self.cursor_ids = count()
+        self.replica = Replica(name, buckets, tombstone_ttl)
+
+        # shards maps the names of the other centers sharing the rows
+        # to their (controlpoint, syncpoint)
+        self.shards = shards
+        self.partitions = None
+        if shards:
+            self.partitions = Partitioning(name, shards, buckets, replicas)
+        self.writebehind = None
+        if session is not None:
+            self.writebehind = WriteBehind(session, batch_window, batch_size,
+                                           on_orphan=self._orphaned)
 
         self.context = zmq.Context()
-        self.router = self.context.socket(zmq.ROUTER)
+        # a PAIR when this center is a worker behind a `Front`
+        self.router = self.context.socket(router_type)
         self.router.bind(self.endpoint)
         self.control = self.context.socket(zmq.ROUTER)
         self.control.bind(self.controlpoint)
         self.syncin = self.context.socket(zmq.SUB)
-        self.syncin.setsockopt(zmq.SUBSCRIBE, '')
+        self.syncin.setsockopt(zmq.SUBSCRIBE, '*')
         self.syncin.setsockopt(zmq.SUBSCRIBE, name)
         self.syncin.bind(self.syncpoint)
         self.syncout = self.context.socket(zmq.PUB)
-
-        if ring:
-            for peer in ring.split('.'):
-                self.syncout.connect(peer)
+        self.pub = None
+        if pubpoint:
+            # slow watchers lose events past the high water mark
+            # rather than holding up the center
+            self.pub = self.context.socket(zmq.PUB)
+            self.pub.setsockopt(zmq.SNDHWM, pub_hwm)
+            self.pub.bind(pubpoint)
+
+        self.peers = ring.split(',') if ring else []
+        if shards:
+            self.peers.extend(syncpoint for _, syncpoint in shards.values())
+        for peer in self.peers:
+            self.syncout.connect(peer)
 
     def start(self):
+        if self.writebehind is not None:
+            self.writebehind.start()
         gevent.spawn(self._read_syncin)
+        gevent.spawn(self._sync_out)
         gevent.spawn(self._read_router)
+        gevent.spawn(self._expire_lost)
+        gevent.spawn(self._measure_load)
         controller = gevent.spawn(self._read_control)
         controller.join()
 
     def _log(self, sender, cmd, data):
-        self.logfile.write(repr([sender, cmd, data])+'\n')
-        self.logfile.flush()
+        started = time.time()
+        self.logfile.write(sender, cmd, data)
+        self.metrics.time('log', time.time() - started)
 
     def _update_rows(self, data):
+        started = time.time()
         for row in data:
-            p = db.Process(**row)
-            self.session.merge(p)
-        self.session.commit()
+            self._store_row(row)
+            self.replica.touch(row['uuid'])
+        self.metrics.time('update_rows', time.time() - started)
+
+    def _delete_row(self, uuid):
+        self._remove_row(uuid)
+        self.replica.delete(uuid)
+
+    def _store_row(self, row):
+        if self.table is not None:
+            self.table.upsert(row)
+        if self.writebehind is not None:
+            self.writebehind.add(row)
+
+    def _remove_row(self, uuid):
+        self.deadlines.cancel(uuid)
+        self.known.pop(uuid, None)
+        self.routes.pop(uuid, None)
+        self.pinged.pop(uuid, None)
+        if self.table is not None:
+            self.table.delete(uuid)
+        if self.writebehind is not None:
+            self.writebehind.delete(uuid)
+
+    def _orphaned(self, uuid):
+        # deltas of `uuid` had no row in the database to go over, so
+        # the next one asks its watcher for a keyframe
+        self.known.pop(uuid, None)
+
+    def _row(self, uuid):
+        """
+        Return the whole current row for `uuid`, or None.
+        """
+        if self.table is not None:
+            return self.table.get(uuid)
+        row = {}
+        process = self.session.query(db.Process).get(uuid)
+        if process is not None:
+            row = dict((c.name, getattr(process, c.name))
+                       for c in db.Process.__table__.columns)
+        row.update(self.writebehind.pending.get(uuid, ()))
+        return row or None
+
+    def _alive(self, uuid, sender, data):
+        self.routes[uuid] = sender
+        if self.history is not None:
+            self.history.record(uuid, data)
+        if self.lost_after:
+            self.deadlines.schedule(uuid, time.time() + self.lost_after)
+
+    def _expire_lost(self):
+        """
+        Every tick, move the processes that have not reported for
+        `lost_after` seconds to the UNKNOWN state.
+        """
+        while True:
+            gevent.sleep(self.deadlines.tick)
+            for uuid in self.deadlines.advance():
+                if uuid not in self.known:
+                    continue
+                row = dict(uuid=uuid, state=state.UNKNOWN, state_name=UNKNOWN)
+                self.known[uuid] = row['state_name']
+                self._update_rows([row])
+                self._publish('state', uuid, row)
+
+    def _center_reply(self):
+        return codec.dumps(dict(name=self.name, interval=self.suggested_interval,
+                                max_interval=self._max_interval()))
+
+    def _max_interval(self):
+        # leave room for a few missed pings before UNKNOWN
+        if self.lost_after:
+            return self.lost_after / 3.0
+        return None
+
+    def _measure_load(self):
+        """
+        Every second, work out the ping interval that keeps reports
+        from every known process under `max_report_rate` a second, and
+        longer still if the measured rate is over it.  Watchers ping
+        no more often than the interval in the 'center' reply, and at
+        least every `max_interval`.
+        """
+        while True:
+            gevent.sleep(1)
+            self.report_rate, self.reports = self.reports, 0
+            load = self.report_rate / float(self.max_report_rate)
+            interval = len(self.known) / float(self.max_report_rate) * max(1, load)
+            if self.lost_after:
+                interval = min(interval, self._max_interval())
+            if interval != self.suggested_interval:
+                self.suggested_interval = interval
+                self.center_reply = self._center_reply()
+
+    def _publish(self, kind, uuid, data):
+        """
+        Publish an event to watchers.  Pings are published only if
+        `publish_pings` is set, at most once per that many seconds per
+        process.
+        """
+        if self.pub is None:
+            return
+        if kind == 'ping':
+            if self.publish_pings is None:
+                return
+            now = time.time()
+            if now - self.pinged.get(uuid, 0) < self.publish_pings:
+                return
+            self.pinged[uuid] = now
+        self.pub.send_multipart(
+            [topics.topic(kind, self.name, self.known.get(uuid), uuid),
+             codec.dumps(data)])
+
+    def _stats(self):
+        stats = self.metrics.as_dict()
+        stats['log'] = dict(written=self.logfile.written,
+                            dropped=self.logfile.dropped,
+                            errors=self.logfile.errors,
+                            pending=len(self.logfile.pending),
+                            write=self.logfile.write_times.as_dict())
+        stats['queries'] = dict(cached=len(self.queries.queries),
+                                hits=self.queries.hits,
+                                misses=self.queries.misses)
+        if self.table is not None:
+            stats['table'] = dict(rows=len(self.table))
+        stats['routes'] = len(self.routes)
+        stats['load'] = dict(report_rate=self.report_rate,
+                             suggested_interval=self.suggested_interval)
+        stats['deadlines'] = len(self.deadlines)
+        if self.history is not None:
+            stats['history'] = dict(series=len(self.history),
+                                    max_series=self.history.max_series,
+                                    refused=self.history.refused)
+        if self.writebehind is not None:
+            stats['writebehind'] = self.writebehind.stats.as_dict()
+        stats['sync'] = self.replica.stats()
+        return stats
+
+    # ring sync, messages are [to, cmd, sender, data] where `to` is a
+    # center name or '*' for every peer
 
     def _read_syncin(self):
-        gevent.sleep(.1)
-        self.syncout.send('sync')
         while True:
-            data = None
-            msg = self.syncin.recv()
             try:
-                if msg.startswith(self.name):
-                    data = loads(msg[len(self.name):])
-                else:
-                    data = ([loads(data)])
+                to, cmd, sender, data = self.syncin.recv_multipart()
+                if sender == self.name or to not in ('*', self.name):
+                    continue
+                handler = getattr(self, '_sync_' + cmd, None)
+                if handler is None:
+                    raise ValueError('no such sync command %s' % cmd)
+                handler(sender, codec.loads(data, self.accept))
             except Exception:
-                print 'error syncing'
-                continue
-            if data:
-                print 'syncing ', data
-                self._update_rows(data)
+                logger.exception('error syncing')
+
+    def _send_sync(self, to, cmd, data):
+        self.syncout.send_multipart([to, cmd, self.name, codec.dumps(data)])
+
+    def _send_entries(self, to, uuids):
+        for i in xrange(0, len(uuids), self.sync_batch):
+            entries = self.replica.entries(uuids[i:i + self.sync_batch], self._row)
+            if entries:
+                self._send_sync(to, 'delta', entries)
+
+    def _sync_out(self):
+        """
+        Send changed rows to the ring in batches, and every
+        `digest_interval` seconds expire old tombstones and send
+        digests for peers to check theirs against.
+        """
+        gevent.sleep(.1) # let the peer connections come up
+        last_digest = 0
+        while True:
+            uuids = self.replica.take_dirty(self.sync_batch)
+            now = time.time()
+            if self.partitions is not None:
+                for owner, owned in self._by_owner(uuids).iteritems():
+                    self._send_entries(owner, owned)
+            elif self.peers:
+                self._send_entries('*', uuids)
+            if now - last_digest >= self.digest_interval:
+                self.replica.expire(now)
+                self._send_digests()
+                last_digest = now
+            gevent.sleep(self.sync_interval)
+
+    def _send_digests(self):
+        if self.partitions is not None:
+            # each shard only checks the partitions it shares with us
+            for name in self.partitions.names:
+                if name == self.name:
+                    continue
+                buckets = self.partitions.shared(name)
+                if buckets:
+                    self._send_sync(name, 'digest', self.replica.digest(buckets))
+        elif self.peers:
+            self._send_sync('*', 'digest', self.replica.digest())
+
+    def _by_owner(self, uuids):
+        """
+        Group `uuids` by the other centers owning their partitions.
+        """
+        owners = collections.defaultdict(list)
+        for uuid in uuids:
+            for owner in self.partitions.owners(self.replica.bucket(uuid)):
+                if owner != self.name:
+                    owners[owner].append(uuid)
+        return owners
+
+    def _sync_delta(self, sender, entries):
+        forward = True
+        if self.partitions is not None:
+            # owners get rows straight from the center that has them
+            forward = False
+            owns, bucket = self.partitions.owns, self.replica.bucket
+            entries = [e for e in entries if owns(bucket(e[0]))]
+        for uuid, version, row in self.replica.merge(entries, forward):
+            if row is None:
+                self._remove_row(uuid)
+            else:
+                self._store_row(row)
+
+    def _sync_digest(self, sender, digest):
+        buckets = self.replica.diff(digest)
+        if self.partitions is not None:
+            owners = self.partitions.owners
+            buckets = [b for b in buckets
+                       if self.name in owners(b) and sender in owners(b)]
+        if buckets:
+            self._send_sync(sender, 'versions',
+                            (buckets, self.replica.versions_in(buckets)))
+
+    def _sync_versions(self, sender, data):
+        buckets, remote = data
+        newer, wanted = self.replica.compare(buckets, remote)
+        self._send_entries(sender, newer)
+        if wanted:
+            self._send_sync(sender, 'want', wanted)
+
+    def _sync_want(self, sender, uuids):
+        self._send_entries(sender, uuids)
 
     def _read_router(self):
+        backlog = self.metrics.histogram('router.backlog', scale=1)
+        burst = 0
         while True:
+            # count the messages read without waiting, how far behind
+            # the center is running
+            try:
+                frames = self.router.recv_multipart(zmq.NOBLOCK)
+                burst += 1
+            except zmq.Again:
+                if burst:
+                    backlog.record(burst)
+                    burst = 0
+                frames = self.router.recv_multipart()
+
+            started = time.time()
             try:
-                sender, _, typ, cmd, raw = self.router.recv_multipart()
-                data = loads(raw)
+                sender, _, typ, cmd = frames[:4]
+                if len(cmd) > MAX_NAME:
+                    raise ValueError('command too long')
+                if cmd in raw_commands:
+                    data = frames[4:]
+                    if len(data) != 2:
+                        raise ValueError('expected uuid and data frames')
+                else:
+                    data, = frames[4:]
+                    data = codec.loads(data, self.accept)
             except ValueError:
+                self.metrics.count('router.invalid')
                 continue
             self._log(sender, cmd, data)
-            if typ == 'process':
-                if cmd == 'ping' or cmd == 'state':
-                    self._update_rows([data])
-                    self.router.send_multipart([sender, '', 'center', self.name])
-
-                elif cmd == 'return' or cmd == 'signal':
-                    query = self.session.query(db.Process)
-                    query.filter(db.Process.uuid==data[0]).delete()
-                    self.session.commit()
-            elif typ == 'center':
-                pass
-
-    def _read_control(self):
-        while True:
-            sender, _, cmd, data = self.control.recv_multipart()
-            response = None
             try:
-                if cmd == 'query':
-                    select, where = loads(data)
-                    query = 'SELECT ' + select + ' FROM process'
-                    if where:
-                        query += ' WHERE ' + where
-
-                    result = db.engine.execute(text(query))
-                    response = (result.keys(), list(result))
+                self._route(sender, typ, cmd, data)
+            except Exception:
+                # one bad message must not stop the center reading
+                logger.exception('error routing %s from %r', cmd, sender)
+                self.metrics.count('router.invalid')
+                continue
+            self.metrics.time(
+                'router.' + (cmd if cmd in process_commands else 'other'),
+                time.time() - started)
+
+    def _route(self, sender, typ, cmd, data):
+        if typ == 'process':
+            if cmd in raw_commands:
+                uuid, chunk = data
+                self.output.write(uuid, cmd, chunk)
+                event = self.followers.pop((uuid, cmd), None)
+                if event is not None:
+                    event.set()
+
+            elif cmd == 'ping' or cmd == 'state':
+                self.reports += 1
+                self.known[data['uuid']] = data.get('state_name')
+                self._alive(data['uuid'], sender, data)
+                self._update_rows([data])
+                self._publish(cmd, data['uuid'], data)
+                self.router.send_multipart(
+                    [sender, '', 'center', self.center_reply, data['uuid']])
+
+            elif cmd == 'delta':
+                self.reports += 1
+                if self.known.get(data['uuid'], UNKNOWN) != UNKNOWN:
+                    if 'state_name' in data:
+                        self.known[data['uuid']] = data['state_name']
+                    self._alive(data['uuid'], sender, data)
+                    self._update_rows([data])
+                    self._publish('ping', data['uuid'], data)
+                    self.router.send_multipart(
+                        [sender, '', 'center', self.center_reply, data['uuid']])
                 else:
-                    raise NameError, 'no such command %s' % cmd
-            except Exception, e:
-                response = e
-            finally:
-                self.control.send_multipart([sender, '', dumps(response)])
+                    # no base row to apply it to, or one marked lost
+                    # whose state the delta leaves out, ask for a full one
+                    self.router.send_multipart(
+                        [sender, '', 'keyframe', '', data['uuid']])
+
+            elif cmd == 'return' or cmd == 'signal':
+                self._publish(cmd, data[0], data)
+                self._delete_row(data[0])
+
+            elif cmd == 'ack':
+                self._ack(*data)
+        elif typ == 'center':
+            pass
+
+    # control commands, called with the decoded request and a function
+    # to send the reply.  They return the reply, or `pending` if they
+    # will send it later themselves.
+
+    def _control_query(self, args, reply):
+        select, where, limit = args
+        if self.partitions is not None:
+            gevent.spawn(self._gather, reply, select, where, limit)
+            return pending
+        keys, rows = self._query(select, where)
+        return self._page(reply, keys, rows, limit)
+
+    def _control_shard_query(self, args, reply):
+        select, where, limit, primaries = args
+        keys, rows = self._shard_rows(select, where, primaries)
+        return self._page(reply, keys, rows, limit)
+
+    def _shard_rows(self, select, where, primaries=None):
+        """
+        Run a query for the rows of the partitions this center serves,
+        see `Partitioning.serves`.
+        """
+        select = tuple(select)
+        names = select if 'uuid' in select else select + ('uuid',)
+        at = names.index('uuid')
+        keys, rows = self._query(names, where)
+        serves, bucket = self.partitions.serves, self.replica.bucket
+        rows = (r for r in rows if serves(bucket(r[at]), primaries))
+        if names is not select:
+            rows = (r[:-1] for r in rows)
+        return list(select), rows
+
+    def _gather(self, reply, select, where, limit):
+        """
+        Query every shard for the partitions it is primary for, then
+        ask the shards that answered to cover for any that did not.
+        """
+        try:
+            page_size = min(limit or self.page_size, self.page_size)
+            rows = self._gather_rows(select, where, page_size)
+            self._page(reply, list(select), rows, limit)
+        except Exception, e:
+            reply(e)
+
+    def _gather_rows(self, select, where, page_size=None):
+        """
+        Return an iterator over the rows of every shard, reading each
+        a page of `page_size` rows at a time as it is consumed.  Only
+        the first pages are read here, a shard failing later fails the
+        query rather than being covered for.
+        """
+        page_size = page_size or self.page_size
+        return chain(*self._everywhere(self._shard_query, select, where,
+                                       page_size))
+
+    def _everywhere(self, function, *args):
+        """
+        Call ``function(name, *args, primaries)`` for every shard, then
+        for the shards that answered with ``primaries`` the ones that
+        did not, to cover their partitions.  Return the results.
+        """
+        names = self.partitions.names
+        results, down = self._scatter(names, function, args + (None,))
+        if down:
+            up = [n for n in names if n not in down]
+            more, _ = self._scatter(up, function, args + (down,))
+            results.extend(more)
+        return results
+
+    def _scatter(self, names, function, args):
+        """
+        Call ``function(name, *args)`` for each of `names` at once,
+        returning the results of those that answered and the names of
+        those that did not.
+        """
+        jobs = dict((name, gevent.spawn(function, name, *args))
+                    for name in names)
+        gevent.joinall(jobs.values())
+        results, down = [], []
+        for name, job in jobs.iteritems():
+            if job.successful():
+                results.append(job.value)
+            else:
+                logger.warning('shard %s did not answer: %r', name, job.exception)
+                down.append(name)
+        return results, down
+
+    def _shard_query(self, name, select, where, page_size, primaries):
+        if name == self.name:
+            return self._shard_rows(select, where, primaries)[1]
+        # every page, not the whole pull, must come within the timeout
+        control = Control(self.shards[name][0], self.context,
+                          timeout=self.shard_timeout)
+        try:
+            keys, rows = control.shard_query(select, where, primaries, page_size)
+        except Exception:
+            control.close()
+            raise
+        return closing(control, rows)
+
+    def _shard_aggregate(self, name, group_by, aggregates, where, primaries):
+        args = (group_by, aggregates, where, primaries)
+        if name == self.name:
+            return self._control_shard_aggregate(args, None)
+        control = Control(self.shards[name][0], self.context,
+                          timeout=self.shard_timeout)
+        try:
+            return control.request('shard_aggregate', args)
+        finally:
+            control.close()
+
+    def _query(self, select, where):
+        query, values = self.queries.compile(select, where)
+        if self.table is not None:
+            return query.run_table(self.table, values)
+        return query.run_sql(db.engine, values)
+
+    def _rollup_columns(self, group_by, aggregates, where):
+        names = list(group_by)
+        for function, column in aggregates:
+            if column is not None and column not in names:
+                names.append(column)
+        names = tuple(names)
+        self.queries.compile(names, where) # check the columns and operators
+        return names
+
+    def _control_aggregate(self, args, reply):
+        """
+        Group by and aggregate the process table, see
+        `Snapshot.rollup`.  Sharded centers have every shard roll up
+        the partitions it serves and merge the results, see
+        `columns.merge`.
+        """
+        group_by, aggregates, where, order, limit = args
+        names = self._rollup_columns(group_by, aggregates, where)
+
+        if self.partitions is not None:
+            gevent.spawn(self._gather_rollup, reply, args)
+            return pending
+
+        names += tuple(set(n for n, _, _ in where or ()) - set(names))
+        return self._snapshot(names).rollup(
+            group_by, aggregates, where or (), order, limit)
+
+    def _control_shard_aggregate(self, args, reply):
+        group_by, aggregates, where, primaries = args
+        names = self._rollup_columns(group_by, aggregates, where)
+        rows = self._shard_rows(names, where, primaries)[1]
+        return Snapshot(names, rows).rollup(group_by, aggregates)
+
+    def _gather_rollup(self, reply, args):
+        group_by, aggregates, where, order, limit = args
+        try:
+            # shards roll up all their groups, a group can be in the
+            # top on the whole but not on any one shard
+            results = self._everywhere(self._shard_aggregate, group_by,
+                                       partials(aggregates), where)
+            reply(merge(group_by, aggregates, results, order, limit))
+        except Exception, e:
+            reply(e)
+
+    def _snapshot(self, names):
+        """
+        Return a columnar snapshot of `names` for every row, reusing
+        the last one if it has those columns and is recent enough.
+        """
+        columns, taken, snapshot = self.snapshot
+        now = time.time()
+        if (columns is None or not set(names) <= columns or
+            now - taken > self.snapshot_age):
+            keys, rows = self._query(names, None)
+            snapshot = Snapshot(names, rows)
+            self.snapshot = (set(names), now, snapshot)
+        return snapshot
+
+    def _control_kill(self, args, reply):
+        """
+        Send signal `sig` to the processes in `uuids` and those matching
+        `where`, one message per watcher connection, and reply with a
+        dict of uuid to 'ok', an error, 'unknown' for processes this
+        center has no route to, or 'timeout' for those that did not
+        acknowledge within `timeout` seconds.
+        """
+        uuids, where, sig, timeout = args
+        uuids = set(uuids or ())
+        if where:
+            keys, rows = self._query(('uuid',), where)
+            uuids.update(r[0] for r in rows)
+
+        results = {}
+        targets = collections.defaultdict(list)
+        for uuid in uuids:
+            identity = self.routes.get(uuid)
+            if identity is None:
+                results[uuid] = 'unknown'
+            else:
+                targets[identity].append(uuid)
+        if not targets:
+            return results
+
+        request = (set(chain(*targets.values())), results, Event())
+        for uuid in request[0]:
+            self.acks.setdefault((uuid, 'kill'), []).append(request)
+        payload = codec.dumps(sig)
+        for identity, batch in targets.iteritems():
+            self.router.send_multipart([identity, '', 'kill', payload] + batch)
+        gevent.spawn(self._wait_acks, reply, 'kill', request, timeout)
+        return pending
+
+    def _ack(self, uuid, cmd, error):
+        for waiting, results, done in self.acks.pop((uuid, cmd), ()):
+            waiting.discard(uuid)
+            results[uuid] = error or 'ok'
+            if not waiting:
+                done.set()
+
+    def _wait_acks(self, reply, cmd, request, timeout):
+        waiting, results, done = request
+        done.wait(timeout)
+        for uuid in waiting:
+            results[uuid] = 'timeout'
+            requests = [r for r in self.acks.pop((uuid, cmd), ())
+                        if r is not request]
+            if requests:
+                self.acks[(uuid, cmd)] = requests
+        reply(results)
+
+    def _history(self):
+        if self.history is None:
+            raise ValueError('history is disabled on this center')
+        return self.history
+
+    def _control_history(self, args, reply):
+        uuid, field, start, end = args
+        return self._history().points(uuid, field, start, end)
+
+    def _control_summary(self, args, reply):
+        uuid, field, window = args
+        return self._history().summary(uuid, field, window)
+
+    def _control_stats(self, args, reply):
+        return self._stats()
+
+    def _control_knows(self, uuid, reply):
+        """
+        Check if this center has a row, history or output for `uuid`.
+        """
+        return (uuid in self.known or
+                self.history is not None and uuid in self.history.series or
+                any(self.output.get(uuid, s) is not None for s in raw_commands))
+
+    def _control_pubpoint(self, args, reply):
+        return self.pubpoint
+
+    def _control_tail(self, args, reply):
+        uuid, stream, count = args
+        return self.output.tail(uuid, stream, count)
+
+    def _control_follow(self, args, reply):
+        uuid, stream, seq, timeout = args
+        lines, current = self.output.since(uuid, stream, seq)
+        if lines or current < seq:
+            return lines, current
+        gevent.spawn(self._follow, reply, uuid, stream, seq, timeout)
+        return pending
+
+    def _follow(self, reply, uuid, stream, seq, timeout):
+        """
+        Reply with new lines of a stream as soon as some arrive, or
+        with none after `timeout` seconds.
+        """
+        try:
+            key = (uuid, stream)
+            event = self.followers.get(key)
+            if event is None:
+                event = self.followers[key] = Event()
+            event.wait(timeout)
+            reply(self.output.since(uuid, stream, seq))
+        except Exception, e:
+            reply(e)
 
     def run(self):
         return gevent.spawn(self.start)
@@ -149,7 +797,81 @@ def main():
                       help="Comma separated list of peer center endpoints.")
 
     parser.add_option('-l', '--logfile', dest='logfile', default='zerovisor.log',
-                      help='Specify the log file.')
+                      help="Specify the binary event log file, read it with nrv-log.  "
+                           "'-' writes text to standard output.")
+
+    parser.add_option('--log-max-bytes', dest='log_max_bytes', type='int', default=64 << 20,
+                      help='Rotate the event log when it reaches this size.')
+
+    parser.add_option('--log-max-age', dest='log_max_age', type='float', default=None,
+                      help='Rotate the event log when it is this many seconds old.')
+
+    parser.add_option('--log-backups', dest='log_backups', type='int', default=5,
+                      help='Number of rotated event logs to keep.')
+
+    parser.add_option('-z', '--log-compress', action='store_true', dest='log_compress', default=False,
+                      help='Compress event log blocks with zlib.')
+
+    parser.add_option('-w', '--batch-window', dest='batch_window', type='float', default=.5,
+                      help='Seconds to collect row updates before writing them.')
+
+    parser.add_option('-b', '--batch-size', dest='batch_size', type='int', default=1000,
+                      help='Write pending row updates once this many are queued.')
+
+    parser.add_option('-m', '--memory', action='store_true', dest='memory', default=False,
+                      help='Keep the process table in memory, SQL is only a snapshot.')
+
+    parser.add_option('-S', '--snapshot-interval', dest='snapshot_interval', type='float', default=0,
+                      help='With --memory, seconds between SQL snapshots.  0 disables them.')
+
+    parser.add_option('-D', '--database', dest='database', default='sqlite:///:memory:',
+                      help='SQLAlchemy database URL.')
+
+    parser.add_option('-a', '--accept', dest='accept', default=','.join(codec.SAFE),
+                      help='Comma separated list of codecs to accept (%s).' % ', '.join(codec.available()))
+
+    parser.add_option('-t', '--tail-bytes', dest='tail_bytes', type='int', default=65536,
+                      help='Bytes of recent output lines to keep per process stream.')
+
+    parser.add_option('-T', '--tail-streams', dest='tail_streams', type='int', default=10000,
+                      help='Most process streams to keep recent output for.')
+
+    parser.add_option('-p', '--pubpoint', dest='pubpoint', default=None,
+                      help='Endpoint to publish process events on for watchers.')
+
+    parser.add_option('-P', '--publish-pings', dest='publish_pings', type='float', default=None,
+                      help='Also publish pings, at most once per this many seconds per process.')
+
+    parser.add_option('--tombstone-ttl', dest='tombstone_ttl', type='float', default=3600,
+                      help='Seconds to remember deleted processes for ring sync.')
+
+    parser.add_option('--peer', dest='peers', action='append', default=[],
+                      help='NAME,CONTROLPOINT,SYNCPOINT of another center to shard '
+                           'process rows with.  Give once per center.')
+
+    parser.add_option('-r', '--replicas', dest='replicas', type='int', default=2,
+                      help='Number of centers keeping each shard of process rows.')
+
+    parser.add_option('-L', '--lost-after', dest='lost_after', type='float', default=30,
+                      help='Seconds without a report before a process is marked UNKNOWN.  '
+                           '0 disables it.')
+
+    parser.add_option('--history-series', dest='history_series', type='int', default=None,
+                      help='Most processes to keep resource history for.  Default is as many '
+                           'as fit in --history-mb.  0 disables it.')
+
+    parser.add_option('--history-mb', dest='history_mb', type='float', default=64,
+                      help='Megabytes of resource history to keep at most.')
+
+    parser.add_option('--history-tiers', dest='history_tiers', default='1x600,60x1440',
+                      help='History retention as STEPxSLOTS tiers, finest first.')
+
+    parser.add_option('-M', '--max-report-rate', dest='max_report_rate', type='int', default=10000,
+                      help='Reports a second to hold watchers to by slowing their pings.')
+
+    parser.add_option('-W', '--workers', dest='workers', type='int', default=0,
+                      help='Spread the work over this many center processes behind one '
+                           'front.  Each writes its own event log, LOGFILE.N.  0 runs one.')
 
     parser.add_option('-d', '--debug', action='store_true', dest='debug', default=False,
                       help='Debug on unhandled error.')
@@ -159,29 +881,80 @@ def main():
 
     (options, args) = parser.parse_args()
 
-    logfile = sys.stdout
-
-    if options.logfile != '-':
-        logfile = open(options.logfile, 'w+')
-
-    db.setup(echo=options.echo_sql)
-    db.create_all()
-    from sqlalchemy.orm import sessionmaker
-    Session = sessionmaker(bind=db.engine)
-    conn = db.engine.connect()
-    session = Session(bind=conn)
+    shards = {}
+    for peer in options.peers:
+        try:
+            name, controlpoint, syncpoint = peer.split(',')
+        except ValueError:
+            parser.error('--peer needs NAME,CONTROLPOINT,SYNCPOINT')
+        shards[name] = (controlpoint, syncpoint)
+
+    if options.workers and (options.ring or shards):
+        parser.error('--workers can not be used with --ring or --peer')
+    if options.workers and not options.memory:
+        # each worker queries only its own share of the rows
+        parser.error('--workers needs --memory')
+
+    def build(endpoint, controlpoint, syncpoint, logname, pubpoint,
+              router_type=zmq.ROUTER):
+        if logname == '-':
+            logfile = TextLog(sys.stdout)
+        else:
+            logfile = EventLog(logname,
+                               max_bytes=options.log_max_bytes,
+                               max_age=options.log_max_age,
+                               backups=options.log_backups,
+                               compress=options.log_compress)
+
+        table = session = None
+        batch_window = options.batch_window
+        if options.memory:
+            table = ProcessTable()
+            batch_window = options.snapshot_interval
+
+        if table is None or options.snapshot_interval > 0:
+            db.setup(options.database, echo=options.echo_sql)
+            db.create_all()
+            from sqlalchemy.orm import sessionmaker
+            Session = sessionmaker(bind=db.engine)
+            conn = db.engine.connect()
+            session = Session(bind=conn)
+
+        return Center(session,
+                      options.name,
+                      endpoint,
+                      controlpoint,
+                      syncpoint,
+                      options.ring,
+                      logfile,
+                      batch_window,
+                      options.batch_size,
+                      table,
+                      tuple(options.accept.split(',')),
+                      options.tail_bytes,
+                      options.tail_streams,
+                      pubpoint,
+                      options.publish_pings,
+                      tombstone_ttl=options.tombstone_ttl,
+                      shards=shards,
+                      replicas=options.replicas,
+                      lost_after=options.lost_after,
+                      history_series=options.history_series,
+                      history_tiers=parse_tiers(options.history_tiers),
+                      history_bytes=int(options.history_mb * (1 << 20)),
+                      max_report_rate=options.max_report_rate,
+                      router_type=router_type)
 
     try:
-        g = gevent.spawn(
-            Center(session,
-                   options.name,
-                   options.endpoint,
-                   options.controlpoint,
-                   options.syncpoint,
-                   options.ring,
-                   logfile,
-                   ).start)
-        g.join()
+        if options.workers:
+            run_workers(options, build)
+        else:
+            g = gevent.spawn(build(options.endpoint,
+                                   options.controlpoint,
+                                   options.syncpoint,
+                                   options.logfile,
+                                   options.pubpoint).start)
+            g.join()
     except Exception:
         if options.debug:
             import pdb; pdb.pm()
@@ -189,5 +962,50 @@ def main():
             raise
 
 
+def run_workers(options, build):
+    """
+    Fork a center for each of `options.workers`, made by `build`, and
+    serve them with a `Front` until it exits.
+    """
+    import multiprocessing
+    import shutil
+    import tempfile
+    from .front import Front
+
+    rundir = tempfile.mkdtemp(prefix='nrv-center-')
+    workers, children = [], []
+    try:
+        for i in xrange(options.workers):
+            point = lambda kind: 'ipc://%s/%s-%d.sock' % (rundir, kind, i)
+            worker = (point('router'), point('control'),
+                      point('pub') if options.pubpoint else None)
+            logname = options.logfile
+            if logname != '-':
+                logname = '%s.%d' % (logname, i)
+            child = multiprocessing.Process(
+                target=_run_worker,
+                args=(build, worker[0], worker[1], point('sync'), logname,
+                      worker[2]))
+            child.daemon = True
+            child.start()
+            workers.append(worker)
+            children.append(child)
+
+        front = Front(options.name, options.endpoint, options.controlpoint,
+                      workers, tuple(options.accept.split(',')), options.pubpoint)
+        front.run().join()
+    finally:
+        for child in children:
+            child.terminate()
+        shutil.rmtree(rundir, ignore_errors=True)
+
+
+def _run_worker(build, endpoint, controlpoint, syncpoint, logname, pubpoint):
+    gevent.reinit()
+    center = build(endpoint, controlpoint, syncpoint, logname, pubpoint,
+                   router_type=zmq.PAIR)
+    gevent.spawn(center.start).join()
+
+
 if __name__ == '__main__':
     main()
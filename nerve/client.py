@@ -0,0 +1,98 @@
+import gevent
+import zmq.green as zmq
+
+from . import codec
+
+
+class ControlTimeout(Exception):
+    """
+    A center did not answer a control request in time.
+    """
+
+
+class Control(object):
+    """
+    Client for a center's control endpoint.  With a `timeout` each
+    request, and so each page of a query, must be answered within that
+    many seconds, and the client is closed if one is not.
+    """
+
+    def __init__(self, endpoint, context=None, codec_name=codec.DEFAULT,
+                 timeout=None):
+        self.endpoint = endpoint
+        self.codec = codec_name
+        self.timeout = timeout
+        self.context = context or zmq.Context.instance()
+        self.socket = self.context.socket(zmq.REQ)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(endpoint)
+
+    def close(self):
+        self.socket.close()
+
+    def request_frames(self, cmd, args=None):
+        """
+        Send command `cmd` and return the decoded reply frames,
+        raising the first one if it is an error.
+        """
+        self.socket.send_multipart([cmd, codec.dumps(args, self.codec)])
+        timeout = gevent.Timeout(
+            self.timeout, ControlTimeout('no reply from %s' % self.endpoint))
+        timeout.start()
+        try:
+            replies = self.socket.recv_multipart()
+        except ControlTimeout:
+            # the REQ socket is stuck waiting for the reply
+            self.close()
+            raise
+        finally:
+            timeout.cancel()
+        frames = [codec.loads(f, codec.SAFE) for f in replies]
+        if isinstance(frames[0], Exception):
+            raise frames[0]
+        return frames
+
+    def request(self, cmd, args=None):
+        return self.request_frames(cmd, args)[0]
+
+    def query(self, select, where=None, page_size=1000):
+        """
+        Run a process query, returning the column names and an
+        iterator that fetches rows from the center a page at a time.
+        """
+        return self._query('query', (select, where, page_size), page_size)
+
+    def shard_query(self, select, where=None, primaries=None, page_size=1000):
+        """
+        Run a process query on this center alone, for the partitions it
+        is primary for, or with `primaries` for the partitions of those
+        centers it takes over.
+        """
+        return self._query('shard_query', (select, where, page_size, primaries),
+                           page_size)
+
+    def _query(self, cmd, args, page_size):
+        frames = self.request_frames(cmd, args)
+        keys, cursor = frames[0]
+        return keys, self._rows(frames[1:], cursor, page_size)
+
+    def _rows(self, chunks, cursor, page_size):
+        while True:
+            for chunk in chunks:
+                for row in chunk:
+                    yield row
+            if cursor is None:
+                return
+            frames = self.request_frames('fetch', (cursor, page_size))
+            (keys, cursor), chunks = frames[0], frames[1:]
+
+
+def closing(control, rows):
+    """
+    Yield `rows` of a query made with `control`, then close it.
+    """
+    try:
+        for row in rows:
+            yield row
+    finally:
+        control.close()
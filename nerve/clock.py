@@ -0,0 +1,80 @@
+"""
+A monotonic clock for Pythons without `time.monotonic`.
+
+Uptimes and restart windows must not jump when the wall clock is set.
+Python 2 has no monotonic clock in the standard library, so this uses
+the `monotonic` package if installed and otherwise calls
+clock_gettime(CLOCK_MONOTONIC) through ctypes.  Where neither works
+it falls back to the wall clock.
+"""
+import ctypes
+import ctypes.util
+import os
+import sys
+import time
+
+
+# the value of CLOCK_MONOTONIC differs between systems, by
+# sys.platform prefix
+_clock_ids = (
+    ('linux', 1),
+    ('freebsd', 4),
+    ('dragonfly', 4),
+    ('openbsd', 3),
+    ('netbsd', 3),
+    ('darwin', 6), # 10.12 and later have clock_gettime
+    ('sunos', 4),
+    )
+
+
+class _timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _load(platform=sys.platform):
+    """
+    Return a monotonic clock using clock_gettime, or None if there is
+    none on `platform` or it does not work.
+    """
+    for prefix, clock_id in _clock_ids:
+        if platform.startswith(prefix):
+            break
+    else:
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        try:
+            clock_gettime = libc.clock_gettime
+        except AttributeError:
+            # older glibc keeps it in librt
+            clock_gettime = ctypes.CDLL(ctypes.util.find_library('rt') or 'librt.so.1',
+                                        use_errno=True).clock_gettime
+    except (OSError, AttributeError):
+        return None
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+
+    def monotonic():
+        """
+        Seconds from an arbitrary point that never goes backwards.
+        """
+        t = _timespec()
+        if clock_gettime(clock_id, ctypes.byref(t)) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return t.tv_sec + t.tv_nsec * 1e-9
+
+    try:
+        monotonic()
+    except OSError:
+        return None
+    return monotonic
+
+
+try:
+    from time import monotonic
+except ImportError:
+    try:
+        from monotonic import monotonic
+    except ImportError:
+        monotonic = _load() or time.time
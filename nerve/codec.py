@@ -0,0 +1,430 @@
+"""
+Wire encodings for nerve messages.
+
+Every encoded payload starts with a two byte header, the codec id and
+the codec version, so a receiver can decode any registered codec and
+reply to a peer in the codec it spoke.  Receivers pass the names they
+are willing to accept; 'pickle' is only there for old peers and should
+never be accepted from an untrusted network.
+"""
+import struct
+from cPickle import dumps as pickle_dumps, loads as pickle_loads
+from datetime import datetime
+from functools import partial
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+DEFAULT = 'nrv'
+
+# Codecs that are safe to accept from the network.
+SAFE = ('nrv', 'msgpack')
+
+# Field names of process rows, encoded by position instead of by
+# name.  Append only: a new field means a new codec version, and as
+# older versions use a prefix of these they still decode.
+FIELDS = (
+    'uuid', 'center', 'name', 'pid', 'identity', 'create_time', 'state',
+    'state_name', 'return_code', 'signal', 'cmdline', 'cpu_percent',
+    'cpu_user', 'cpu_system', 'ionice_class', 'ionice_value',
+    'memory_rss', 'memory_vms', 'memory_percent', 'num_threads',
+    'gid_real', 'gid_effective', 'gid_saved', 'is_running', 'nice',
+    'ppid', 'status', 'terminal', 'uid_real', 'uid_effective',
+    'uid_saved', 'username', 'uptime', 'ping_time', 'restarts',
+    'restart_attempts',
+    )
+
+_field_ids = dict((name, i) for i, name in enumerate(FIELDS))
+
+_datetime = struct.Struct('>HBBBBBI')
+_int = struct.Struct('>q')
+_float = struct.Struct('>d')
+_len32 = struct.Struct('>I')
+
+
+class CodecError(ValueError):
+    """
+    Raised for payloads that can't or mustn't be decoded.
+    """
+
+
+class RemoteError(Exception):
+    """
+    An exception raised on the far side of a connection.
+    """
+
+    def __init__(self, name, message):
+        Exception.__init__(self, '%s: %s' % (name, message))
+        self.name = name
+        self.message = message
+
+
+codecs = {}
+_by_id = {}
+
+
+def register(codec):
+    codecs[codec.name] = codec
+    _by_id[codec.id] = codec
+    return codec
+
+
+def available():
+    return sorted(codecs)
+
+
+def get(name):
+    try:
+        return codecs[name]
+    except KeyError:
+        raise CodecError('no such codec %s' % name)
+
+
+def name_of(data):
+    """
+    Return the name of the codec `data` was encoded with.
+    """
+    return _codec_of(data).name
+
+
+def dumps(obj, name=DEFAULT):
+    codec = get(name)
+    return codec.header + codec.dumps(obj)
+
+
+def loads(data, accept=None):
+    """
+    Decode `data`, refusing codecs not named in `accept` if given.
+    """
+    codec = _codec_of(data)
+    if accept is not None and codec.name not in accept:
+        raise CodecError('codec %s not accepted' % codec.name)
+    if ord(data[1]) not in codec.versions:
+        raise CodecError('unsupported %s version %d' % (codec.name, ord(data[1])))
+    try:
+        return codec.loads(data, 2)
+    except CodecError:
+        raise
+    except Exception, e:
+        raise CodecError('bad %s payload: %s' % (codec.name, e))
+
+
+def _codec_of(data):
+    if len(data) < 2:
+        raise CodecError('short payload')
+    try:
+        return _by_id[ord(data[0])]
+    except KeyError:
+        raise CodecError('unknown codec id %d' % ord(data[0]))
+
+
+def _pack_datetime(value):
+    return _datetime.pack(value.year, value.month, value.day, value.hour,
+                          value.minute, value.second, value.microsecond)
+
+
+def _unpack_datetime(data, offset=0):
+    return datetime(*_datetime.unpack_from(data, offset))
+
+
+class Codec(object):
+
+    id = None
+    name = None
+    version = 1       # written
+    versions = (1,)   # read
+
+    @property
+    def header(self):
+        return chr(self.id) + chr(self.version)
+
+    def dumps(self, obj):
+        raise NotImplementedError
+
+    def loads(self, data, offset):
+        raise NotImplementedError
+
+
+class PickleCodec(Codec):
+    """
+    The original cPickle encoding.  Never accept it from the network.
+    """
+
+    id = 1
+    name = 'pickle'
+
+    def dumps(self, obj):
+        return pickle_dumps(obj, 2)
+
+    def loads(self, data, offset):
+        return pickle_loads(data[offset:])
+
+
+class BinaryCodec(Codec):
+    """
+    Compact tagged binary encoding, using only the standard library.
+
+    Strings that are process row field names are sent as a one byte
+    index into `FIELDS`, so a ping carries no key names at all.
+    Version 2 added the restarts and restart_attempts fields.
+    """
+
+    id = 2
+    name = 'nrv'
+    version = 2
+    versions = (1, 2)
+
+    def dumps(self, obj):
+        out = []
+        _encode(obj, out.append)
+        return ''.join(out)
+
+    def loads(self, data, offset):
+        obj, offset = _decode(data, offset)
+        if offset != len(data):
+            raise CodecError('trailing bytes')
+        return obj
+
+
+# BinaryCodec encoders, dispatched on the exact type of the value.
+
+_tagged_int = struct.Struct('>cq')
+_tagged_float = struct.Struct('>cd')
+_field_tags = dict((name, 'k' + chr(i)) for i, name in enumerate(FIELDS))
+
+
+def _encode(obj, write):
+    try:
+        encoder = _encoders[type(obj)]
+    except KeyError:
+        encoder = _encode_other
+    encoder(obj, write)
+
+
+def _encode_int(obj, write):
+    if -0x8000000000000000 <= obj <= 0x7fffffffffffffff:
+        write(_tagged_int.pack('i', obj))
+    else:
+        digits = str(obj)
+        if len(digits) > 255:
+            raise CodecError('integer too large')
+        write('L' + chr(len(digits)) + digits)
+
+
+def _encode_bytes(tag, data, write):
+    if len(data) < 256:
+        write(tag + chr(len(data)))
+    else:
+        write(tag.upper() + _len32.pack(len(data)))
+    write(data)
+
+
+def _encode_str(obj, write):
+    field = _field_tags.get(obj)
+    if field is not None:
+        write(field)
+    else:
+        _encode_bytes('s', obj, write)
+
+
+def _encode_dict(obj, write):
+    write('m' + _len32.pack(len(obj)))
+    for key, value in obj.iteritems():
+        field = _field_tags.get(key)
+        if field is not None:
+            write(field)
+        else:
+            _encode(key, write)
+        _encode(value, write)
+
+
+def _encode_sequence(tag):
+    def encode(obj, write):
+        write(tag + _len32.pack(len(obj)))
+        for item in obj:
+            _encode(item, write)
+    return encode
+
+
+def _encode_other(obj, write):
+    if isinstance(obj, BaseException):
+        write('E')
+        _encode(getattr(obj, 'name', type(obj).__name__), write)
+        _encode(str(obj), write)
+        return
+    for typ in (dict, tuple, list, str, unicode, int, long, float, datetime):
+        if isinstance(obj, typ):
+            return _encoders[typ](obj, write)
+    raise CodecError('cannot encode %s' % type(obj).__name__)
+
+
+_encoders = {
+    type(None): lambda obj, write: write('N'),
+    bool: lambda obj, write: write('T' if obj else 'F'),
+    int: _encode_int,
+    long: _encode_int,
+    float: lambda obj, write: write(_tagged_float.pack('d', obj)),
+    str: _encode_str,
+    unicode: lambda obj, write: _encode_bytes('u', obj.encode('utf-8'), write),
+    datetime: lambda obj, write: write('D' + _pack_datetime(obj)),
+    dict: _encode_dict,
+    tuple: _encode_sequence('t'),
+    list: _encode_sequence('l'),
+    set: _encode_sequence('l'),
+    frozenset: _encode_sequence('l'),
+    }
+
+
+# BinaryCodec decoders, dispatched on the tag byte.  Each takes the
+# data and the offset just past the tag and returns (value, offset).
+
+def _decode(data, offset):
+    try:
+        decoder = _decoders[data[offset]]
+    except KeyError:
+        raise CodecError('unknown tag %r' % data[offset])
+    return decoder(data, offset + 1)
+
+
+def _decode_bytes(wide, convert=None):
+    def decode(data, offset):
+        if wide:
+            size = _len32.unpack_from(data, offset)[0]
+            offset += 4
+        else:
+            size = ord(data[offset])
+            offset += 1
+        end = offset + size
+        if end > len(data):
+            raise CodecError('truncated string')
+        value = data[offset:end]
+        if convert is not None:
+            value = convert(value)
+        return value, end
+    return decode
+
+
+def _decode_items(data, offset):
+    count = _len32.unpack_from(data, offset)[0]
+    offset += 4
+    items = []
+    append = items.append
+    for i in xrange(count):
+        item, offset = _decode(data, offset)
+        append(item)
+    return items, offset
+
+
+def _decode_tuple(data, offset):
+    items, offset = _decode_items(data, offset)
+    return tuple(items), offset
+
+
+def _decode_dict(data, offset):
+    count = _len32.unpack_from(data, offset)[0]
+    offset += 4
+    obj = {}
+    for i in xrange(count):
+        key, offset = _decode(data, offset)
+        obj[key], offset = _decode(data, offset)
+    return obj, offset
+
+
+def _decode_error(data, offset):
+    name, offset = _decode(data, offset)
+    message, offset = _decode(data, offset)
+    return RemoteError(name, message), offset
+
+
+_decoders = {
+    'N': lambda data, offset: (None, offset),
+    'T': lambda data, offset: (True, offset),
+    'F': lambda data, offset: (False, offset),
+    'k': lambda data, offset: (FIELDS[ord(data[offset])], offset + 1),
+    'i': lambda data, offset: (_int.unpack_from(data, offset)[0], offset + 8),
+    'd': lambda data, offset: (_float.unpack_from(data, offset)[0], offset + 8),
+    'L': _decode_bytes(False, long),
+    's': _decode_bytes(False),
+    'S': _decode_bytes(True),
+    'u': _decode_bytes(False, lambda value: value.decode('utf-8')),
+    'U': _decode_bytes(True, lambda value: value.decode('utf-8')),
+    'D': lambda data, offset: (_unpack_datetime(data, offset),
+                               offset + _datetime.size),
+    'm': _decode_dict,
+    'l': _decode_items,
+    't': _decode_tuple,
+    'E': _decode_error,
+    }
+
+
+class MsgpackCodec(Codec):
+    """
+    msgpack, with datetimes, exceptions, tuples and integers too big
+    for 64 bits as extension types.  From version 2 str is sent as bin
+    and unicode as str, so both come back as they went.
+    """
+
+    id = 3
+    name = 'msgpack'
+    version = 2
+    versions = (1, 2)
+
+    def dumps(self, obj):
+        return self._pack(obj)
+
+    def loads(self, data, offset):
+        # version 1 sent str and unicode alike as raw
+        return self._unpack(data[offset:], ord(data[1]) == 1)
+
+    @classmethod
+    def _pack(cls, obj):
+        return msgpack.packb(obj, default=cls._default, use_bin_type=True,
+                             strict_types=True)
+
+    @classmethod
+    def _unpack(cls, data, raw=False):
+        return msgpack.unpackb(data, ext_hook=partial(cls._ext_hook, raw),
+                               use_list=True, raw=raw)
+
+    @classmethod
+    def _default(cls, obj):
+        # strict types send tuples and subclasses here, rather than
+        # packing them as lists and their base types
+        if isinstance(obj, tuple):
+            return msgpack.ExtType(4, cls._pack(list(obj)))
+        if isinstance(obj, (int, long)):
+            if -2 ** 63 <= obj < 2 ** 64:
+                return long(obj)
+            return msgpack.ExtType(3, str(obj))
+        if isinstance(obj, datetime):
+            return msgpack.ExtType(1, _pack_datetime(obj))
+        if isinstance(obj, BaseException):
+            name = getattr(obj, 'name', type(obj).__name__)
+            return msgpack.ExtType(2, cls._pack((name, str(obj))))
+        if isinstance(obj, (set, frozenset, list)):
+            return list(obj)
+        for base in (dict, str, unicode, float):
+            if isinstance(obj, base):
+                return base(obj)
+        raise CodecError('cannot encode %s' % type(obj).__name__)
+
+    @classmethod
+    def _ext_hook(cls, raw, code, data):
+        if code == 1:
+            return _unpack_datetime(data)
+        if code == 2:
+            return RemoteError(*cls._unpack(data, raw))
+        if code == 3:
+            return long(data)
+        if code == 4:
+            return tuple(cls._unpack(data, raw))
+        return msgpack.ExtType(code, data)
+
+
+register(PickleCodec())
+register(BinaryCodec())
+if msgpack is not None:
+    register(MsgpackCodec())
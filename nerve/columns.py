@@ -0,0 +1,304 @@
+"""
+Columnar snapshots of process rows and group by rollups over them.
+
+If numpy is installed columns are arrays and filters and aggregates
+run as array operations, otherwise as plain Python loops with the same
+results.  Missing values are skipped by every aggregate but count(*).
+
+Rollups of parts of the rows, for instance on each worker of a center,
+combine with `merge` if the parts compute the `partials`.
+"""
+import heapq
+
+from .query import OPS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+FUNCTIONS = ('count', 'sum', 'avg', 'min', 'max')
+
+
+def _numeric(values):
+    return all(v is None or isinstance(v, (int, long, float)) and
+               not isinstance(v, bool) for v in values)
+
+
+def _integral(values):
+    return all(v is None or isinstance(v, (int, long)) for v in values)
+
+
+class Snapshot(object):
+    """
+    The columns `names` of `rows`, a sequence of tuples.
+    """
+
+    def __init__(self, names, rows, use_numpy=True):
+        rows = list(rows)
+        self.size = len(rows)
+        self.numpy = use_numpy and numpy is not None
+        self.columns = {}
+        self.numeric = set()
+        self.integral = set() # numeric columns of only ints
+        for i, name in enumerate(names):
+            values = [r[i] for r in rows]
+            if _numeric(values):
+                self.numeric.add(name)
+                if _integral(values):
+                    self.integral.add(name)
+            if self.numpy:
+                if name in self.numeric:
+                    values = numpy.array(
+                        [numpy.nan if v is None else v for v in values],
+                        dtype=float)
+                else:
+                    array = numpy.empty(len(values), dtype=object)
+                    array[:] = values
+                    values = array
+            self.columns[name] = values
+
+    def mask(self, where):
+        """
+        Return the rows matching every ``(column, op, value)`` predicate,
+        as a boolean array or list.
+        """
+        if self.numpy:
+            mask = numpy.ones(self.size, dtype=bool)
+            for name, op, value in where:
+                column = self.columns[name]
+                mask &= self._present(column)
+                if op == 'in':
+                    mask &= numpy.in1d(column, list(value))
+                else:
+                    mask &= numpy.asarray(OPS[op](column, value), dtype=bool)
+            return mask
+
+        mask = [True] * self.size
+        for name, op, value in where:
+            # missing values match nothing, as NULL does in SQL
+            test = OPS[op]
+            if op == 'in':
+                value = set(value)
+            for i, v in enumerate(self.columns[name]):
+                if mask[i] and not (v is not None and test(v, value)):
+                    mask[i] = False
+        return mask
+
+    @staticmethod
+    def _present(column):
+        if column.dtype == object:
+            return numpy.array([v is not None for v in column], dtype=bool)
+        return ~numpy.isnan(column)
+
+    def rollup(self, group_by=(), aggregates=(('count', None),), where=(),
+               order=None, limit=None):
+        """
+        Group the rows matching `where` by the columns `group_by` and
+        return ``(keys, rows)`` with one row per group: the group values
+        then each ``(function, column)`` aggregate, column None meaning
+        all rows for count.  If `order` is given, the groups are the
+        `limit` with the largest value of that aggregate, largest first.
+        """
+        for function, column in aggregates:
+            if function not in FUNCTIONS:
+                raise ValueError('no such aggregate %s' % function)
+            if column is None and function != 'count':
+                raise ValueError('%s needs a column' % function)
+            if column is not None and column not in self.numeric:
+                raise ValueError('%s is not a number column' % column)
+        if self.numpy:
+            rows = self._rollup_numpy(group_by, aggregates, self.mask(where))
+        else:
+            rows = self._rollup_python(group_by, aggregates, self.mask(where))
+        return _keys(group_by, aggregates), _top(rows, len(group_by), order, limit)
+
+    def _rollup_python(self, group_by, aggregates, mask):
+        groups = {}
+        group_columns = [self.columns[n] for n in group_by]
+        agg_columns = [self.columns[c] if c else None for f, c in aggregates]
+        for i in xrange(self.size):
+            if not mask[i]:
+                continue
+            group = tuple(c[i] for c in group_columns)
+            state = groups.get(group)
+            if state is None:
+                # count, sum, min, max per aggregate
+                state = groups[group] = [[0, 0, None, None] for _ in aggregates]
+            for acc, column in zip(state, agg_columns):
+                value = 1 if column is None else column[i]
+                if value is None:
+                    continue
+                acc[0] += 1
+                acc[1] += value
+                if acc[2] is None or value < acc[2]:
+                    acc[2] = value
+                if acc[3] is None or value > acc[3]:
+                    acc[3] = value
+
+        rows = []
+        for group, state in groups.iteritems():
+            row = list(group)
+            for (function, column), (count, total, low, high) in zip(aggregates, state):
+                row.append(self._result(function, count, total, low, high))
+            rows.append(tuple(row))
+        return rows
+
+    @staticmethod
+    def _result(function, count, total, low, high):
+        if function == 'count':
+            return count
+        if not count:
+            return None
+        return dict(sum=total, avg=float(total) / count,
+                    min=low, max=high)[function]
+
+    def _rollup_numpy(self, group_by, aggregates, mask):
+        # number the groups by combining the codes of each column
+        codes = numpy.zeros(int(mask.sum()), dtype=numpy.int64)
+        uniques = []
+        for name in group_by:
+            values, inverse = self._unique(name, mask)
+            codes = codes * len(values) + inverse
+            uniques.append(values)
+        groups, codes = numpy.unique(codes, return_inverse=True)
+        size = len(groups)
+
+        results = []
+        for function, column in aggregates:
+            if column is None:
+                results.append(numpy.bincount(codes, minlength=size))
+                continue
+            values = self.columns[column][mask].astype(float)
+            present = ~numpy.isnan(values)
+            count = numpy.bincount(codes, weights=present,
+                                   minlength=size).astype(numpy.int64)
+            if function == 'count':
+                result = count
+            elif function in ('sum', 'avg'):
+                result = numpy.bincount(codes, weights=numpy.where(present, values, 0),
+                                        minlength=size)
+                if function == 'avg':
+                    result = result / numpy.maximum(count, 1)
+            else:
+                ufunc, start = ((numpy.minimum, numpy.inf) if function == 'min'
+                                else (numpy.maximum, -numpy.inf))
+                result = numpy.full(size, start)
+                ufunc.at(result, codes[present], values[present])
+            if function != 'count':
+                result = [None if not n else v for n, v in zip(count, result)]
+            results.append(result)
+
+        rows = []
+        for g, group in enumerate(groups):
+            row = []
+            for values in reversed(uniques):
+                group, code = divmod(group, len(values))
+                row.insert(0, values[code])
+            row.extend(results[a][g] for a in xrange(len(aggregates)))
+            rows.append(tuple(_python(v) for v in row))
+        return rows
+
+    def _unique(self, name, mask):
+        """
+        Return the distinct values of column `name` in the rows of
+        `mask`, None for missing, and the index of each row's value.
+        """
+        column = self.columns[name][mask]
+        if column.dtype == object:
+            return numpy.unique(column, return_inverse=True)
+        # NaN is not equal to itself, so would make a group of every
+        # missing value.  They get the index after the others instead.
+        present = ~numpy.isnan(column)
+        values, inverse = numpy.unique(column[present], return_inverse=True)
+        codes = numpy.full(len(column), len(values), dtype=numpy.int64)
+        codes[present] = inverse
+        cast = int if name in self.integral else float
+        values = [cast(v) for v in values]
+        if not present.all():
+            values.append(None)
+        return values, codes
+
+
+def partials(aggregates):
+    """
+    Return the aggregates each part of the rows computes for `merge`
+    to combine into `aggregates`, avg becoming sum and count.
+    """
+    parts = []
+    for function, column in aggregates:
+        if function == 'avg':
+            needs = [('sum', column), ('count', column)]
+        else:
+            needs = [(function, column)]
+        for part in needs:
+            if part not in parts:
+                parts.append(part)
+    return parts
+
+
+def merge(group_by, aggregates, results, order=None, limit=None):
+    """
+    Combine rollups of parts of the rows, each ``(keys, rows)`` of the
+    `partials` of `aggregates`, into one rollup of `aggregates` as
+    `Snapshot.rollup` returns.
+    """
+    width = len(group_by)
+    parts = partials(aggregates)
+    groups = {}
+    for keys, rows in results:
+        for row in rows:
+            group = tuple(row[:width])
+            values = groups.get(group)
+            if values is None:
+                groups[group] = list(row[width:])
+                continue
+            for i, (function, column) in enumerate(parts):
+                values[i] = _combine(function, values[i], row[width + i])
+
+    rows = []
+    for group, values in groups.iteritems():
+        values = dict(zip(parts, values))
+        row = list(group)
+        for function, column in aggregates:
+            if function == 'avg':
+                count = values[('count', column)]
+                row.append(float(values[('sum', column)]) / count if count else None)
+            else:
+                row.append(values[(function, column)])
+        rows.append(tuple(row))
+    return _keys(group_by, aggregates), _top(rows, width, order, limit)
+
+
+def _combine(function, a, b):
+    if function == 'count':
+        return a + b
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return dict(sum=a + b, min=min(a, b), max=max(a, b))[function]
+
+
+def _keys(group_by, aggregates):
+    return list(group_by) + ['%s(%s)' % (f, c or '*') for f, c in aggregates]
+
+
+def _top(rows, width, order, limit):
+    if order is not None:
+        at = width + order
+        key = lambda row: (row[at] is not None, row[at])
+        if limit:
+            return heapq.nlargest(limit, rows, key=key)
+        rows.sort(key=key, reverse=True)
+    elif limit:
+        rows = rows[:limit]
+    return rows
+
+
+def _python(value):
+    # numpy scalars do not go through the codecs
+    if numpy is not None and isinstance(value, numpy.generic):
+        return value.item()
+    return value
@@ -0,0 +1,105 @@
+"""
+Index of the nrvsh commands.
+
+Finding entry points means importing pkg_resources and reading the
+metadata of every installed distribution, which takes longer than most
+commands.  The index of command names to ``module:attr`` targets is
+kept in a cache file instead, rebuilt when a sys.path entry or the
+entry point metadata in it has changed, or when a command is not
+found, and only the module of the command that is run is imported.
+"""
+import json
+import os
+import sys
+
+
+def cache_path(namespace):
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'nrvsh', '%s.json' % namespace)
+
+
+_metadata = ('.egg-info', '.dist-info', '.egg')
+
+
+def stamp(path=None):
+    """
+    Return the modification times of the `path` entries, sys.path by
+    default, and of the entry point files of the distributions in
+    them.  Installing or removing a distribution changes the first,
+    reinstalling one in development mode only the second.
+    """
+    times = []
+    for entry in sys.path if path is None else path:
+        entry = entry or '.'
+        try:
+            times.append([entry, os.stat(entry).st_mtime])
+            names = os.listdir(entry) if os.path.isdir(entry) else []
+        except OSError:
+            continue
+        for name in sorted(names):
+            if not name.endswith(_metadata):
+                continue
+            for info in ('entry_points.txt', 'EGG-INFO/entry_points.txt'):
+                filename = os.path.join(entry, name, info)
+                try:
+                    times.append([filename, os.stat(filename).st_mtime])
+                except OSError:
+                    pass
+    return times
+
+
+def scan(namespace):
+    import pkg_resources
+    return dict((ep.name, '%s:%s' % (ep.module_name, '.'.join(ep.attrs)))
+                for ep in pkg_resources.iter_entry_points(namespace))
+
+
+def index(namespace, path=None, scan=scan, stamp=stamp, refresh=False):
+    """
+    Return a dict of command name to ``module:attr`` for the entry
+    points in `namespace`, from the cache file at `path` if it is
+    current, unless `refresh` is true.
+    """
+    path = path or cache_path(namespace)
+    current = stamp()
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        if cached['stamp'] == current and not refresh:
+            return cached['commands']
+    except (IOError, ValueError, KeyError, TypeError):
+        pass
+
+    commands = scan(namespace)
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        # written aside and renamed, so concurrent runs see a whole file
+        temp = '%s.%d' % (path, os.getpid())
+        with open(temp, 'w') as f:
+            json.dump(dict(stamp=current, commands=commands), f)
+        os.rename(temp, path)
+    except (IOError, OSError):
+        pass # no cache then, just slower
+    return commands
+
+
+class EntryPoint(object):
+    """
+    A command's ``module:attr`` target, imported when it is run.  Has
+    the `resolve` and `load` methods cliff uses on entry points.
+    """
+
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+
+    def resolve(self):
+        module, attrs = self.target.split(':')
+        obj = __import__(module, fromlist=['__name__'])
+        for attr in attrs.split('.'):
+            obj = getattr(obj, attr)
+        return obj
+
+    def load(self, require=False):
+        return self.resolve()
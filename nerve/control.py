@@ -0,0 +1,98 @@
+"""
+Serving the control protocol.
+
+Requests are ``[cmd, payload]`` on a ROUTER socket and are dispatched
+to ``_control_<cmd>(args, reply)`` methods, which return the reply or
+`pending` if they send it later with `reply` themselves.  Query replies
+are paged, the rest of the rows kept under a cursor for 'fetch'.
+"""
+import gevent
+import time
+from functools import partial
+from itertools import islice
+
+from . import codec
+
+
+# returned by control commands that reply later
+pending = object()
+
+
+class ControlServer(object):
+    """
+    Control command dispatch and query paging, for classes with a
+    `control` ROUTER socket, `metrics`, `accept`, `name`, `cursors`
+    and `cursor_ids`.
+    """
+    page_size = 1000     # most rows in a query reply
+    chunk_rows = 100     # rows per frame of a query reply
+    cursor_timeout = 60  # seconds to keep an unfetched query cursor
+
+    def _read_control(self):
+        while True:
+            sender, _, cmd, data = self.control.recv_multipart()
+            started = time.time()
+            name = 'control.' + (cmd if hasattr(self, '_control_' + cmd)
+                                 else 'unknown')
+            reply = partial(self._reply, sender, codec.DEFAULT, name, started)
+            try:
+                reply = partial(self._reply, sender, codec.name_of(data),
+                                name, started)
+                args = codec.loads(data, self.accept)
+                handler = getattr(self, '_control_' + cmd, None)
+                if handler is None:
+                    raise NameError, 'no such command %s' % cmd
+                response = handler(args, reply)
+            except Exception, e:
+                response = e
+            if response is not pending:
+                reply(response)
+
+    def _reply(self, sender, reply_codec, name, started, response, *more):
+        self.control.send_multipart(
+            [sender, ''] + [codec.dumps(r, reply_codec)
+                            for r in (response,) + more])
+        self.metrics.time(name, time.time() - started)
+
+    def _control_fetch(self, args, reply):
+        cursor, limit = args
+        self._expire_cursors()
+        try:
+            keys, rows, _ = self.cursors.pop(cursor)
+        except KeyError:
+            raise KeyError('no such cursor %s' % cursor)
+        # rows from other centers are read a page at a time, so this
+        # can wait on the network
+        gevent.spawn(self._fetch, reply, keys, rows, limit)
+        return pending
+
+    def _fetch(self, reply, keys, rows, limit):
+        try:
+            self._page(reply, keys, rows, limit)
+        except Exception, e:
+            reply(e)
+
+    def _page(self, reply, keys, rows, limit):
+        """
+        Reply with up to `limit` rows from iterator `rows`, as a
+        ``(keys, cursor)`` frame followed by frames of at most
+        `chunk_rows` rows each.  If the page is full the iterator is
+        kept under `cursor` for a later 'fetch'.
+        """
+        limit = min(limit or self.page_size, self.page_size)
+        page = list(islice(rows, limit))
+        cursor = None
+        if len(page) == limit:
+            self._expire_cursors()
+            cursor = '%s-%d' % (self.name, next(self.cursor_ids))
+            self.cursors[cursor] = (keys, rows, time.time() + self.cursor_timeout)
+        size = self.chunk_rows
+        reply((keys, cursor),
+              *[page[i:i + size] for i in xrange(0, len(page), size)])
+        return pending
+
+    def _expire_cursors(self):
+        now = time.time()
+        for cursor, (_, _, deadline) in self.cursors.items():
+            if deadline < now:
+                del self.cursors[cursor]
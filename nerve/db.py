@@ -80,4 +80,6 @@ class Process(Base):
     uid_saved = Column(Integer)
     username = Column(String)
     uptime = Column(Float)
+    restarts = Column(Integer)
+    restart_attempts = Column(Integer)
     ping_time = Column(DateTime)
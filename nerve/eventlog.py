@@ -0,0 +1,238 @@
+"""
+Center event logs, written by a background thread.
+
+The binary format is a file header followed by blocks::
+
+    header  'NRVLOG' + 2 byte format version
+    block   flags (1 byte, 1 = zlib) + payload length (4 bytes) + payload
+    record  time (8 byte float) + sender length (1 byte)
+            + command length (1 byte) + data length (4 bytes)
+            + sender + command + data
+
+Record data is the message payload encoded with the 'nrv' codec.  Use
+'nrv-log' to print a log.
+"""
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+
+from . import codec
+from .metrics import Histogram
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 'NRVLOG\x00\x01'
+COMPRESSED = 1
+
+_block = struct.Struct('>BI')
+_record = struct.Struct('>dBBI')
+
+# longest sender or command a record holds
+MAX_NAME = 255
+
+
+class LogWriter(object):
+    """
+    Queue events in the caller's thread and write them in batches from
+    a daemon thread every `flush_interval` seconds.  Past `max_pending`
+    queued events new ones are counted in `dropped` and discarded
+    rather than letting the queue grow.  A batch that fails to write is
+    counted in `errors` and its events in `dropped`, and the thread
+    carries on with the next.
+    """
+
+    def __init__(self, flush_interval=1.0, max_pending=100000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.dropped = 0
+        self.written = 0
+        self.errors = 0
+        self.write_times = Histogram()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='nrv-log')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, sender, cmd, data):
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self.pending.append((time.time(), sender, cmd, data))
+        if len(self.pending) >= self.max_pending // 2:
+            self._wakeup.set()
+
+    def close(self):
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._drain()
+        self._drain()
+        self._close()
+
+    def _drain(self):
+        events = []
+        pending = self.pending
+        while pending:
+            events.append(pending.popleft())
+        if events:
+            started = time.time()
+            try:
+                self._write_events(events)
+            except Exception:
+                logger.exception('error writing %d events', len(events))
+                self.errors += 1
+                self.dropped += len(events)
+                return
+            self.write_times.record(time.time() - started)
+            self.written += len(events)
+
+    def _write_events(self, events):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class TextLog(LogWriter):
+    """
+    The original format, one ``repr([sender, cmd, data])`` per line.
+    """
+
+    def __init__(self, stream, **kwargs):
+        self.stream = stream
+        LogWriter.__init__(self, **kwargs)
+
+    def _write_events(self, events):
+        self.stream.write(''.join(repr([sender, cmd, data]) + '\n'
+                                  for _, sender, cmd, data in events))
+        self.stream.flush()
+
+
+class EventLog(LogWriter):
+    """
+    Binary append only event log at `path`.  The file is rotated to
+    ``path.1`` .. ``path.<backups>`` once it reaches `max_bytes`, or
+    once it is `max_age` seconds old if given.  Blocks are zlib
+    compressed if `compress` is true.
+    """
+
+    def __init__(self, path, max_bytes=64 << 20, max_age=None, backups=5,
+                 compress=False, **kwargs):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backups = backups
+        self.compress = compress
+        self.file = None
+        self._open()
+        LogWriter.__init__(self, **kwargs)
+
+    def _open(self):
+        self.file = open(self.path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.opened = time.time()
+
+    def _close(self):
+        self.file.close()
+
+    def _rotate(self):
+        self.file.close()
+        for n in range(self.backups - 1, 0, -1):
+            source = '%s.%d' % (self.path, n)
+            if os.path.exists(source):
+                os.rename(source, '%s.%d' % (self.path, n + 1))
+        if self.backups:
+            os.rename(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def _write_events(self, events):
+        if self.file.closed:
+            # a failed rotation left it closed
+            self._open()
+        records = []
+        for t, sender, cmd, data in events:
+            sender, cmd = sender[:MAX_NAME], cmd[:MAX_NAME]
+            data = codec.dumps(data)
+            records.append(_record.pack(t, len(sender), len(cmd), len(data)))
+            records.extend((sender, cmd, data))
+        payload = ''.join(records)
+        flags = 0
+        if self.compress:
+            payload = zlib.compress(payload)
+            flags |= COMPRESSED
+        self.file.write(_block.pack(flags, len(payload)))
+        self.file.write(payload)
+        self.file.flush()
+
+        if (self.file.tell() >= self.max_bytes or
+            self.max_age is not None and
+            time.time() - self.opened >= self.max_age):
+            self._rotate()
+
+
+def read(path):
+    """
+    Yield ``(time, sender, cmd, data)`` for every event in log `path`.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('%s is not a nerve event log' % path)
+        while True:
+            head = f.read(_block.size)
+            if len(head) < _block.size:
+                return # end of file, or a block cut short by a crash
+            flags, size = _block.unpack(head)
+            payload = f.read(size)
+            if len(payload) < size:
+                return
+            if flags & COMPRESSED:
+                payload = zlib.decompress(payload)
+            offset = 0
+            while offset < len(payload):
+                t, slen, clen, dlen = _record.unpack_from(payload, offset)
+                offset += _record.size
+                sender = payload[offset:offset + slen]
+                offset += slen
+                cmd = payload[offset:offset + clen]
+                offset += clen
+                data = codec.loads(payload[offset:offset + dlen])
+                offset += dlen
+                yield t, sender, cmd, data
+
+
+def main():
+    from optparse import OptionParser
+
+    parser = OptionParser(usage='%prog [options] LOGFILE...')
+    parser.add_option('-t', '--time', action='store_true', dest='time', default=False,
+                      help='Prefix each event with its time.')
+    (options, args) = parser.parse_args()
+    if not args:
+        parser.error('no log file given')
+
+    for path in args:
+        for t, sender, cmd, data in read(path):
+            line = repr([sender, cmd, data])
+            if options.time:
+                line = '%.6f %s' % (t, line)
+            sys.stdout.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main()
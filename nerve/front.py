@@ -0,0 +1,230 @@
+"""
+One center spread over several processes.
+
+A `Front` binds the center's endpoints and passes each watcher
+connection to one of its workers by a hash of the connection identity,
+over a PAIR socket, so every report from a watcher reaches the same
+worker.  Workers are centers started with a PAIR for a router; they
+decode, log and store the reports of their share of the processes, and
+their replies to watchers come back through the front.  Control
+requests go to every worker and the answers are merged.
+"""
+import gevent
+import logging
+import zlib
+import zmq.green as zmq
+from itertools import chain, count
+
+from . import codec
+from .client import Control, ControlTimeout, closing
+from .columns import merge, partials
+from .control import ControlServer, pending
+from .metrics import Metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class Front(ControlServer):
+    """
+    The endpoint, control point and pubpoint of center `name`, whose
+    work is done by `workers`, a list of their ``(endpoint,
+    controlpoint, pubpoint)``.
+    """
+    worker_timeout = 5 # seconds to wait for a worker to answer
+
+    def __init__(self,
+                 name,
+                 endpoint,
+                 controlpoint,
+                 workers,
+                 accept=codec.SAFE,
+                 pubpoint=None,
+                 pub_hwm=10000):
+        self.name = name
+        self.workers = workers
+        self.accept = accept
+        self.pubpoint = pubpoint
+        self.metrics = Metrics()
+        self.cursors = {}
+        self.cursor_ids = count()
+
+        self.context = zmq.Context()
+        self.router = self.context.socket(zmq.ROUTER)
+        self.router.bind(endpoint)
+        self.control = self.context.socket(zmq.ROUTER)
+        self.control.bind(controlpoint)
+        self.pairs = []
+        for worker_endpoint, _, _ in workers:
+            pair = self.context.socket(zmq.PAIR)
+            pair.connect(worker_endpoint)
+            self.pairs.append(pair)
+
+        self.xpub = self.xsub = None
+        if pubpoint:
+            # events from every worker go out on the one pubpoint
+            self.xpub = self.context.socket(zmq.XPUB)
+            self.xpub.setsockopt(zmq.SNDHWM, pub_hwm)
+            self.xpub.bind(pubpoint)
+            self.xsub = self.context.socket(zmq.XSUB)
+            for _, _, worker_pubpoint in workers:
+                self.xsub.connect(worker_pubpoint)
+
+    def start(self):
+        gevent.spawn(self._read_router)
+        for pair in self.pairs:
+            gevent.spawn(self._read_pair, pair)
+        if self.xpub is not None:
+            gevent.spawn(self._forward, self.xpub, self.xsub)
+            gevent.spawn(self._forward, self.xsub, self.xpub)
+        controller = gevent.spawn(self._read_control)
+        controller.join()
+
+    def run(self):
+        return gevent.spawn(self.start)
+
+    def _read_router(self):
+        pairs = self.pairs
+        while True:
+            frames = self.router.recv_multipart()
+            pairs[(zlib.crc32(frames[0]) & 0xffffffff) % len(pairs)].send_multipart(frames)
+            self.metrics.count('router.in')
+
+    def _read_pair(self, pair):
+        # replies and commands for watchers, [identity, '', ...]
+        while True:
+            self.router.send_multipart(pair.recv_multipart())
+            self.metrics.count('router.out')
+
+    def _forward(self, source, sink):
+        while True:
+            sink.send_multipart(source.recv_multipart())
+
+    # control requests are answered from greenlets, as they wait on
+    # the workers
+
+    def _answer(self, reply, function, *args):
+        try:
+            response = function(*args)
+        except Exception, e:
+            response = e
+        if response is not pending:
+            reply(response)
+
+    def _spawn(self, reply, function, *args):
+        gevent.spawn(self._answer, reply, function, *args)
+        return pending
+
+    def _call(self, worker, timeout, function):
+        control = Control(self.workers[worker][1], self.context)
+        try:
+            with gevent.Timeout(timeout):
+                return function(control)
+        finally:
+            control.close()
+
+    def _scatter(self, function, timeout=None):
+        """
+        Call `function` with a control client for every worker and
+        return a dict of worker number to result, leaving out workers
+        that did not answer within `timeout` seconds.  Errors from a
+        worker are raised.
+        """
+        timeout = timeout or self.worker_timeout
+        return self._join([gevent.spawn(self._call, i, timeout, function)
+                           for i in xrange(len(self.workers))])
+
+    def _join(self, jobs):
+        gevent.joinall(jobs)
+        results = {}
+        for i, job in enumerate(jobs):
+            if job.successful():
+                results[i] = job.value
+            elif isinstance(job.exception, (gevent.Timeout, ControlTimeout)):
+                logger.warning('worker %d did not answer', i)
+            else:
+                raise job.exception
+        return results
+
+    def _request_all(self, cmd, args, timeout=None):
+        return self._scatter(lambda control: control.request(cmd, args), timeout)
+
+    def _control_query(self, args, reply):
+        return self._spawn(reply, self._query, reply, *args)
+
+    def _query(self, reply, select, where, limit):
+        # the workers' rows are read a page at a time as they are used
+        page_size = min(limit or self.page_size, self.page_size)
+        rows = self._join([gevent.spawn(self._open_query, i, select, where, page_size)
+                           for i in xrange(len(self.workers))])
+        return self._page(reply, list(select), chain(*rows.values()), limit)
+
+    def _open_query(self, worker, select, where, page_size):
+        control = Control(self.workers[worker][1], self.context,
+                          timeout=self.worker_timeout)
+        try:
+            keys, rows = control.query(select, where, page_size)
+        except Exception:
+            control.close()
+            raise
+        return closing(control, rows)
+
+    def _control_aggregate(self, args, reply):
+        return self._spawn(reply, self._aggregate, *args)
+
+    def _aggregate(self, group_by, aggregates, where, order, limit):
+        # workers roll up their own rows, without a limit as a group
+        # can be in the top on the whole but not on any one worker
+        results = self._request_all(
+            'aggregate', (group_by, partials(aggregates), where, None, None))
+        return merge(group_by, aggregates, results.values(), order, limit)
+
+    def _control_kill(self, args, reply):
+        return self._spawn(reply, self._kill, args)
+
+    def _kill(self, args):
+        uuids, where, sig, timeout = args
+        results = {}
+        for answer in self._request_all(
+                'kill', args, self.worker_timeout + timeout).itervalues():
+            for uuid, result in answer.iteritems():
+                # only the worker with a route to a process knows it
+                if result != 'unknown' or uuid not in results:
+                    results[uuid] = result
+        return results
+
+    def _control_stats(self, args, reply):
+        return self._spawn(reply, self._stats)
+
+    def _stats(self):
+        stats = self.metrics.as_dict()
+        stats['workers'] = dict(('worker%d' % i, s) for i, s in
+                                self._request_all('stats', None).iteritems())
+        return stats
+
+    def _control_pubpoint(self, args, reply):
+        return self.pubpoint
+
+    # commands about one process go to the worker that has it
+
+    def _on_owner(self, cmd, uuid, args, timeout=None):
+        owners = [i for i, knows in self._request_all('knows', uuid).iteritems()
+                  if knows]
+        # otherwise any worker gives the answer for an unknown process
+        worker = owners[0] if owners else 0
+        return self._call(worker, timeout or self.worker_timeout,
+                          lambda control: control.request(cmd, args))
+
+    def _control_history(self, args, reply):
+        return self._spawn(reply, self._on_owner, 'history', args[0], args)
+
+    def _control_summary(self, args, reply):
+        return self._spawn(reply, self._on_owner, 'summary', args[0], args)
+
+    def _control_tail(self, args, reply):
+        return self._spawn(reply, self._on_owner, 'tail', args[0], args)
+
+    def _control_follow(self, args, reply):
+        uuid, stream, seq, timeout = args
+        return self._spawn(reply, self._on_owner, 'follow', uuid, args,
+                           self.worker_timeout + timeout)
@@ -0,0 +1,44 @@
+import logging
+import time
+from cliff.lister import Lister
+
+
+class History(Lister):
+    """
+    Show the resource history of a process, or with -s its max, avg
+    and p95 over the window.
+    """
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = Lister.get_parser(self, prog_name)
+        parser.add_argument('uuid')
+        parser.add_argument(
+            '-f', '--field', dest='field', default='cpu_percent',
+            help='Field to show, like cpu_percent or memory_rss.',
+            )
+        parser.add_argument(
+            '-w', '--window', dest='window', type=float, default=600,
+            help='Seconds of history to show.',
+            )
+        parser.add_argument(
+            '-s', '--summary', dest='summary', action='store_true',
+            default=False,
+            help='Show max, avg and p95 instead of the points.',
+            )
+        return parser
+
+    def take_action(self, parsed_args):
+        args = parsed_args
+        request = self.app.control().request
+        if args.summary:
+            summary = request('summary', (args.uuid, args.field, args.window))
+            keys = ('step', 'count', 'max', 'avg', 'p95')
+            return keys, [tuple(summary[k] for k in keys)]
+
+        step, points = request(
+            'history', (args.uuid, args.field, time.time() - args.window, None))
+        return (('time', 'avg', 'max', 'count'),
+                [(time.strftime('%H:%M:%S', time.localtime(t)), avg, top, count)
+                 for t, avg, top, count in points])
@@ -1,21 +1,41 @@
 import logging
-import zmq.green as zmq
-from cliff.lister import Command
-from cPickle import loads, dumps
+import signal
+from cliff.lister import Lister
 
-class Kill(Command):
+from .query import parse_where
+
+
+class Kill(Lister):
+    """
+    Signal processes by uuid or by query, in one request to the center.
+    """
 
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
-        parser = Command.get_parser(self, prog_name)
-        parser.add_argument('uuids', nargs='+')
+        parser = Lister.get_parser(self, prog_name)
+        parser.add_argument('uuids', nargs='*')
+        parser.add_argument(
+            '-W', '--where', dest='where', default=None,
+            help='Also signal the processes matching these conditions, '
+                 'like "state_name = RUNNING and username = bob".',
+            )
+        parser.add_argument(
+            '-s', '--signal', dest='signal', type=int, default=signal.SIGTERM,
+            help='Signal number to send.',
+            )
+        parser.add_argument(
+            '-t', '--timeout', dest='timeout', type=float, default=5,
+            help='Seconds to wait for processes to acknowledge.',
+            )
         return parser
 
-    def run(self, parsed_args):
-        context = zmq.Context(1)
-        socket = context.socket(zmq.REQ)
-        socket.connect(self.app_args.control)
-        socket.send_multipart(['kill', dumps(parsed_args.uuids)])
-        result = socket.recv()
-        return loads(result)
+    def take_action(self, parsed_args):
+        args = parsed_args
+        if not (args.uuids or args.where):
+            raise ValueError('give uuids or --where')
+        control = self.app.control()
+        results = control.request(
+            'kill', (args.uuids, parse_where(args.where),
+                     args.signal, args.timeout))
+        return ('uuid', 'result'), sorted(results.items())
@@ -0,0 +1,116 @@
+from collections import OrderedDict, deque
+
+
+class LineRing(object):
+    """
+    The most recent complete lines written to a stream, up to
+    `max_bytes` of them, kept in one bytearray with a deque of line
+    end offsets.  Every completed line gets a sequence number so
+    followers can ask for what came after the last line they saw.
+    """
+
+    def __init__(self, max_bytes=65536):
+        self.max_bytes = max_bytes
+        self.data = bytearray()
+        self.start = 0      # offset of the oldest kept line
+        self.ends = deque() # end offsets of the kept complete lines
+        self.seq = 0        # number of lines ever completed
+
+    def __len__(self):
+        return len(self.ends)
+
+    def write(self, chunk):
+        base = len(self.data)
+        self.data.extend(chunk)
+        pos = chunk.find('\n')
+        while pos != -1:
+            self.ends.append(base + pos + 1)
+            self.seq += 1
+            pos = chunk.find('\n', pos + 1)
+
+        # forget the oldest lines, then any partial line, over budget
+        size = len(self.data)
+        while self.ends and size - self.start > self.max_bytes:
+            self.start = self.ends.popleft()
+        if size - self.start > self.max_bytes:
+            self.start = size - self.max_bytes
+
+        # compact once the dead prefix is as large as the budget
+        if self.start >= self.max_bytes:
+            del self.data[:self.start]
+            self.ends = deque(end - self.start for end in self.ends)
+            self.start = 0
+
+    def lines(self, count=None):
+        """
+        Return the last `count` complete lines, or all of them.
+        """
+        ends = self.ends
+        if count is not None:
+            count = min(count, len(ends))
+            ends = list(ends)[len(ends) - count:] if count else []
+        return self._slice(ends)
+
+    def since(self, seq):
+        """
+        Return the complete lines numbered after `seq`, or as many of
+        them as are still kept.
+        """
+        if seq > self.seq:
+            seq = 0 # the ring was replaced, start over
+        return self.lines(self.seq - seq)
+
+    def _slice(self, ends):
+        out = []
+        if not ends:
+            return out
+        ends = list(ends)
+        index = len(self.ends) - len(ends)
+        begin = self.ends[index - 1] if index else self.start
+        data = self.data
+        for end in ends:
+            out.append(str(data[begin:end]))
+            begin = end
+        return out
+
+
+class OutputStore(object):
+    """
+    `LineRing` buffers keyed by (uuid, stream), keeping at most
+    `max_streams` of them and evicting the least recently written.
+    """
+
+    def __init__(self, max_bytes=65536, max_streams=10000):
+        self.max_bytes = max_bytes
+        self.max_streams = max_streams
+        self.rings = OrderedDict()
+
+    def write(self, uuid, stream, data):
+        key = (uuid, stream)
+        ring = self.rings.pop(key, None)
+        if ring is None:
+            ring = LineRing(self.max_bytes)
+            if len(self.rings) >= self.max_streams:
+                self.rings.popitem(last=False)
+        self.rings[key] = ring
+        ring.write(data)
+        return ring
+
+    def get(self, uuid, stream):
+        return self.rings.get((uuid, stream))
+
+    def tail(self, uuid, stream, count=None):
+        """
+        Return ``(lines, seq)``, the last `count` lines of a stream
+        and the sequence number to follow it from.
+        """
+        ring = self.get(uuid, stream)
+        if ring is None:
+            return [], 0
+        return ring.lines(count), ring.seq
+
+    def since(self, uuid, stream, seq):
+        ring = self.get(uuid, stream)
+        if ring is None:
+            return [], seq
+        return ring.since(seq), ring.seq
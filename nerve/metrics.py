@@ -0,0 +1,110 @@
+"""
+Cheap counters and histograms for the center's hot paths.
+
+Histograms bucket values on a log scale with `sub_buckets` linear
+buckets per power of two, like HDR histograms, so recording is a few
+integer operations and percentiles are within 1 / `sub_buckets` of
+the true value at any magnitude.
+"""
+
+
+class Histogram(object):
+    """
+    Distribution of non-negative values, kept as integers of
+    1 / `scale` units, microseconds for seconds by default.
+    """
+
+    def __init__(self, scale=1e6, sub_bits=3, max_bits=48):
+        self.scale = scale
+        self.sub_bits = sub_bits
+        self.sub_buckets = 1 << sub_bits
+        self.counts = [0] * ((max_bits + 1) * self.sub_buckets)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value):
+        if value < self.sub_buckets:
+            return value
+        shift = value.bit_length() - self.sub_bits - 1
+        return (shift + 1) * self.sub_buckets + (value >> shift) - self.sub_buckets
+
+    def _lowest(self, index):
+        if index < self.sub_buckets:
+            return index
+        shift = index // self.sub_buckets - 1
+        return (index % self.sub_buckets + self.sub_buckets) << shift
+
+    def record(self, value):
+        value = int(value * self.scale)
+        if value < 0:
+            value = 0
+        index = min(self._index(value), len(self.counts) - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """
+        Return the lowest value of the bucket holding the `p` th
+        percentile, or None if nothing was recorded.
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(round(self.count * p / 100.0)))
+        if rank >= self.count:
+            return self.max / self.scale
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._lowest(index), self.max) / self.scale
+        return self.max / self.scale
+
+    def as_dict(self):
+        scale = self.scale
+        result = dict(count=self.count,
+                      min=self.min and self.min / scale,
+                      max=self.max / scale,
+                      mean=self.count and self.total / scale / self.count)
+        for p in (50, 90, 99, 99.9):
+            result['p%s' % ('%g' % p).replace('.', '')] = self.percentile(p)
+        return result
+
+
+class Metrics(object):
+    """
+    Named counters and histograms, created on first use.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def histogram(self, name, scale=1e6):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(scale)
+        return histogram
+
+    def time(self, name, seconds):
+        """
+        Record a duration of `seconds` under `name`.
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.record(seconds)
+
+    def as_dict(self):
+        return dict(counters=dict(self.counters),
+                    histograms=dict((name, h.as_dict())
+                                    for name, h in self.histograms.iteritems()))
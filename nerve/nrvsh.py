@@ -1,8 +1,34 @@
 import logging
 import sys
 
+from cliff import commandmanager
 from cliff.app import App
-from cliff.commandmanager import CommandManager
+
+from . import commands
+
+
+class CommandManager(commandmanager.CommandManager):
+    """
+    Commands from the cached index of entry points, see
+    `nerve.commands`.
+    """
+
+    def _load_commands(self):
+        # older cliff
+        self.load_commands(self.namespace)
+
+    def load_commands(self, namespace, refresh=False):
+        for name, target in commands.index(namespace, refresh=refresh).iteritems():
+            cmd_name = name.replace('_', ' ') if self.convert_underscores else name
+            self.commands[cmd_name] = commands.EntryPoint(name, target)
+
+    def find_command(self, argv):
+        try:
+            return commandmanager.CommandManager.find_command(self, argv)
+        except ValueError:
+            # the index may predate the command, look again once
+            self.load_commands(self.namespace, refresh=True)
+            return commandmanager.CommandManager.find_command(self, argv)
 
 
 class Nrvsh(App):
@@ -15,6 +41,18 @@ class Nrvsh(App):
             version='0.1',
             command_manager=CommandManager('nrv.commands'),
             )
+        self._control = None
+
+    def control(self):
+        """
+        Return the control client commands use.  It is made on first
+        use and kept, so the interactive shell runs every command over
+        one connection.
+        """
+        if self._control is None:
+            from .client import Control
+            self._control = Control(self.options.control)
+        return self._control
 
     def build_option_parser(self, description, version):
         parser = App.build_option_parser(self, description, version)
@@ -33,6 +71,10 @@ class Nrvsh(App):
         self.log.debug('clean_up %s', cmd.__class__.__name__)
         if err:
             self.log.debug('got an error: %s', err)
+            if self._control is not None:
+                # a request may have been cut short, start afresh
+                self._control.close()
+                self._control = None
 
 
 def main(argv=sys.argv[1:]):
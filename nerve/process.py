@@ -1,7 +1,11 @@
+from . import codec
+from .clock import monotonic
+from .restart import RestartPolicy
+from .sampler import Sampler
 from .states import state 
 from gevent import socket
 from gevent.event import Event
-from cPickle import dumps, loads
+from gevent.queue import Full, Queue
 from datetime import datetime
 from uuid import uuid1
 
@@ -15,6 +19,16 @@ import sys
 import zmq.green as zmq
 
 
+_missing = object()
+
+# chunks smaller than this are copied into 0mq messages, larger ones
+# are handed over without a copy
+_zero_copy_size = 8192
+
+# fields that change on every ping whatever the process does
+_steady = frozenset(('ping_time', 'uptime', 'cpu_user', 'cpu_system'))
+
+
 class Process(object):
     """
     Spawn and watch a subprocess and send interesting events to the
@@ -22,6 +36,9 @@ class Process(object):
     """
 
     process = None
+    sampler = None
+    child_watcher = None
+    started = None
     identity = None
     uuid = None
     center = None
@@ -53,11 +70,25 @@ class Process(object):
                  nrv_autorestart=False, # restart failed process?
                  nrv_startsecs=1,       # how long to try restarting
                  nrv_exitcodes=(0,2),   # "good" exit codes, no restart
-                 nrv_poll_interval=.1,  # interval to poll subprocess for life
+                 nrv_backoff=1,         # seconds before the first restart
+                 nrv_backoff_max=60,    # most seconds between restarts
+                 nrv_backoff_jitter=.5, # fraction of the wait to randomize
+                 nrv_restart_window=300, # seconds the restart budget covers
+                 nrv_restart_budget=10, # most restarts in the window
+                 nrv_poll_interval=.1,  # poll interval without child watchers
                  nrv_ping_interval=1,   # interval to ping the center with stats
+                 nrv_ping_interval_max=10, # most seconds between pings when idle
+                 nrv_ping_change=.2,    # relative change in a stat that is news
+                 nrv_keyframe_interval=30, # pings between full stat records
                  nrv_wait_to_die=3,     # time to wait for the subproc to die
                  nrv_linger=0,          # 0mq socket linger
                  nrv_ssh_server=None,   # ssh server to tunnel to center endpoint
+                 nrv_codec=codec.DEFAULT, # wire encoding for messages
+                 nrv_sample_fields=None, # psutil fields to report, None for all
+                 nrv_link=None,         # shared connection, see nerve.agent
+                 nrv_chunk_size=65536,  # max bytes read from stdout/err at once
+                 nrv_output_queue=64,   # chunks of output queued per stream
+                 nrv_output_policy='block', # 'block' or 'drop' output when full
                  ):
         """
         Spawn a subprocess.Popen with 'args', watch the process.  See
@@ -65,6 +96,7 @@ class Process(object):
         """
         self.endpoint = nrv_endpoint
         self.args = args
+        self.codec = codec.get(nrv_codec).name
 
         # pass most args to Popen, but force PIPEs for stdio
         self.kwargs = dict(
@@ -86,30 +118,59 @@ class Process(object):
         self.active = Event()
         self.active.set()
 
-        self.context = zmq.Context()
-
         self.stdin = stdin
         self.stdout = stdout
         self.stderr = stderr
 
+        if nrv_output_policy not in ('block', 'drop'):
+            raise ValueError('unknown output policy %r' % nrv_output_policy)
+        self.chunk_size = nrv_chunk_size
+        self.output_queue = nrv_output_queue
+        self.output_policy = nrv_output_policy
+        self.dropped = dict(out=0, err=0)
+
         self.recv_in = nrv_recv_in
         self.send_out = nrv_send_out
         self.send_err = nrv_send_err
         if nrv_send_all:
             self.recv_in = self.send_out = self.send_err = True
             
-        self.restart_retries = nrv_restart_retries
-        self.restart_attempts = 0
-        self.autorestart = nrv_autorestart
         self.startsecs = nrv_startsecs
-        self.exitcodes = set(nrv_exitcodes)
+        self.restart = RestartPolicy(
+            autorestart=nrv_autorestart,
+            exitcodes=nrv_exitcodes,
+            startsecs=nrv_startsecs,
+            retries=nrv_restart_retries,
+            backoff=nrv_backoff,
+            backoff_max=nrv_backoff_max,
+            jitter=nrv_backoff_jitter,
+            window=nrv_restart_window,
+            budget=nrv_restart_budget,
+            )
 
         self.ping_interval = nrv_ping_interval
+        self.ping_interval_max = max(nrv_ping_interval, nrv_ping_interval_max)
+        self.ping_change = nrv_ping_change
+        self.next_ping = nrv_ping_interval
+        self.center_interval = 0 # the least the center asks for
+        self.center_max = None # the most the center allows
+        self.wakeup = Event()
+        self.keyframe_interval = nrv_keyframe_interval
+        self.sample_fields = nrv_sample_fields
+        self.reported = None
+        self.deltas = 0
         self.poll_interval = nrv_poll_interval
         self.wait_to_die = nrv_wait_to_die
-        self.uptime = None
+        self.exited = Event()
+
+        if nrv_link is not None:
+            # an agent multiplexes us over its own connection
+            self.context = None
+            self.io = nrv_link
+            return
 
         # create a connection to the zerovisor router
+        self.context = zmq.Context()
         self.io = self.context.socket(zmq.DEALER)
         if nrv_identity is not None:
             self.io.setsockopt(zmq.IDENTITY, nrv_identity)
@@ -124,9 +185,23 @@ class Process(object):
         self.io.setsockopt(zmq.LINGER, nrv_linger)
 
     def start(self):
+        self.pinger = gevent.spawn(self._pinger)
+        while True:
+            rc = self._run()
+            if rc is None:
+                return
+            # wait out the backoff, or give up
+            delay = self.restart.delay(rc, self.uptime, monotonic())
+            if delay is None:
+                return self.full_exit()
+            gevent.sleep(delay)
+
+    def _run(self):
+        """
+        Run the child once, returning its exit code.
+        """
         # start the process and then the green threads the handle the
         # various i/o and signal transits
-        self.uptime = 0
         if self.args:
             self._start_subproc()
         else:
@@ -134,9 +209,14 @@ class Process(object):
 
         # spawn workers
         self.stdiner = gevent.spawn(self._write_stdin)
-        self.stdouter = gevent.spawn(self._read_stdout)
-        self.stderrer = gevent.spawn(self._read_stderr)
-        self.pinger = gevent.spawn(self._pinger)
+        self.stdouter = self.stderrer = None
+        if self.process:
+            self.stdouter = gevent.spawn(self._read_output, 'out',
+                                         self.process.stdout, self.send_out,
+                                         self.stdout)
+            self.stderrer = gevent.spawn(self._read_output, 'err',
+                                         self.process.stderr, self.send_err,
+                                         self.stderr)
         self.poller = gevent.spawn(self._poll_process)
 
         # wait here for the process to die naturally
@@ -144,25 +224,7 @@ class Process(object):
 
         # if poll returns, then the process is likely dead, cleanup.
         if self.process:
-            rc = self.terminate()
-            #attempt a restart
-            self.handle_restart(rc)
-
-    def handle_restart(self, rc):
-        if self.autorestart == False:
-            return self.full_exit()
-        
-        if self.autorestart == True:
-            return self.start()
-
-        if 0 < self.uptime < self.startsec and self.start_attempts < self.restart_retries:
-            self.start_attempts += 1
-            return self.start()
-
-        if not rc in self.exitcodes and self.autorestart == 'unexpected':
-            return self.start()
-
-        return self.full_exit()
+            return self.terminate()
 
     def terminate(self, with_exit=False):
         # terminate the possibly dead process, clean up the blood and
@@ -172,13 +234,13 @@ class Process(object):
         # try to TERM it, then KILL it
 
         # stab it repeatedly, improve the logic here
-        while self.wait_to_die and self.process.poll() is None:
+        while self.wait_to_die and not self.exited.is_set():
             self.process.terminate()
             self.wait_to_die -= 1
-            gevent.sleep(1)
+            self.exited.wait(1)
 
         # shoot it in the head
-        if self.process.poll() is None:
+        if not self.exited.is_set():
             self.process.kill()
 
         # who knows what the right order of killing, flushing and
@@ -188,7 +250,7 @@ class Process(object):
         gevent.joinall([self.stdouter, self.stderrer])
 
         # Finally, wait for the process to be dead.  It should be!
-        self.process.wait()
+        self.exited.wait()
 
         # before we go, send off the autopsy report
         rc = self.process.returncode
@@ -222,7 +284,8 @@ class Process(object):
 
         # cleanup zeromq stuff
         self.io.close()
-        self.context.term()
+        if self.context is not None:
+            self.context.term()
 
     def _start_subproc(self):
         """
@@ -230,13 +293,61 @@ class Process(object):
         not to block.
         """
         self.uuid = uuid1().hex
+        self.reported = None
+        self.exited = Event()
+        loop = gevent.get_hub().loop
+        install_sigchld = getattr(loop, 'install_sigchld', None)
+        if hasattr(loop, 'child') and install_sigchld is not None:
+            # before the child exists, a SIGCHLD from a child that dies
+            # at once would otherwise go to the default handler and the
+            # loop would never reap it
+            install_sigchld()
         self.process = proc = subprocess.Popen(self.args, **self.kwargs)
+        self.started = monotonic()
+        self._watch_child()
+        self.sampler = Sampler(proc.pid, self.sample_fields)
 
         fcntl.fcntl(proc.stdin, fcntl.F_SETFL, os.O_NONBLOCK)
         fcntl.fcntl(proc.stdout, fcntl.F_SETFL, os.O_NONBLOCK)
         fcntl.fcntl(proc.stderr, fcntl.F_SETFL, os.O_NONBLOCK)
         self.state = state.STARTING
 
+    def _watch_child(self):
+        """
+        Set `exited` when the child dies, using the hub's SIGCHLD
+        driven child watchers, or polling where the loop has none.
+        The loop only reaps children when it runs, so a child that has
+        already exited is still found here.
+        """
+        loop = gevent.get_hub().loop
+        if not hasattr(loop, 'child'):
+            gevent.spawn(self._poll_exit)
+            return
+        self.child_watcher = watcher = loop.child(self.process.pid, False)
+        watcher.start(self._child_exited, watcher)
+
+    def _child_exited(self, watcher):
+        # the loop reaped the child, so record its status on the Popen
+        # object ourselves, poll() and wait() would only see ECHILD
+        watcher.stop()
+        status = watcher.rstatus
+        if os.WIFSIGNALED(status):
+            self.process.returncode = -os.WTERMSIG(status)
+        else:
+            self.process.returncode = os.WEXITSTATUS(status)
+        self.exited.set()
+
+    def _poll_exit(self):
+        while self.process.poll() is None:
+            gevent.sleep(self.poll_interval)
+        self.exited.set()
+
+    @property
+    def uptime(self):
+        if self.started is None:
+            return None
+        return monotonic() - self.started
+
     def _flush(self):
         if self.process:
             self.process.stdout.flush()
@@ -245,17 +356,53 @@ class Process(object):
     # send/recv helpers
 
     def _send(self, op, data=None):
-        payload = ['', 'process', op, dumps(data)]
+        payload = ['', 'process', op, codec.dumps(data, self.codec)]
         self.io.send_multipart(payload)
 
+    def _send_raw(self, op, data):
+        # output goes out as is, no codec
+        payload = ['', 'process', op, self.uuid, data]
+        self.io.send_multipart(payload, copy=len(data) < _zero_copy_size)
+
+    def _report(self, op, info):
+        """
+        Send the full record `info`, it becomes the base for deltas.
+        """
+        self._send(op, info)
+        self.reported = info
+        self.deltas = 0
+        if op == 'state':
+            # things are happening, watch closely again
+            self.next_ping = self.ping_interval
+            self.wakeup.set()
+
+    def _report_delta(self, info):
+        """
+        Send only the fields of `info` that changed since the last
+        report, or the full record if a keyframe is due.
+        """
+        if self.reported is None or self.deltas >= self.keyframe_interval:
+            return self._report('ping', info)
+        delta = dict((k, v) for k, v in info.iteritems()
+                     if self.reported.get(k, _missing) != v)
+        delta['uuid'] = self.uuid
+        self._send('delta', delta)
+        self.reported.update(delta)
+        self.deltas += 1
+
     def _recv(self):
         return self.io.recv_multipart()
 
     # non-blocking helpers for read/write
 
-    def _read(self, handle):
-        socket.wait_read(handle.fileno())
-        return handle.read()
+    def _read(self, fd):
+        while True:
+            socket.wait_read(fd)
+            try:
+                return os.read(fd, self.chunk_size)
+            except OSError, e:
+                if e.errno != errno.EAGAIN:
+                    raise
 
     def _write(self, handle, data):
         socket.wait_write(handle.fileno())
@@ -265,14 +412,35 @@ class Process(object):
 
     def _write_stdin(self):
         while True:
+            # ['', command, payload, target uuids...], no targets
+            # means the message is for every process
             msg = self._recv()
             assert msg.pop(0) == ''
             cmd = msg.pop(0)
+            payload = msg.pop(0) if msg else ''
+            if msg and self.uuid not in msg:
+                continue
+
             if cmd == 'kill':
-                os.kill(self.process.pid, loads(msg[0]))
+                error = None
+                try:
+                    os.kill(self.process.pid, codec.loads(payload, codec.SAFE))
+                except Exception, e:
+                    error = str(e)
+                self._send('ack', [self.uuid, cmd, error])
 
             elif cmd == 'center':
-                self.center = msg[0]
+                try:
+                    info = codec.loads(payload, codec.SAFE)
+                except codec.CodecError:
+                    # older centers send only their name
+                    info = dict(name=payload)
+                self.center = info['name']
+                self.center_interval = info.get('interval') or 0
+                self.center_max = info.get('max_interval')
+
+            elif cmd == 'keyframe':
+                self.reported = None
 
             elif cmd == 'flush':
                 self._flush()
@@ -281,8 +449,7 @@ class Process(object):
                 socket.wait_write(self.process.stdin.fileno())
                 while True:
                     try:
-                        while msg:
-                            self.process.stdin.write(msg.pop(0))
+                        self.process.stdin.write(payload)
                         break
                     except IOError, e:
                         if e.args[0] != errno.EAGAIN:
@@ -296,87 +463,143 @@ class Process(object):
                     state_name=state.to_str[self.state],
                     state=self.state,
                     ping_time=datetime.utcnow())
+        info.update(self.restart.info())
         pu = self._get_psutil()
         if pu:
             info.update(pu)
         return info
 
-    def _read_stdout(self):
+    def _read_output(self, op, handle, send, local):
+        """
+        Read the child's `handle` until it closes, passing the output
+        through bounded queues to a sender to the center when `send`
+        is true and to a writer to file `local`.  When the center
+        queue is full the reader waits, or drops the chunk if the
+        output policy is 'drop'.  A full local queue always waits.
+        """
+        sender = writer = to_center = to_local = None
+        if send:
+            to_center = Queue(self.output_queue)
+            sender = gevent.spawn(self._drain, to_center, self._send_raw, op)
+        if local:
+            to_local = Queue(self.output_queue)
+            writer = gevent.spawn(self._drain, to_local, self._write, local)
+
+        fd = handle.fileno()
         while True:
             self.active.wait()
-            data = self._read(self.process.stdout)
+            data = self._read(fd)
             if not data:
-                return # the pipe is closed
-            if self.send_out:
-                self._send('out', data)
-            if self.stdout:
-                gevent.spawn(self._write, self.stdout, data)
-
-    def _read_stderr(self):
+                break # the pipe is closed
+            if sender is not None:
+                if self.output_policy == 'block':
+                    to_center.put(data)
+                else:
+                    try:
+                        to_center.put_nowait(data)
+                    except Full:
+                        self.dropped[op] += len(data)
+            if writer is not None:
+                to_local.put(data)
+
+        for queue, drain in ((to_center, sender), (to_local, writer)):
+            if drain is not None:
+                queue.put(None)
+                drain.join()
+
+    def _drain(self, queue, write, target):
+        """
+        Call `write(target, data)` for chunks from `queue` until a None
+        arrives, joining chunks that queued up behind each other into
+        writes of up to `chunk_size` bytes.
+        """
         while True:
-            self.active.wait()
-            data = self._read(self.process.stderr)
-            if not data:
+            data = queue.get()
+            if data is None:
                 return
-            if self.send_err:
-                self._send('err', data)
-            if self.stderr:
-                gevent.spawn(self._write, self.stderr, data)
+            pending = [data]
+            size = len(data)
+            while size < self.chunk_size and not queue.empty():
+                data = queue.peek()
+                if data is None or size + len(data) > self.chunk_size:
+                    break
+                queue.get()
+                pending.append(data)
+                size += len(data)
+            write(target, pending[0] if len(pending) == 1 else ''.join(pending))
 
     def _poll_process(self):
         """
         Timekeeper and process checker.
         """
         self.active.wait()
-        while self.process.poll() is None:
-            self.uptime += self.poll_interval
-            if self.uptime > self.startsecs and self.state != state.RUNNING:
-                self.start_attempts = 0
-                self.state = state.RUNNING
-                
-            gevent.sleep(self.poll_interval)
+        self.exited.wait(self.startsecs)
+        if not self.exited.is_set():
+            self.restart.started()
+            self.state = state.RUNNING
+            self.exited.wait()
+
+    def _changed(self, info):
+        """
+        Is `info` news since the last report?  Any stat moving by more
+        than `ping_change` of its value, or any other field changing,
+        is; counters that always grow are not.
+        """
+        if self.reported is None:
+            return True
+        for k, v in info.iteritems():
+            if k in _steady:
+                continue
+            old = self.reported.get(k, _missing)
+            if old is _missing:
+                return True
+            if (isinstance(v, (int, long, float)) and
+                    isinstance(old, (int, long, float))):
+                if abs(v - old) > self.ping_change * max(abs(old), 1):
+                    return True
+            elif v != old:
+                return True
+        return False
 
     def _pinger(self):
         """
-        While io connection to zerovisor is open, poll the process
+        While io connection to zerovisor is open, poll the process.
+        Pings back off to `ping_interval_max` while the stats hold
+        steady and return to `ping_interval` when they move or the
+        state changes, but never come faster than the center asks.
         """
         while not self.io.closed:
             self.active.wait()
-            gevent.sleep(self.ping_interval)
-            self._send('ping', self.resource_info())
+            self.wakeup.clear()
+            if self.wakeup.wait(self._ping_wait()):
+                # a state change was just reported in full
+                continue
+            self._ping(self.resource_info())
+
+    def _ping_wait(self):
+        """
+        Seconds to the next ping, no sooner than the center asks and no
+        later than it allows before marking the process UNKNOWN.
+        """
+        wait = max(self.next_ping, self.center_interval)
+        if self.center_max:
+            wait = min(wait, self.center_max)
+        return wait
+
+    def _ping(self, info):
+        if self._changed(info):
+            self.next_ping = self.ping_interval
+        else:
+            self.next_ping = min(self.next_ping * 2, self.ping_interval_max)
+        self._report_delta(info)
 
     def _get_psutil(self):
-        if self.process.poll() is None:
-            p = psutil.Process(self.process.pid)
-            data = dict(
-                cmdline=' '.join(p.cmdline),
-                create_time=datetime.fromtimestamp(p.create_time),
-                cpu_percent=p.get_cpu_percent(),
-                cpu_user=p.get_cpu_times().user,
-                cpu_system=p.get_cpu_times().system,
-                ionice_class=p.get_ionice().ioclass,
-                ionice_value=p.get_ionice().value,
-                memory_rss=p.get_memory_info().rss,
-                memory_vms=p.get_memory_info().vms,
-                memory_percent=p.get_memory_percent(),
-                num_threads=p.get_num_threads(),
-                gid_real=p.gids.real,
-                gid_effective=p.gids.effective,
-                gid_saved=p.gids.saved,
-                is_running=p.is_running(),
-                name=p.name,
-                nice=p.nice,
-                pid=p.pid,
-                ppid=p.ppid,
-                status=p.status,
-                terminal=p.terminal,
-                uid_real=p.gids.real,
-                uid_effective=p.gids.effective,
-                uid_saved=p.gids.saved,
-                username=p.username,
-                ) 
-            return data
- 
+        if self.sampler is not None and not self.exited.is_set():
+            try:
+                return self.sampler.sample()
+            except psutil.NoSuchProcess:
+                return None
+
 
 def main():
     import argparse
@@ -453,6 +676,41 @@ def main():
         default=int(configs.get('restart-retries', 3)),
         help='How many retries to allow before permanent failure.')
 
+    parser.add_argument(
+        '-a', '--autorestart',
+        dest='autorestart',
+        default=configs.get('autorestart', 'false'),
+        choices=('true', 'false', 'unexpected'),
+        help='Restart the child always, never, or on unexpected exit codes.')
+
+    parser.add_argument(
+        '-b', '--backoff',
+        type=float,
+        dest='backoff',
+        default=float(configs.get('backoff', 1)),
+        help='Seconds to wait before a restart, doubled per failed start.')
+
+    parser.add_argument(
+        '-B', '--backoff-max',
+        type=float,
+        dest='backoff_max',
+        default=float(configs.get('backoff-max', 60)),
+        help='Most seconds to wait before a restart.')
+
+    parser.add_argument(
+        '-W', '--restart-window',
+        type=float,
+        dest='restart_window',
+        default=float(configs.get('restart-window', 300)),
+        help='Seconds over which --restart-budget applies.')
+
+    parser.add_argument(
+        '-R', '--restart-budget',
+        type=int,
+        dest='restart_budget',
+        default=int(configs.get('restart-budget', 10)),
+        help='Most restarts allowed within --restart-window seconds.')
+
     parser.add_argument(
         '-p', '--ping-interval',
         type=float, 
@@ -460,12 +718,34 @@ def main():
         default=float(configs.get('ping-interval', 3.0)),
         help='Seconds between heartbeats to zerovisor.')
 
+    parser.add_argument(
+        '--ping-interval-max',
+        type=float,
+        dest='ping_interval_max',
+        default=float(configs.get('ping-interval-max', 10.0)),
+        help='Most seconds between heartbeats while stats hold steady.')
+
+    parser.add_argument(
+        '--ping-change',
+        type=float,
+        dest='ping_change',
+        default=float(configs.get('ping-change', .2)),
+        help='Relative change in a stat that brings heartbeats back to --ping-interval.')
+
+    parser.add_argument(
+        '-k', '--keyframe-interval',
+        type=int,
+        dest='keyframe_interval',
+        default=int(configs.get('keyframe-interval', 30)),
+        help='Pings between full stat records, others carry only changes.')
+
     parser.add_argument(
         '-l', '--poll-interval',
         type=float, 
         dest='poll_interval', 
         default=float(configs.get('poll-interval', .1)),
-        help='Seconds between checking subprocess health.')
+        help='Seconds between checking subprocess health, '
+             'only used where child watchers are unavailable.')
 
     parser.add_argument(
         '-w', '--wait-to-die',
@@ -487,6 +767,41 @@ def main():
         default=configs.get('ssh-server'),
         help='Use ssh tunnel to server to connect to zerovisor endpoint.')
 
+    parser.add_argument(
+        '-f', '--fields',
+        dest='fields',
+        default=configs.get('fields'),
+        help='Comma separated psutil fields to report, default all.')
+
+    parser.add_argument(
+        '-z', '--chunk-size',
+        type=int,
+        dest='chunk_size',
+        default=int(configs.get('chunk-size', 65536)),
+        help='Most bytes of output to read or send at once.')
+
+    parser.add_argument(
+        '-q', '--output-queue',
+        type=int,
+        dest='output_queue',
+        default=int(configs.get('output-queue', 64)),
+        help='Chunks of output to queue per stream for the center.')
+
+    parser.add_argument(
+        '-P', '--output-policy',
+        dest='output_policy',
+        default=configs.get('output-policy', 'block'),
+        choices=('block', 'drop'),
+        help='When the output queue is full, stop reading the child '
+             'or drop its output.')
+
+    parser.add_argument(
+        '-C', '--codec',
+        dest='codec',
+        default=configs.get('codec', codec.DEFAULT),
+        choices=codec.available(),
+        help='Wire encoding for messages to the center.')
+
     parser.add_argument(
         '-d', '--debug', 
         action='store_true', 
@@ -510,11 +825,25 @@ def main():
         nrv_send_err=args.send_err,
         nrv_send_all=args.send_all,
         nrv_restart_retries=args.restart_retries,
+        nrv_autorestart=dict(true=True, false=False,
+                             unexpected='unexpected')[args.autorestart],
+        nrv_backoff=args.backoff,
+        nrv_backoff_max=args.backoff_max,
+        nrv_restart_window=args.restart_window,
+        nrv_restart_budget=args.restart_budget,
         nrv_ping_interval=args.ping_interval,
+        nrv_ping_interval_max=args.ping_interval_max,
+        nrv_ping_change=args.ping_change,
+        nrv_keyframe_interval=args.keyframe_interval,
         nrv_poll_interval=args.poll_interval,
         nrv_wait_to_die=args.wait_to_die,
         nrv_linger=args.linger,
         nrv_ssh_server=args.ssh_server,
+        nrv_codec=args.codec,
+        nrv_sample_fields=args.fields and args.fields.split(','),
+        nrv_chunk_size=args.chunk_size,
+        nrv_output_queue=args.output_queue,
+        nrv_output_policy=args.output_policy,
         )
 
     g = gevent.spawn(p.start)
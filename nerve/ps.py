@@ -1,7 +1,8 @@
 import logging
-import zmq.green as zmq
 from cliff.lister import Lister
-from cPickle import loads, dumps
+
+from .query import parse_select, parse_where
+
 
 class Ps(Lister):
 
@@ -11,24 +12,25 @@ class Ps(Lister):
         parser = Lister.get_parser(self, prog_name)
         parser.add_argument(
             '-S', '--select', dest='select',
-            help='Select clause to query.',
+            help='Comma separated columns to show, or *.',
             default = ('center, uuid, pid, state_name, cmdline, cpu_percent, '
                        'memory_percent, username, uptime')
             )
         parser.add_argument(
             '-W', '--where', dest='where',
-            help='Where clause to query.',
+            help="Conditions joined by 'and', like \"state_name = RUNNING and "
+                 "cpu_percent >= 50\" or \"username in (bob, sue)\".",
             default = None,
             )
+        parser.add_argument(
+            '-L', '--page-size', dest='page_size', type=int,
+            help='Rows to fetch from the center per request.',
+            default = 1000,
+            )
         return parser
 
     def get_data(self, parsed_args):
-        context = zmq.Context(1)
-        socket = context.socket(zmq.REQ)
-        socket.connect(self.app_args.control)
-        socket.send_multipart(
-            ['query', dumps((parsed_args.select, parsed_args.where))])
-        result = loads(socket.recv())
-        if isinstance(result, Exception):
-            raise result
-        return result
+        control = self.app.control()
+        return control.query(parse_select(parsed_args.select),
+                             parse_where(parsed_args.where),
+                             parsed_args.page_size)
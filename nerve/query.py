@@ -0,0 +1,202 @@
+"""
+Structured process queries.
+
+A query is a projection, a tuple of column names, and a filter, a
+sequence of ``(column, op, value)`` predicates that must all hold.
+Queries travel over the control channel in that form and are compiled
+once per shape, so the center never parses query text.  `parse_select`
+and `parse_where` turn the text nrvsh users type into that form.
+"""
+import operator
+import re
+from collections import OrderedDict
+
+from sqlalchemy import and_, bindparam, select as sql_select
+
+from . import db
+
+
+columns = tuple(c.name for c in db.Process.__table__.columns)
+
+OPS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda value, values: value in values,
+    }
+
+_term = re.compile(r"""^\s*(\w+)\s*(!=|<=|>=|==|=|<|>|\s+in\s+)\s*(.+?)\s*$""",
+                   re.IGNORECASE)
+_conjunction = re.compile(r'\s+and\s+', re.IGNORECASE)
+_literals = re.compile(r"""'[^']*'|"[^"]*"|[^\s,'"()]+""")
+
+
+def _literal(value):
+    if value[0] in '\'"':
+        return value[1:-1]
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def parse_select(select):
+    """
+    Turn a comma separated select list into a tuple of column names.
+    """
+    names = tuple(n.strip() for n in select.split(','))
+    if names == ('*',):
+        return columns
+    return names
+
+
+def parse_where(where):
+    """
+    Turn text like ``state_name = RUNNING and cpu_percent >= 50`` or
+    ``username in (bob, 'sue')`` into a list of predicates.
+    """
+    predicates = []
+    if not where:
+        return predicates
+    for term in _conjunction.split(where.strip()):
+        match = _term.match(term)
+        if match is None:
+            raise ValueError('unsupported where term %r' % term)
+        name, op, value = match.groups()
+        op = op.strip().lower()
+        if op == '==':
+            op = '='
+        if op == 'in':
+            value = [_literal(v) for v in _literals.findall(value)]
+        else:
+            value = _literal(value)
+        predicates.append((name, op, value))
+    return predicates
+
+
+class Query(object):
+    """
+    A compiled query shape.  Values for the predicates are supplied
+    when it is run, so one compiled query serves every request of the
+    same shape.
+    """
+
+    def __init__(self, select, shape):
+        for name in select + tuple(s[0] for s in shape):
+            if name not in columns:
+                raise ValueError('no such column %s' % name)
+        for name, op, arity in shape:
+            if op not in OPS:
+                raise ValueError('no such operator %s' % op)
+        self.select = select
+        self.shape = shape
+        self.keys = list(select)
+        self.tests = [(name, OPS[op]) for name, op, arity in shape]
+        self._statement = None
+
+    @property
+    def statement(self):
+        """
+        SQLAlchemy select statement with one bind parameter per value.
+        """
+        if self._statement is None:
+            table = db.Process.__table__
+            clauses = []
+            for i, (name, op, arity) in enumerate(self.shape):
+                column = table.c[name]
+                if op == 'in':
+                    clauses.append(column.in_(
+                        [bindparam('p%d_%d' % (i, j)) for j in xrange(arity)]))
+                else:
+                    clauses.append(OPS[op](column, bindparam('p%d' % i)))
+            statement = sql_select([table.c[n] for n in self.select])
+            if clauses:
+                statement = statement.where(and_(*clauses))
+            self._statement = statement
+        return self._statement
+
+    def params(self, values):
+        params = {}
+        for i, ((name, op, arity), value) in enumerate(zip(self.shape, values)):
+            if op == 'in':
+                for j, v in enumerate(value):
+                    params['p%d_%d' % (i, j)] = v
+            else:
+                params['p%d' % i] = value
+        return params
+
+    def run_sql(self, engine, values):
+        """
+        Return ``(keys, rows)`` from the database, rows an iterator.
+        """
+        result = engine.execute(self.statement, self.params(values))
+        return self.keys, (tuple(r) for r in result)
+
+    def run_table(self, table, values):
+        """
+        Return ``(keys, rows)`` from a `ProcessTable`, rows an
+        iterator.  Equality predicates on indexed columns narrow the
+        rows through the indexes, the rest are checked per row.
+        """
+        equals = {}
+        checks = []
+        for (name, op, arity), (_, test), value in zip(self.shape, self.tests, values):
+            if op == '=' and name in table.indexes and name not in equals:
+                equals[name] = value
+            else:
+                if op == 'in':
+                    value = set(value)
+                checks.append((name, test, value))
+        return self.keys, self._rows(table.find(equals), checks)
+
+    def _rows(self, rows, checks):
+        select = self.select
+        for row in rows:
+            for name, test, value in checks:
+                if not test(row.get(name), value):
+                    break
+            else:
+                yield tuple(row.get(n) for n in select)
+
+
+class QueryCache(object):
+    """
+    Compiled queries by shape, keeping the `size` most recently used.
+    """
+
+    def __init__(self, size=256):
+        self.size = size
+        self.queries = OrderedDict()
+        self.hits = self.misses = 0
+
+    def compile(self, select, where):
+        """
+        Return the compiled query for `select` and `where` and the list
+        of predicate values to run it with.
+        """
+        select = tuple(select)
+        where = where or ()
+        for name, op, value in where:
+            if op == 'in' and not isinstance(value, (list, tuple)):
+                raise ValueError('in needs a list of values')
+        shape = tuple((name, op, len(value) if op == 'in' else None)
+                      for name, op, value in where)
+        values = [value for name, op, value in where]
+        key = (select, shape)
+        query = self.queries.pop(key, None)
+        if query is None:
+            self.misses += 1
+            query = Query(select, shape)
+            if len(self.queries) >= self.size:
+                self.queries.popitem(last=False)
+        else:
+            self.hits += 1
+        self.queries[key] = query
+        return query, values
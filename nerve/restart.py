@@ -0,0 +1,81 @@
+import random
+from collections import deque
+
+
+class RestartPolicy(object):
+    """
+    Decide if and when an exited child is restarted.
+
+    `autorestart` is True to always restart, False never, or
+    'unexpected' to restart only on exit codes not in `exitcodes`.  A
+    child that dies within `startsecs` of starting failed to start,
+    and after `retries` such failures in a row it is not restarted.
+    Restarts wait `backoff` seconds, doubling with each failed start up
+    to `backoff_max`, less a random fraction up to `jitter` so children
+    that failed together do not restart together.  At most `budget`
+    restarts are allowed in any `window` seconds.
+    """
+
+    def __init__(self,
+                 autorestart=False,
+                 exitcodes=(0, 2),
+                 startsecs=1,
+                 retries=3,
+                 backoff=1.0,
+                 backoff_max=60.0,
+                 jitter=.5,
+                 window=300.0,
+                 budget=10,
+                 random=random.random):
+        self.autorestart = autorestart
+        self.exitcodes = set(exitcodes)
+        self.startsecs = startsecs
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.window = window
+        self.budget = budget
+        self.random = random
+        self.restarts = 0  # restarts ever
+        self.attempts = 0  # failed starts in a row
+        self.recent = deque() # times of the restarts in the window
+
+    def started(self):
+        """
+        The child outlived `startsecs`.
+        """
+        self.attempts = 0
+
+    def delay(self, rc, uptime, now):
+        """
+        Return the seconds to wait before restarting a child that exited
+        with `rc` after `uptime` seconds, at time `now`, or None if it
+        must not be restarted.
+        """
+        if not self.autorestart:
+            return None
+        if self.autorestart == 'unexpected' and rc in self.exitcodes:
+            return None
+
+        if uptime is None or uptime < self.startsecs:
+            self.attempts += 1
+            if self.attempts > self.retries:
+                return None
+        else:
+            self.attempts = 0
+
+        recent = self.recent
+        while recent and recent[0] <= now - self.window:
+            recent.popleft()
+        if len(recent) >= self.budget:
+            return None
+
+        delay = min(self.backoff_max, self.backoff * 2 ** max(self.attempts - 1, 0))
+        delay *= 1 - self.jitter * self.random()
+        recent.append(now)
+        self.restarts += 1
+        return delay
+
+    def info(self):
+        return dict(restarts=self.restarts, restart_attempts=self.attempts)
@@ -0,0 +1,125 @@
+"""
+Resource sampling of watched processes with psutil.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+
+import psutil
+
+
+# fields that are read once per child and then served from cache
+STATIC = (
+    'cmdline', 'create_time', 'name', 'pid', 'ppid', 'terminal',
+    'username', 'gid_real', 'gid_effective', 'gid_saved', 'uid_real',
+    'uid_effective', 'uid_saved',
+    )
+
+DYNAMIC = (
+    'cpu_percent', 'cpu_user', 'cpu_system', 'ionice_class',
+    'ionice_value', 'memory_rss', 'memory_vms', 'memory_percent',
+    'num_threads', 'is_running', 'nice', 'status',
+    )
+
+FIELDS = STATIC + DYNAMIC
+
+
+def _get(p, name, *args):
+    """
+    Read `name` from psutil process `p`.  Newer psutil releases have
+    methods named after the value, older ones have properties and
+    ``get_`` prefixed methods.
+    """
+    attr = getattr(p, name, None)
+    if attr is None:
+        attr = getattr(p, 'get_' + name)
+    if callable(attr):
+        return attr(*args)
+    return attr
+
+
+@contextmanager
+def _oneshot(p):
+    oneshot = getattr(p, 'oneshot', None)
+    if oneshot is None:
+        yield
+    else:
+        with oneshot():
+            yield
+
+
+# (fields, reader) pairs.  Fields that come from the same psutil call
+# share a reader so the call is made once per sample.
+_readers = (
+    (('cmdline',), lambda p: (' '.join(_get(p, 'cmdline')),)),
+    (('create_time',),
+     lambda p: (datetime.fromtimestamp(_get(p, 'create_time')),)),
+    (('name',), lambda p: (_get(p, 'name'),)),
+    (('pid',), lambda p: (p.pid,)),
+    (('ppid',), lambda p: (_get(p, 'ppid'),)),
+    (('terminal',), lambda p: (_get(p, 'terminal'),)),
+    (('username',), lambda p: (_get(p, 'username'),)),
+    (('gid_real', 'gid_effective', 'gid_saved'),
+     lambda p: tuple(_get(p, 'gids'))[:3]),
+    (('uid_real', 'uid_effective', 'uid_saved'),
+     lambda p: tuple(_get(p, 'uids'))[:3]),
+    # interval=None measures since the previous call instead of
+    # sleeping, which is why the handle is kept between samples
+    (('cpu_percent',), lambda p: (_get(p, 'cpu_percent', None),)),
+    (('cpu_user', 'cpu_system'),
+     lambda p: tuple(_get(p, 'cpu_times'))[:2]),
+    (('ionice_class', 'ionice_value'),
+     lambda p: tuple(_get(p, 'ionice'))[:2]),
+    (('memory_rss', 'memory_vms'),
+     lambda p: tuple(_get(p, 'memory_info'))[:2]),
+    (('memory_percent',), lambda p: (_get(p, 'memory_percent'),)),
+    (('num_threads',), lambda p: (_get(p, 'num_threads'),)),
+    (('is_running',), lambda p: (p.is_running(),)),
+    (('nice',), lambda p: (_get(p, 'nice'),)),
+    (('status',), lambda p: (_get(p, 'status'),)),
+    )
+
+
+class Sampler(object):
+    """
+    Sample the resource usage of process `pid`.
+
+    The psutil handle is kept for the life of the process, the values
+    in `STATIC` are read only on the first sample, and the remaining
+    values are read together inside psutil's ``oneshot`` cache where
+    the installed psutil supports it.  `fields` restricts sampling to
+    a subset of `FIELDS`.
+    """
+
+    def __init__(self, pid, fields=None):
+        if fields is None:
+            fields = FIELDS
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError('unknown fields: %s' % ', '.join(sorted(unknown)))
+        wanted = set(fields)
+        self.process = psutil.Process(pid)
+        self.static_readers = [r for r in _readers
+                               if wanted.intersection(r[0])
+                               and r[0][0] in STATIC]
+        self.dynamic_readers = [r for r in _readers
+                                if wanted.intersection(r[0])
+                                and r[0][0] in DYNAMIC]
+        self.wanted = wanted
+        self.static = None
+
+    def sample(self):
+        p = self.process
+        with _oneshot(p):
+            if self.static is None:
+                self.static = self._read(self.static_readers)
+            data = dict(self.static)
+            data.update(self._read(self.dynamic_readers))
+        return data
+
+    def _read(self, readers):
+        data = {}
+        for names, reader in readers:
+            for name, value in zip(names, reader(self.process)):
+                if name in self.wanted:
+                    data[name] = value
+        return data
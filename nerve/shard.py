@@ -0,0 +1,95 @@
+"""
+Placement of process rows on sharded centers.
+
+Rows are grouped into partitions, the buckets of the sync `Replica`,
+and each partition is kept by `replicas` centers picked from a
+consistent hash ring, so adding or removing a center only moves the
+partitions next to it.  The first owner of a partition is its
+primary, and is the one that answers queries for it.
+"""
+import hashlib
+import struct
+from bisect import bisect
+
+
+_point = struct.Struct('>Q')
+
+
+def _hash(key):
+    return _point.unpack(hashlib.md5(key).digest()[:8])[0]
+
+
+class HashRing(object):
+    """
+    Consistent hash ring of `names`, each placed at `vnodes` points.
+    """
+
+    def __init__(self, names, vnodes=64):
+        points = sorted((_hash('%s:%d' % (name, i)), name)
+                        for name in names for i in xrange(vnodes))
+        self.hashes = [h for h, _ in points]
+        self.names = [n for _, n in points]
+        self.count = len(set(names))
+
+    def owners(self, key, count):
+        """
+        Return up to `count` distinct names clockwise from `key`.
+        """
+        owners = []
+        if not self.hashes:
+            return owners
+        count = min(count, self.count)
+        i = bisect(self.hashes, _hash(key))
+        while len(owners) < count:
+            name = self.names[i % len(self.names)]
+            if name not in owners:
+                owners.append(name)
+            i += 1
+        return owners
+
+
+class Partitioning(object):
+    """
+    Owners of each of `partitions` partitions among the centers in
+    `names`, as seen by center `name`.
+    """
+
+    def __init__(self, name, names, partitions, replicas=2, vnodes=64):
+        self.name = name
+        self.names = sorted(set(names) | set([name]))
+        ring = HashRing(self.names, vnodes)
+        self.table = [ring.owners(str(p), replicas) for p in xrange(partitions)]
+
+    def owners(self, partition):
+        return self.table[partition]
+
+    def owns(self, partition):
+        return self.name in self.table[partition]
+
+    def shared(self, other):
+        """
+        Return the partitions both this center and `other` own.
+        """
+        return [p for p, owners in enumerate(self.table)
+                if self.name in owners and other in owners]
+
+    def primary(self, partition, down=()):
+        """
+        Return the first owner of `partition` not in `down`, or None.
+        """
+        for name in self.table[partition]:
+            if name not in down:
+                return name
+
+    def serves(self, partition, primaries=None):
+        """
+        Check if this center answers queries for `partition`: if it is
+        the primary, or with `primaries`, a list of centers that are
+        down, if one of them is the primary and this center is the
+        first owner that is up.
+        """
+        primary = self.primary(partition)
+        if primaries is None:
+            return primary == self.name
+        return (primary in primaries and
+                self.primary(partition, primaries) == self.name)
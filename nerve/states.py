@@ -31,23 +31,29 @@ class state(object):
         """
         self.state = self.STOPPED
         self.cmd = cmd
+        self.key = '_%s_value' % cmd
 
     def __get__(self, obj, objtype=None):
-        return self.state
+        if obj is None:
+            return self.state
+        # the value lives on the instance, many processes can share
+        # one interpreter
+        return obj.__dict__.get(self.key, self.state)
 
     def __set__(self, obj, value):
-        if self.state == self.WAITING and value != self.WAITING:
+        current = self.__get__(obj)
+        if current == self.WAITING and value != self.WAITING:
             obj.active.set()
         elif value == self.WAITING:
             obj.active.clear()
 
-        self.state = value # validate??
+        obj.__dict__[self.key] = value # validate??
         if value != self.WAITING:
             self._report(obj, value)
 
     def _report(self, proc, value):
         value = proc.resource_info()
-        proc._send(self.cmd, value)
+        proc._report(self.cmd, value)
 
     def __metaclass__(name, parents, attrs):
         """
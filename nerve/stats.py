@@ -0,0 +1,41 @@
+import logging
+from cliff.lister import Lister
+
+
+def flatten(stats, prefix=''):
+    """
+    Yield ``(name, value)`` for the leaves of nested dict `stats`, with
+    dotted names.
+    """
+    for key in sorted(stats):
+        value = stats[key]
+        name = prefix + str(key)
+        if isinstance(value, dict):
+            for item in flatten(value, name + '.'):
+                yield item
+        else:
+            yield name, value
+
+
+class Stats(Lister):
+    """
+    Show the center's counters and latency histograms.  Histogram
+    times are in seconds.
+    """
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = Lister.get_parser(self, prog_name)
+        parser.add_argument(
+            'prefix', nargs='?', default='',
+            help='Only show stats whose names start with this, like '
+                 'histograms.router or writebehind.',
+            )
+        return parser
+
+    def take_action(self, parsed_args):
+        stats = self.app.control().request('stats')
+        return (('name', 'value'),
+                [(n, v) for n, v in flatten(stats)
+                 if n.startswith(parsed_args.prefix)])
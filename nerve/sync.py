@@ -0,0 +1,200 @@
+"""
+Anti-entropy replication state for a center ring.
+
+Every row a center holds has a version, a ``(counter, origin)`` pair
+from a Lamport clock, and the higher version of a row wins wherever
+two copies meet.  Deleted rows leave a versioned tombstone for
+`tombstone_ttl` seconds so a delete is not undone by an older copy.
+Tombstones travel with the time of the delete, so every center
+forgets one at the same time rather than handing it back and forth.
+
+Rows are hashed into `buckets` by uuid.  Each bucket keeps the XOR of
+the hashes of its ``(uuid, version)`` entries, so the digest of the
+whole table is updated in constant time per change, and two centers
+find the rows they differ on by comparing digests, then the versions
+in the buckets that differ, then exchanging only those rows.
+"""
+import hashlib
+import struct
+import time
+import zlib
+
+
+_hash = struct.Struct('>Q')
+
+
+def _version(version):
+    # versions decode as lists, compare them as tuples
+    counter, origin = version
+    return counter, origin
+
+
+class Replica(object):
+
+    def __init__(self, name, buckets=256, tombstone_ttl=3600):
+        self.name = name
+        self.buckets = buckets
+        self.tombstone_ttl = tombstone_ttl
+        self.clock = 0
+        self.versions = {}     # uuid to version of live rows
+        self.tombstones = {}   # uuid to (version, deleted time)
+        self.digests = [0] * buckets
+        self.dirty = set()     # uuids changed since the last delta sent
+
+    def bucket(self, uuid):
+        return (zlib.crc32(uuid) & 0xffffffff) % self.buckets
+
+    def version(self, uuid):
+        if uuid in self.versions:
+            return self.versions[uuid]
+        if uuid in self.tombstones:
+            return self.tombstones[uuid][0]
+
+    def _entry_hash(self, uuid, version):
+        digest = hashlib.md5('%s:%d:%s' % (uuid, version[0], version[1]))
+        return _hash.unpack(digest.digest()[:8])[0]
+
+    def _set(self, uuid, version, deleted=None):
+        """
+        Replace the entry for `uuid`, keeping its bucket digest.
+        """
+        bucket = self.bucket(uuid)
+        old = self.version(uuid)
+        if old is not None:
+            self.digests[bucket] ^= self._entry_hash(uuid, old)
+        self.versions.pop(uuid, None)
+        self.tombstones.pop(uuid, None)
+        if version is not None:
+            self.digests[bucket] ^= self._entry_hash(uuid, version)
+            if deleted is None:
+                self.versions[uuid] = version
+            else:
+                self.tombstones[uuid] = (version, deleted)
+
+    def _tick(self):
+        self.clock += 1
+        return self.clock, self.name
+
+    def touch(self, uuid):
+        """
+        Record a local change to row `uuid`.
+        """
+        self._set(uuid, self._tick())
+        self.dirty.add(uuid)
+
+    def delete(self, uuid):
+        """
+        Record a local delete of row `uuid`.
+        """
+        self._set(uuid, self._tick(), time.time())
+        self.dirty.add(uuid)
+
+    def merge(self, entries, forward=True):
+        """
+        Take the ``(uuid, version, row)`` entries from a peer that are
+        newer than ours, a row of None being a delete, and return
+        them.  Deletes carry the time they were made as a fourth item.
+        If `forward` is true accepted entries are passed on in our
+        next delta.
+        """
+        accepted = []
+        for entry in entries:
+            uuid, version, row = entry[:3]
+            version = _version(version)
+            self.clock = max(self.clock, version[0])
+            current = self.version(uuid)
+            if current is not None and current >= version:
+                continue
+            deleted = None
+            if row is None:
+                # peers that do not send it get the time it arrived
+                deleted = entry[3] if len(entry) > 3 else time.time()
+            self._set(uuid, version, deleted)
+            if forward:
+                self.dirty.add(uuid)
+            accepted.append((uuid, version, row))
+        return accepted
+
+    def entries(self, uuids, fetch):
+        """
+        Return ``(uuid, version, row)`` entries for `uuids`, reading
+        live rows with `fetch`, and ``(uuid, version, None, deleted)``
+        for tombstones.
+        """
+        entries = []
+        for uuid in uuids:
+            if uuid in self.versions:
+                row = fetch(uuid)
+                if row is not None:
+                    entries.append((uuid, self.versions[uuid], row))
+            elif uuid in self.tombstones:
+                version, deleted = self.tombstones[uuid]
+                entries.append((uuid, version, None, deleted))
+        return entries
+
+    def take_dirty(self, limit):
+        uuids = []
+        while self.dirty and len(uuids) < limit:
+            uuids.append(self.dirty.pop())
+        return uuids
+
+    def digest(self, buckets=None):
+        """
+        Return the digest of every bucket, or of `buckets` as
+        ``(bucket, digest)`` pairs.
+        """
+        if buckets is None:
+            return list(self.digests)
+        return [(b, self.digests[b]) for b in buckets]
+
+    def diff(self, digest):
+        """
+        Return the buckets whose digest differs from ours.
+        """
+        if digest and isinstance(digest[0], (list, tuple)):
+            return [b for b, d in digest
+                    if 0 <= b < self.buckets and d != self.digests[b]]
+        if len(digest) != self.buckets:
+            return range(self.buckets)
+        return [i for i, d in enumerate(digest) if d != self.digests[i]]
+
+    def versions_in(self, buckets):
+        """
+        Return ``(uuid, version)`` for every row and tombstone in
+        `buckets`.
+        """
+        buckets = set(buckets)
+        out = [(u, v) for u, v in self.versions.iteritems()
+               if self.bucket(u) in buckets]
+        out.extend((u, v) for u, (v, _) in self.tombstones.iteritems()
+                   if self.bucket(u) in buckets)
+        return out
+
+    def compare(self, buckets, remote):
+        """
+        Compare a peer's `remote` versions for `buckets` with ours.
+        Return the uuids we have newer, to send, and the uuids the peer
+        has newer, to ask for.
+        """
+        remote = dict((u, _version(v)) for u, v in remote)
+        newer = []
+        for uuid, version in self.versions_in(buckets):
+            theirs = remote.get(uuid)
+            if theirs is None or theirs < version:
+                newer.append(uuid)
+        wanted = [u for u, v in remote.iteritems()
+                  if self.version(u) is None or self.version(u) < v]
+        return newer, wanted
+
+    def expire(self, now=None):
+        """
+        Forget tombstones older than `tombstone_ttl`.
+        """
+        now = now or time.time()
+        for uuid, (version, deleted) in self.tombstones.items():
+            if now - deleted >= self.tombstone_ttl:
+                self._set(uuid, None)
+
+    def stats(self):
+        return dict(rows=len(self.versions), tombstones=len(self.tombstones),
+                    clock=self.clock, dirty=len(self.dirty))
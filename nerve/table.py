@@ -0,0 +1,88 @@
+class ProcessTable(object):
+    """
+    Process rows held as dicts keyed by uuid, with secondary indexes
+    mapping column values to sets of uuids.
+    """
+
+    indexed = ('center', 'state', 'username', 'pid')
+
+    def __init__(self, indexed=None):
+        if indexed is not None:
+            self.indexed = tuple(indexed)
+        self.rows = {}
+        self.indexes = dict((name, {}) for name in self.indexed)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, uuid):
+        return uuid in self.rows
+
+    def get(self, uuid):
+        return self.rows.get(uuid)
+
+    def upsert(self, row):
+        uuid = row['uuid']
+        current = self.rows.get(uuid)
+        if current is None:
+            self.rows[uuid] = current = dict(row)
+            for name, index in self.indexes.iteritems():
+                index.setdefault(current.get(name), set()).add(uuid)
+            return current
+
+        for name, index in self.indexes.iteritems():
+            if name in row and row[name] != current.get(name):
+                self._unindex(index, current.get(name), uuid)
+                index.setdefault(row[name], set()).add(uuid)
+        current.update(row)
+        return current
+
+    def delete(self, uuid):
+        row = self.rows.pop(uuid, None)
+        if row is not None:
+            for name, index in self.indexes.iteritems():
+                self._unindex(index, row.get(name), uuid)
+        return row
+
+    def lookup(self, name, value):
+        """
+        Return the set of uuids whose indexed column `name` is `value`.
+        """
+        return self.indexes[name].get(value, set())
+
+    def find(self, equals=None):
+        """
+        Iterate over rows matching every column value in `equals`,
+        narrowing with the indexes before scanning.  The matching
+        uuids are fixed when iteration starts, so the table can change
+        while a consumer holds the iterator.
+        """
+        equals = equals or {}
+        keys = [self.lookup(n, v) for n, v in equals.iteritems()
+                if n in self.indexes]
+        if keys:
+            keys.sort(key=len)
+            uuids = keys[0].intersection(*keys[1:])
+        else:
+            uuids = self.rows.keys()
+
+        rest = [(n, v) for n, v in equals.iteritems() if n not in self.indexes]
+        for uuid in uuids:
+            row = self.rows.get(uuid)
+            if row is not None and all(row.get(n) == v for n, v in rest):
+                yield row
+
+    def select(self, names, equals=None):
+        """
+        Iterate over tuples of columns `names` for matching rows.
+        """
+        for row in self.find(equals):
+            yield tuple(row.get(n) for n in names)
+
+    @staticmethod
+    def _unindex(index, value, uuid):
+        uuids = index.get(value)
+        if uuids is not None:
+            uuids.discard(uuid)
+            if not uuids:
+                del index[value]
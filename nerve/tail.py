@@ -0,0 +1,45 @@
+import logging
+from cliff.command import Command
+
+
+class Tail(Command):
+    """
+    Print recent output lines of a process, and with -f new ones as
+    they arrive.
+    """
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = Command.get_parser(self, prog_name)
+        parser.add_argument('uuid')
+        parser.add_argument(
+            '-n', '--lines', dest='lines', type=int, default=10,
+            help='Number of lines to print.',
+            )
+        parser.add_argument(
+            '-e', '--stderr', dest='stream', action='store_const',
+            const='err', default='out',
+            help='Show standard error instead of standard output.',
+            )
+        parser.add_argument(
+            '-f', '--follow', dest='follow', action='store_true',
+            default=False,
+            help='Keep printing lines as they arrive.',
+            )
+        parser.add_argument(
+            '-t', '--timeout', dest='timeout', type=float, default=30,
+            help='Seconds the center waits for new lines per request.',
+            )
+        return parser
+
+    def take_action(self, parsed_args):
+        request = self.app.control().request
+        args = parsed_args
+        lines, seq = request('tail', (args.uuid, args.stream, args.lines))
+        self.app.stdout.writelines(lines)
+        while args.follow:
+            self.app.stdout.flush()
+            lines, seq = request(
+                'follow', (args.uuid, args.stream, seq, args.timeout))
+            self.app.stdout.writelines(lines)
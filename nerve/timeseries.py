@@ -0,0 +1,215 @@
+"""
+Downsampled resource history of processes.
+
+Each process gets a `Series` of retention tiers, each a ring of time
+slots `step` seconds wide held in arrays, grown as slots are used up
+to a fixed length.  A slot keeps the sample count and, per field, the
+sum and maximum of the samples that fell in it, so coarse tiers still
+show spikes.
+"""
+import time
+from array import array
+from collections import OrderedDict
+
+
+FIELDS = ('cpu_percent', 'memory_percent', 'memory_rss', 'memory_vms',
+          'num_threads')
+
+# (step seconds, slots): 1s for 10 minutes, 1 minute for a day
+TIERS = ((1, 600), (60, 1440))
+
+
+def parse_tiers(text):
+    """
+    Parse tiers written like ``1x600,60x1440``.
+    """
+    tiers = []
+    for tier in text.split(','):
+        step, length = tier.split('x')
+        tiers.append((float(step), int(length)))
+    return tuple(tiers)
+
+
+def series_bytes(fields=FIELDS, tiers=TIERS):
+    """
+    Return the most bytes the arrays of one series take.
+    """
+    itemsize = array('d').itemsize
+    return sum(length for _, length in tiers) * itemsize * (2 + 2 * len(fields))
+
+
+class Tier(object):
+    """
+    A ring of `length` slots.  Slots are numbered from the first one
+    written, so a short lived process only fills the start of the
+    arrays, and they grow by doubling as later slots are written.
+    """
+
+    def __init__(self, step, length, fields=FIELDS):
+        self.step = step
+        self.length = length
+        self.first = None
+        self.slots = array('l')
+        self.counts = array('l')
+        self.sums = dict((f, array('d')) for f in fields)
+        self.maxes = dict((f, array('d')) for f in fields)
+
+    @property
+    def span(self):
+        return self.step * self.length
+
+    def _index(self, slot):
+        return (slot - self.first) % self.length
+
+    def _grow(self, i):
+        size = len(self.slots)
+        more = min(self.length, max(i + 1, size * 2, 8)) - size
+        self.slots.extend(array('l', [-1]) * more)
+        self.counts.extend(array('l', [0]) * more)
+        for arrays in (self.sums, self.maxes):
+            for values in arrays.itervalues():
+                values.extend(array('d', [0.0]) * more)
+
+    def add(self, t, values):
+        slot = int(t // self.step)
+        if self.first is None:
+            self.first = slot
+        i = self._index(slot)
+        if i >= len(self.slots):
+            self._grow(i)
+        if self.slots[i] != slot:
+            self.slots[i] = slot
+            self.counts[i] = 0
+            for name in self.sums:
+                self.sums[name][i] = 0.0
+                self.maxes[name][i] = float('-inf')
+        self.counts[i] += 1
+        for name, value in values.iteritems():
+            self.sums[name][i] += value
+            if value > self.maxes[name][i]:
+                self.maxes[name][i] = value
+
+    def points(self, field, start, end):
+        """
+        Return ``(time, avg, max, count)`` for the slots of `field`
+        between `start` and `end`.
+        """
+        sums, maxes = self.sums[field], self.maxes[field]
+        first, last = int(start // self.step), int(end // self.step)
+        out = []
+        if self.first is None:
+            return out
+        size = len(self.slots)
+        for slot in xrange(max(first, last - self.length + 1), last + 1):
+            i = self._index(slot)
+            if i < size and self.slots[i] == slot and self.counts[i]:
+                count = self.counts[i]
+                out.append((slot * self.step, sums[i] / count, maxes[i], count))
+        return out
+
+
+class Series(object):
+    """
+    The tiers of one process.  Fields missing from a sample, as they
+    are from deltas, keep their last value.
+    """
+
+    def __init__(self, fields=FIELDS, tiers=TIERS):
+        self.fields = fields
+        self.tiers = [Tier(step, length, fields) for step, length in tiers]
+        self.last = {}
+        self.updated = None
+
+    def add(self, t, row):
+        self.updated = t
+        for name in self.fields:
+            value = row.get(name)
+            if isinstance(value, (int, long, float)):
+                self.last[name] = float(value)
+        if self.last:
+            for tier in self.tiers:
+                tier.add(t, self.last)
+
+    def tier(self, start, now):
+        """
+        Return the finest tier still holding time `start`.
+        """
+        for tier in self.tiers:
+            if now - start <= tier.span:
+                return tier
+        return self.tiers[-1]
+
+
+class History(object):
+    """
+    Series by process uuid, at most `max_series` of them, by default as
+    many as fit in `max_bytes` when full.  Once full, the least
+    recently updated series makes way for a new process only if it has
+    not been updated for `idle_after` seconds, the span of the finest
+    tier by default; until then new processes are counted in `refused`
+    and get no history.
+    """
+
+    def __init__(self, fields=FIELDS, tiers=TIERS, max_series=None,
+                 max_bytes=64 << 20, idle_after=None):
+        self.fields = tuple(fields)
+        self.tiers = tuple(tiers)
+        if max_series is None:
+            max_series = max(1, max_bytes // series_bytes(self.fields, self.tiers))
+        self.max_series = max_series
+        if idle_after is None:
+            step, length = self.tiers[0]
+            idle_after = step * length
+        self.idle_after = idle_after
+        self.refused = 0
+        self.series = OrderedDict()
+
+    def __len__(self):
+        return len(self.series)
+
+    def record(self, uuid, row, t=None):
+        t = t or time.time()
+        series = self.series.pop(uuid, None)
+        if series is None:
+            if len(self.series) >= self.max_series:
+                oldest = next(self.series.itervalues())
+                if t - oldest.updated < self.idle_after:
+                    self.refused += 1
+                    return
+                self.series.popitem(last=False)
+            series = Series(self.fields, self.tiers)
+        self.series[uuid] = series
+        series.add(t, row)
+
+    def points(self, uuid, field, start, end=None, now=None):
+        """
+        Return ``(step, points)`` for `field` of process `uuid` from
+        `start` to `end`, from the finest tier that goes back that far.
+        """
+        if field not in self.fields:
+            raise ValueError('no history for %s' % field)
+        series = self.series.get(uuid)
+        if series is None:
+            raise KeyError('no history for %s' % uuid)
+        now = now or time.time()
+        tier = series.tier(start, now)
+        return tier.step, tier.points(field, start, end or now)
+
+    def summary(self, uuid, field, window, now=None):
+        """
+        Return the max, avg and p95 of `field` over the last `window`
+        seconds.  avg is of the samples, p95 of the slot averages.
+        """
+        now = now or time.time()
+        step, points = self.points(uuid, field, now - window, now, now)
+        if not points:
+            return dict(step=step, count=0, max=None, avg=None, p95=None)
+        count = sum(p[3] for p in points)
+        averages = sorted(p[1] for p in points)
+        return dict(
+            step=step,
+            count=count,
+            max=max(p[2] for p in points),
+            avg=sum(p[1] * p[3] for p in points) / count,
+            p95=averages[min(len(averages) - 1, int(.95 * len(averages)))],
+            )
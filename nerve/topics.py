@@ -0,0 +1,54 @@
+"""
+Topics of the events a center publishes to watchers.
+
+Every event is published as two frames, a topic and the codec encoded
+event data.  The topic is ``kind:center:state:uuid``, so a 0mq
+subscription prefix can select events by kind, then center, then
+state.  Filters that do not form a prefix are checked by the watcher.
+"""
+
+kinds = ('state', 'return', 'signal', 'ping')
+
+fields = ('kind', 'center', 'state', 'uuid')
+
+
+def topic(kind, center, state, uuid):
+    return '%s:%s:%s:%s' % (kind, center or '', state or '', uuid)
+
+
+def split(topic):
+    """
+    Return a dict of the fields of `topic`.
+    """
+    return dict(zip(fields, topic.split(':', 3)))
+
+
+def subscriptions(kind=None, center=None, state=None, uuid=None):
+    """
+    Return the subscription prefixes for events matching the given
+    fields, one per kind.  A prefix ends at the first field not given.
+    """
+    prefixes = []
+    for k in ((kind,) if kind else kinds):
+        parts = [k]
+        for value in (center, state, uuid):
+            if value is None:
+                break
+            parts.append(value)
+        prefix = ':'.join(parts)
+        if len(parts) < len(fields):
+            prefix += ':'
+        prefixes.append(prefix)
+    return prefixes
+
+
+def matches(topic, **filters):
+    """
+    Check that `topic` has the value of every field in `filters` that
+    is not None.
+    """
+    values = split(topic)
+    for name, value in filters.iteritems():
+        if value is not None and values.get(name) != value:
+            return False
+    return True
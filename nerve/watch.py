@@ -0,0 +1,62 @@
+import logging
+import zmq.green as zmq
+from cliff.command import Command
+
+from . import codec, topics
+
+
+class Watch(Command):
+    """
+    Print process events as a center publishes them.
+    """
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = Command.get_parser(self, prog_name)
+        parser.add_argument(
+            '-p', '--pubpoint', dest='pubpoint', default=None,
+            help='Center publish endpoint.  Default is to ask the center.',
+            )
+        parser.add_argument(
+            '-k', '--kind', dest='kind', choices=topics.kinds, default=None,
+            help='Only events of this kind.  Pings are published only '
+                 'if the center is started with --publish-pings.',
+            )
+        parser.add_argument(
+            '-C', '--center', dest='center', default=None,
+            help='Only events from this center.',
+            )
+        parser.add_argument(
+            '-s', '--state', dest='state', default=None,
+            help='Only events of processes in this state, like RUNNING.',
+            )
+        parser.add_argument(
+            '-u', '--uuid', dest='uuid', default=None,
+            help='Only events of this process.',
+            )
+        return parser
+
+    def take_action(self, parsed_args):
+        args = parsed_args
+        pubpoint = args.pubpoint
+        if pubpoint is None:
+            pubpoint = self.app.control().request('pubpoint')
+            if not pubpoint:
+                raise ValueError('the center is not publishing events')
+
+        filters = dict(kind=args.kind, center=args.center,
+                       state=args.state, uuid=args.uuid)
+        socket = zmq.Context.instance().socket(zmq.SUB)
+        for prefix in topics.subscriptions(**filters):
+            socket.setsockopt(zmq.SUBSCRIBE, prefix)
+        socket.connect(pubpoint)
+
+        while True:
+            topic, data = socket.recv_multipart()
+            # subscriptions only cover the leading filters
+            if not topics.matches(topic, **filters):
+                continue
+            self.app.stdout.write(
+                '%s %r\n' % (topic, codec.loads(data, codec.SAFE)))
+            self.app.stdout.flush()
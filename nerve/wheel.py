@@ -0,0 +1,60 @@
+import math
+import time
+
+
+class TimerWheel(object):
+    """
+    Hashed timer wheel of deadlines rounded up to `tick` seconds, kept
+    in `slots` sets of keys by tick number.  Scheduling, rescheduling
+    and cancelling a key are O(1), and advancing one tick only looks at
+    the keys in one slot.
+    """
+
+    def __init__(self, tick=1.0, slots=512, now=None):
+        self.tick = tick
+        self.slots = [set() for _ in xrange(slots)]
+        self.deadlines = {} # key to deadline tick
+        self.current = int((now or time.time()) / tick)
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def schedule(self, key, deadline):
+        """
+        Set the deadline of `key` to time `deadline`, replacing any it
+        had.
+        """
+        at = max(int(math.ceil(deadline / self.tick)), self.current + 1)
+        old = self.deadlines.get(key)
+        if old == at:
+            return
+        if old is not None:
+            self.slots[old % len(self.slots)].discard(key)
+        self.deadlines[key] = at
+        self.slots[at % len(self.slots)].add(key)
+
+    def cancel(self, key):
+        at = self.deadlines.pop(key, None)
+        if at is not None:
+            self.slots[at % len(self.slots)].discard(key)
+
+    def advance(self, now=None):
+        """
+        Move the wheel to time `now` and return the keys whose deadline
+        has passed.
+        """
+        target = int((now or time.time()) / self.tick)
+        count = len(self.slots)
+        expired = []
+        for i in xrange(1, min(target - self.current, count) + 1):
+            slot = self.slots[(self.current + i) % count]
+            due = [k for k in slot if self.deadlines[k] <= target]
+            for key in due:
+                slot.discard(key)
+                del self.deadlines[key]
+            expired.extend(due)
+        self.current = max(self.current, target)
+        return expired
@@ -0,0 +1,183 @@
+import gevent
+import logging
+import time
+from gevent.event import Event
+
+from . import db
+from .metrics import Histogram
+
+
+logger = logging.getLogger(__name__)
+
+# columns a row needs to be inserted, deltas leave them out
+_required = frozenset(c.name for c in db.Process.__table__.columns
+                      if not c.nullable and not c.primary_key)
+
+
+class FlushStats(object):
+    """
+    Running batch size and flush latency figures for a `WriteBehind`.
+    """
+
+    def __init__(self):
+        self.flushes = 0
+        self.rows = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.dropped = 0
+        self.orphans = 0
+        self.last_size = 0
+        self.max_size = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        self.latencies = Histogram()
+
+    def record(self, size, latency):
+        self.flushes += 1
+        self.rows += size
+        self.last_size = size
+        self.max_size = max(self.max_size, size)
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+        self.latencies.record(latency)
+
+    def as_dict(self):
+        flushes = self.flushes or 1
+        return dict(flushes=self.flushes,
+                    rows=self.rows,
+                    coalesced=self.coalesced,
+                    errors=self.errors,
+                    dropped=self.dropped,
+                    orphans=self.orphans,
+                    last_size=self.last_size,
+                    max_size=self.max_size,
+                    avg_size=float(self.rows) / flushes,
+                    last_latency=self.last_latency,
+                    max_latency=self.max_latency,
+                    avg_latency=self.total_latency / flushes,
+                    latency=self.latencies.as_dict())
+
+
+class WriteBehind(object):
+    """
+    Collect process rows and flush them to `session` in one
+    transaction every `window` seconds, or as soon as `size` distinct
+    rows are pending, whichever comes first.
+
+    Rows are coalesced by uuid: a row that arrives before the previous
+    row for the same uuid was flushed is merged over it, so only the
+    latest values are written.  Deleted uuids are removed in the same
+    transaction.
+
+    Rows without the columns an insert needs are deltas, and are only
+    written over a row already in the database.  Those that have none
+    are counted as orphans and passed to `on_orphan`.  If a batch
+    fails, its rows are written one at a time so that a bad row only
+    loses itself.
+    """
+
+    def __init__(self, session, window=.5, size=1000, on_orphan=None):
+        self.session = session
+        self.window = window
+        self.size = size
+        self.on_orphan = on_orphan
+        self.pending = {}
+        self.deleted = set()
+        self.stats = FlushStats()
+        self._wakeup = Event()
+        self._flusher = None
+
+    def start(self):
+        if self._flusher is None:
+            self._flusher = gevent.spawn(self._run)
+        return self._flusher
+
+    def add(self, row):
+        uuid = row['uuid']
+        pending = self.pending.get(uuid)
+        if pending is None:
+            self.pending[uuid] = dict(row)
+            self.deleted.discard(uuid)
+        else:
+            pending.update(row)
+            self.stats.coalesced += 1
+        if len(self.pending) >= self.size or self.window <= 0:
+            self._wakeup.set()
+
+    def delete(self, uuid):
+        self.pending.pop(uuid, None)
+        self.deleted.add(uuid)
+        if self.window <= 0:
+            self._wakeup.set()
+
+    def flush(self):
+        if not (self.pending or self.deleted):
+            return 0
+        rows, self.pending = self.pending, {}
+        deleted, self.deleted = self.deleted, set()
+        started = time.time()
+        try:
+            self._drop_orphans(rows)
+            self._write(rows.values(), deleted)
+            written = len(rows)
+        except Exception:
+            self.stats.errors += 1
+            self.session.rollback()
+            logger.exception('error writing batch of %d rows, '
+                             'writing them one at a time', len(rows))
+            written = self._write_each(rows, deleted)
+        self.stats.record(written, time.time() - started)
+        return written
+
+    def _drop_orphans(self, rows):
+        partial = [uuid for uuid, row in rows.iteritems()
+                   if not _required.issubset(row)]
+        if not partial:
+            return
+        query = self.session.query(db.Process.uuid).filter(
+            db.Process.uuid.in_(partial))
+        stored = set(uuid for uuid, in query)
+        for uuid in partial:
+            if uuid not in stored:
+                del rows[uuid]
+                self.stats.orphans += 1
+                if self.on_orphan is not None:
+                    self.on_orphan(uuid)
+
+    def _write(self, rows, deleted):
+        if deleted:
+            query = self.session.query(db.Process)
+            query.filter(db.Process.uuid.in_(deleted)).delete(
+                synchronize_session=False)
+        for row in rows:
+            self.session.merge(db.Process(**row))
+        self.session.commit()
+
+    def _write_each(self, rows, deleted):
+        written = 0
+        if deleted:
+            try:
+                self._write((), deleted)
+            except Exception, e:
+                self.session.rollback()
+                self.stats.dropped += len(deleted)
+                logger.warning('dropped %d deletes: %s', len(deleted), e)
+        for uuid, row in rows.iteritems():
+            one = {uuid: row}
+            try:
+                self._drop_orphans(one)
+                self._write(one.values(), ())
+                written += len(one)
+            except Exception, e:
+                self.session.rollback()
+                self.stats.dropped += 1
+                logger.warning('dropped row %s: %s', uuid, e)
+        return written
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.window or None)
+            self._wakeup.clear()
+            self.flush()
@@ -19,15 +19,26 @@ setup(name='nerve',
         cliff
         sqlalchemy
         """,
+      extras_require={
+        'msgpack': ['msgpack>=0.5.2'],
+        'numpy': ['numpy'],
+        },
       entry_points={
         'console_scripts': """
         nrvsh = nerve.nrvsh:main
         nrv-center = nerve.center:main
         nrv-open = nerve.process:main
+        nrv-agent = nerve.agent:main
+        nrv-log = nerve.eventlog:main
       """,
         'nrv.commands': """
         ps = nerve.ps:Ps
         kill = nerve.kill:Kill
+        tail = nerve.tail:Tail
+        watch = nerve.watch:Watch
+        history = nerve.history:History
+        aggregate = nerve.aggregate:Aggregate
+        stats = nerve.stats:Stats
       """
         },
 
@@ -0,0 +1,109 @@
+"""
+Tests for the agent's program config and message routing
+"""
+import unittest
+from ConfigParser import ConfigParser
+from StringIO import StringIO
+
+from nerve.agent import Agent, Link, read_programs
+
+
+CONFIG = """
+[agent]
+endpoint = ipc://center.sock
+
+[program:web]
+command = python -m SimpleHTTPServer 8000
+autorestart = unexpected
+exitcodes = 0,1
+fields = cpu_percent,memory_rss
+
+[program:worker]
+command = sleep 100
+"""
+
+
+class TestReadPrograms(unittest.TestCase):
+
+    def read(self, text):
+        config = ConfigParser()
+        config.readfp(StringIO(text))
+        return sorted(read_programs(config))
+
+    def test_programs(self):
+        (web, web_kw), (sleep, sleep_kw) = self.read(CONFIG)
+        self.assertEqual(web, ['python', '-m', 'SimpleHTTPServer', '8000'])
+        self.assertEqual(web_kw['nrv_autorestart'], 'unexpected')
+        self.assertEqual(web_kw['nrv_exitcodes'], [0, 1])
+        self.assertEqual(web_kw['nrv_sample_fields'], ['cpu_percent', 'memory_rss'])
+        self.assertEqual(sleep, ['sleep', '100'])
+        self.assertEqual(sleep_kw['nrv_autorestart'], False)
+        self.assertTrue('nrv_sample_fields' not in sleep_kw)
+
+    def test_no_command(self):
+        self.assertRaises(ValueError, self.read, '[program:x]\ncwd = /tmp\n')
+
+
+class Done(Exception):
+    pass
+
+
+class FakeSocket(object):
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    def recv_multipart(self):
+        if not self.messages:
+            raise Done()
+        return self.messages.pop(0)
+
+
+class FakeProcess(object):
+
+    def __init__(self, uuid):
+        self.uuid = uuid
+
+
+class TestRouting(unittest.TestCase):
+
+    def setUp(self):
+        self.agent = Agent([], 'inproc://agent-test')
+        self.io = self.agent.io
+        self.links = {}
+        for uuid in 'abc':
+            link = self.links[uuid] = Link(self.agent)
+            link.process = FakeProcess(uuid)
+            self.agent.links.add(link)
+
+    def tearDown(self):
+        self.io.close()
+        self.agent.context.term()
+
+    def route(self, *messages):
+        self.agent.io = FakeSocket(messages)
+        self.assertRaises(Done, self.agent._read)
+        return dict((uuid, [link.inbox.get() for _ in xrange(link.inbox.qsize())])
+                    for uuid, link in self.links.iteritems())
+
+    def test_targeted(self):
+        center = ['', 'center', 'info', 'a']
+        kill = ['', 'kill', 'sig', 'b', 'c']
+        inboxes = self.route(center, kill)
+        self.assertEqual(inboxes, dict(a=[center], b=[kill], c=[kill]))
+
+    def test_untargeted(self):
+        flush = ['', 'flush', '']
+        inboxes = self.route(flush)
+        self.assertEqual(inboxes, dict(a=[flush], b=[flush], c=[flush]))
+
+    def test_restarted(self):
+        self.route(['', 'center', 'info', 'a'])
+        self.links['a'].process.uuid = 'd'
+        old, new = ['', 'keyframe', '', 'a'], ['', 'keyframe', '', 'd']
+        inboxes = self.route(old, new)
+        self.assertEqual(inboxes, dict(a=[new], b=[], c=[]))
+
+
+if __name__ == '__main__':
+    unittest.main()
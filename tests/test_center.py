@@ -0,0 +1,239 @@
+"""
+Tests for the center's handling of watcher reports
+"""
+import gevent
+import unittest
+import zmq.green as zmq
+from StringIO import StringIO
+from itertools import count
+
+from sqlalchemy.orm import sessionmaker
+
+from nerve import codec, db
+from nerve.center import Center
+from nerve.eventlog import TextLog
+from nerve.table import ProcessTable
+from nerve.wheel import TimerWheel
+
+
+class Done(Exception):
+    pass
+
+
+class FakeRouter(object):
+    """
+    Gives the center `messages` to read, then stops it, and keeps what
+    it sends in `sent`.
+    """
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+
+    def recv_multipart(self, flags=0):
+        if self.messages:
+            return self.messages.pop(0)
+        if flags:
+            raise zmq.Again()
+        raise Done()
+
+    def send_multipart(self, frames):
+        self.sent.append(frames)
+
+
+class CenterTest(unittest.TestCase):
+
+    ids = count()
+
+    def setUp(self):
+        point = lambda kind: 'inproc://center-%s-%d' % (kind, next(self.ids))
+        self.logfile = TextLog(StringIO())
+        self.center = Center(self.session(), 'center', point('router'),
+                             point('control'), point('sync'), None, self.logfile,
+                             table=self.table(), history_series=0)
+
+    def session(self):
+        return None
+
+    def table(self):
+        return ProcessTable()
+
+    def tearDown(self):
+        self.logfile.close()
+        self.center.context.destroy(linger=0)
+
+    def read(self, *messages):
+        self.center.router = FakeRouter(messages)
+        self.assertRaises(Done, self.center._read_router)
+        return self.center.router.sent
+
+    def report(self, cmd, data):
+        return ['watcher', '', 'process', cmd, codec.dumps(data)]
+
+    def invalid(self):
+        return self.center.metrics.counters.get('router.invalid')
+
+
+class TestRouter(CenterTest):
+
+    def test_bad_raw_frames(self):
+        self.read(['watcher', '', 'process', 'out', 'a', 'x', 'y'],
+                  ['watcher', '', 'process', 'out', 'a'],
+                  ['watcher', '', 'process', 'out', 'a', 'hi\n'])
+        self.assertEqual(self.invalid(), 2)
+        self.assertNotEqual(self.center.output.get('a', 'out'), None)
+
+    def test_bad_report(self):
+        # decodes, but has no uuid
+        self.read(self.report('ping', dict(state_name='RUNNING')),
+                  self.report('ping', dict(uuid='a', state_name='RUNNING')))
+        self.assertEqual(self.invalid(), 1)
+        self.assertEqual(self.center.known, {'a': 'RUNNING'})
+
+
+class TestLoad(CenterTest):
+
+    def test_max_interval(self):
+        reply = codec.loads(self.center.center_reply)
+        self.assertEqual(reply, dict(name='center', interval=0, max_interval=10))
+        self.center.lost_after = 0
+        reply = codec.loads(self.center._center_reply())
+        self.assertEqual(reply['max_interval'], None)
+
+
+class TestDelta(CenterTest):
+
+    def running(self, **kw):
+        row = dict(uuid='a', state=20, state_name='RUNNING', cpu_percent=1.0)
+        row.update(kw)
+        return row
+
+    def stored(self):
+        return self.center._row('a')
+
+    def test_unknown_uuid(self):
+        sent = self.read(self.report('delta', dict(uuid='a', cpu_percent=2.0)))
+        self.assertEqual(sent, [['watcher', '', 'keyframe', '', 'a']])
+        self.assertEqual(self.stored(), None)
+
+    def test_delta(self):
+        sent = self.read(self.report('ping', self.running()),
+                         self.report('delta', dict(uuid='a', cpu_percent=2.0)))
+        # replies name the process, for agents sharing a connection
+        reply = ['watcher', '', 'center', self.center.center_reply, 'a']
+        self.assertEqual(sent, [reply, reply])
+        row = self.stored()
+        self.assertEqual((row['state_name'], row['cpu_percent']), ('RUNNING', 2.0))
+
+    def test_lost_then_delta(self):
+        self.center.lost_after = .01
+        self.center.deadlines = TimerWheel(tick=.01)
+        self.read(self.report('ping', self.running()))
+        expire = gevent.spawn(self.center._expire_lost)
+        gevent.sleep(.05)
+        expire.kill()
+        self.assertEqual(self.stored()['state_name'], 'UNKNOWN')
+
+        # the delta leaves out the state, which has not changed for
+        # the watcher, so the center asks for a full record
+        sent = self.read(self.report('delta', dict(uuid='a', cpu_percent=2.0)))
+        self.assertEqual(sent, [['watcher', '', 'keyframe', '', 'a']])
+        self.read(self.report('ping', self.running(cpu_percent=2.0)))
+        self.assertEqual(self.stored()['state_name'], 'RUNNING')
+        self.assertEqual(self.center.known['a'], 'RUNNING')
+
+
+class TestSQLDelta(TestDelta):
+    """
+    The same with rows written behind to the database.
+    """
+
+    def session(self):
+        db.setup()
+        db.create_all()
+        self.db = sessionmaker(bind=db.engine)()
+        return self.db
+
+    def table(self):
+        return None
+
+    def tearDown(self):
+        self.db.query(db.Process).delete()
+        self.db.commit()
+        CenterTest.tearDown(self)
+
+    def stored(self):
+        self.center.writebehind.flush()
+        self.db.expire_all()
+        return self.center._row('a')
+
+    def test_orphan(self):
+        self.read(self.report('ping', self.running()))
+        self.stored()
+        # the row is gone from the database, as when its batch was lost
+        self.db.query(db.Process).delete()
+        self.db.commit()
+        self.read(self.report('delta', dict(uuid='a', cpu_percent=2.0)))
+        self.assertEqual(self.stored(), None)
+        self.assertEqual(self.center.writebehind.stats.orphans, 1)
+        sent = self.read(self.report('delta', dict(uuid='a', cpu_percent=3.0)))
+        self.assertEqual(sent, [['watcher', '', 'keyframe', '', 'a']])
+        self.read(self.report('ping', self.running(cpu_percent=3.0)))
+        self.assertEqual(self.stored()['state_name'], 'RUNNING')
+
+
+class TestKill(CenterTest):
+
+    def setUp(self):
+        CenterTest.setUp(self)
+        self.read(*[['watcher%d' % w, '', 'process', 'ping',
+                     codec.dumps(dict(uuid=uuid, state=20, state_name='RUNNING'))]
+                    for w, uuid in ((1, 'a'), (1, 'b'), (2, 'c'))])
+        self.replies = []
+
+    def kill(self, uuids, timeout=1):
+        self.center.router = FakeRouter([])
+        response = self.center._control_kill((uuids, None, 15, timeout),
+                                             self.replies.append)
+        sent = sorted(f[:4] + sorted(f[4:]) for f in self.center.router.sent)
+        return response, sent
+
+    def ack(self, uuid, error=None):
+        self.read(self.report('ack', [uuid, 'kill', error]))
+
+    def test_batches(self):
+        response, sent = self.kill(['a', 'b', 'c'])
+        sig = codec.dumps(15)
+        # one message per watcher connection
+        self.assertEqual(sent, [['watcher1', '', 'kill', sig, 'a', 'b'],
+                                ['watcher2', '', 'kill', sig, 'c']])
+        self.ack('a')
+        self.ack('c', 'No such process')
+        gevent.sleep(0)
+        self.assertEqual(self.replies, [])
+        self.ack('b')
+        gevent.sleep(0)
+        self.assertEqual(self.replies, [dict(a='ok', b='ok', c='No such process')])
+        self.assertEqual(self.center.acks, {})
+
+    def test_unknown(self):
+        response, sent = self.kill(['x', 'y'])
+        self.assertEqual((response, sent), (dict(x='unknown', y='unknown'), []))
+        response, sent = self.kill(['a', 'x'])
+        self.ack('a')
+        gevent.sleep(0)
+        self.assertEqual(self.replies, [dict(a='ok', x='unknown')])
+
+    def test_timeout(self):
+        self.kill(['a', 'c'], timeout=.01)
+        self.ack('a')
+        gevent.sleep(.05)
+        self.assertEqual(self.replies, [dict(a='ok', c='timeout')])
+        self.assertEqual(self.center.acks, {})
+        # a late ack is ignored
+        self.ack('c')
+        self.assertEqual(len(self.replies), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+"""
+Tests for the monotonic clock
+"""
+import sys
+import time
+import unittest
+
+from nerve import clock
+from nerve.clock import monotonic
+
+
+class TestMonotonic(unittest.TestCase):
+
+    def test_advances(self):
+        first = monotonic()
+        time.sleep(.01)
+        second = monotonic()
+        self.assertTrue(second - first >= .009)
+        self.assertTrue(second - first < 1)
+
+    def test_platforms(self):
+        self.assertEqual(clock._load('plan9'), None)
+        if sys.platform.startswith('linux'):
+            now = clock._load('linux')()
+            # CLOCK_MONOTONIC, not the wall clock
+            self.assertTrue(abs(now - clock._load('linux')()) < 1)
+            self.assertTrue(abs(now - time.time()) > 1)
@@ -0,0 +1,54 @@
+"""
+Round trip tests for the wire codecs
+"""
+import unittest
+from datetime import datetime
+
+from nerve import codec
+
+
+class TestCodec(unittest.TestCase):
+
+    value = dict(uuid='abc', state=20, cpu_percent=1.5, is_running=True,
+                 ping_time=datetime(2013, 1, 2, 3, 4, 5, 678),
+                 cmdline=u'caf\xe9', big=2 ** 70, none=None,
+                 rows=[(1, 'x' * 300), ('uuid', False)])
+
+    def test_round_trip(self):
+        for name in codec.available():
+            data = codec.dumps(self.value, name)
+            self.assertEqual(codec.name_of(data), name)
+            self.assertEqual(codec.loads(data), self.value)
+
+    def test_field_names_are_compact(self):
+        data = codec.dumps({'memory_percent': 1})
+        self.assertTrue('memory_percent' not in data)
+
+    def test_refuse(self):
+        data = codec.dumps(self.value, 'pickle')
+        self.assertRaises(codec.CodecError, codec.loads, data, codec.SAFE)
+        self.assertRaises(codec.CodecError, codec.loads, 'x')
+        self.assertRaises(codec.CodecError, codec.loads,
+                          codec.dumps([1, 2])[:-3])
+
+    def test_versions(self):
+        data = codec.dumps({'restarts': 1})
+        self.assertEqual(ord(data[1]), 2)
+        # version 1 payloads use a prefix of the fields
+        old = data[0] + chr(1) + codec.dumps({'uptime': 1.0})[2:]
+        self.assertEqual(codec.loads(old), {'uptime': 1.0})
+        self.assertRaises(codec.CodecError, codec.loads, data[0] + chr(3) + data[2:])
+
+    @unittest.skipUnless(codec.msgpack, 'needs msgpack')
+    def test_msgpack_versions(self):
+        data = codec.dumps(self.value, 'msgpack')
+        self.assertEqual(ord(data[1]), 2)
+        # version 1 sent strings raw, they decode to str
+        msgpack = codec.msgpack
+        old = data[:1] + chr(1) + msgpack.packb(dict(cmdline='x'), use_bin_type=False)
+        self.assertEqual(codec.loads(old), dict(cmdline='x'))
+
+    def test_exception(self):
+        error = codec.loads(codec.dumps(NameError('no such command x')))
+        self.assertTrue(isinstance(error, codec.RemoteError))
+        self.assertEqual(error.name, 'NameError')
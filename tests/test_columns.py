@@ -0,0 +1,109 @@
+"""
+Tests for columnar rollups
+"""
+import unittest
+
+from nerve import columns
+from nerve.columns import Snapshot, merge, partials
+
+
+ROWS = [
+    ('c1', 'bob', 10.0, 100),
+    ('c1', 'bob', 30.0, 300),
+    ('c1', 'sue', 50.0, None),
+    ('c2', 'bob', 70.0, 700),
+    ('c2', None, 90.0, 900),
+    ]
+NAMES = ('center', 'username', 'cpu_percent', 'memory_rss')
+
+
+class TestRollup(unittest.TestCase):
+
+    use_numpy = False
+
+    def setUp(self):
+        self.snapshot = Snapshot(NAMES, ROWS, use_numpy=self.use_numpy)
+
+    def rollup(self, *args, **kwargs):
+        keys, rows = self.snapshot.rollup(*args, **kwargs)
+        return keys, sorted(rows)
+
+    def test_group(self):
+        keys, rows = self.rollup(('username',), [('count', None),
+                                                 ('sum', 'memory_rss'),
+                                                 ('avg', 'cpu_percent')])
+        self.assertEqual(keys, ['username', 'count(*)', 'sum(memory_rss)',
+                                'avg(cpu_percent)'])
+        self.assertEqual(rows, [(None, 1, 900, 90), ('bob', 3, 1100, 110 / 3.0),
+                                ('sue', 1, None, 50)])
+
+    def test_two_columns(self):
+        keys, rows = self.rollup(('center', 'username'), [('max', 'cpu_percent')],
+                                 where=[('cpu_percent', '>', 20)])
+        self.assertEqual(rows, [('c1', 'bob', 30), ('c1', 'sue', 50),
+                                ('c2', None, 90), ('c2', 'bob', 70)])
+
+    def test_top(self):
+        keys, rows = self.snapshot.rollup(
+            ('center',), [('count', 'memory_rss'), ('min', 'cpu_percent')],
+            order=1, limit=1)
+        self.assertEqual(rows, [('c2', 2, 70)])
+
+    def test_where_missing(self):
+        keys, rows = self.rollup((), [('count', None)],
+                                 where=[('username', '!=', 'bob')])
+        self.assertEqual(rows, [(1,)])
+        keys, rows = self.rollup((), [('count', None)],
+                                 where=[('username', 'in', ['bob', 'sue'])])
+        self.assertEqual(rows, [(4,)])
+
+    def test_missing_number_keys(self):
+        snapshot = Snapshot(('pid', 'cpu_percent'), [(3, 5.0), (None, 1.0), (None, 2.0)],
+                            use_numpy=self.use_numpy)
+        keys, rows = snapshot.rollup(('pid',), [('count', None), ('sum', 'cpu_percent')])
+        self.assertEqual(sorted(rows), [(None, 2, 3.0), (3, 1, 5.0)])
+        self.assertEqual([type(r[0]) for r in sorted(rows)], [type(None), int])
+
+    def test_merge_missing_keys(self):
+        aggregates = [('count', None)]
+        results = [Snapshot(NAMES, rows, use_numpy=self.use_numpy).rollup(
+                       ('memory_rss',), aggregates)
+                   for rows in (ROWS[:3], ROWS[2:])]
+        keys, rows = merge(('memory_rss',), aggregates, results)
+        self.assertEqual(sorted(rows), [(None, 2), (100, 1), (300, 1), (700, 1),
+                                        (900, 1)])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, self.snapshot.rollup, (), [('median', 'pid')])
+        self.assertRaises(ValueError, self.snapshot.rollup, (), [('sum', None)])
+        self.assertRaises(ValueError, self.snapshot.rollup, (), [('sum', 'center')])
+
+
+class TestMerge(unittest.TestCase):
+
+    def test_partials(self):
+        self.assertEqual(partials([('avg', 'pid'), ('count', 'pid'), ('max', 'pid')]),
+                         [('sum', 'pid'), ('count', 'pid'), ('max', 'pid')])
+
+    def test_merge(self):
+        group_by = ('username',)
+        aggregates = [('count', None), ('avg', 'cpu_percent'), ('max', 'memory_rss')]
+        parts = partials(aggregates)
+        results = [Snapshot(NAMES, rows, use_numpy=False).rollup(group_by, parts)
+                   for rows in (ROWS[:2], ROWS[2:4], ROWS[4:])]
+        whole = Snapshot(NAMES, ROWS, use_numpy=False).rollup(group_by, aggregates)
+        keys, rows = merge(group_by, aggregates, results)
+        self.assertEqual(keys, whole[0])
+        self.assertEqual(sorted(rows), sorted(whole[1]))
+
+    def test_merge_top(self):
+        aggregates = [('sum', 'memory_rss')]
+        results = [Snapshot(NAMES, rows, use_numpy=False).rollup(('center',), aggregates)
+                   for rows in (ROWS[:3], ROWS[3:])]
+        keys, rows = merge(('center',), aggregates, results, order=0, limit=1)
+        self.assertEqual(rows, [('c2', 1600)])
+
+
+if columns.numpy is not None:
+    class TestNumpyRollup(TestRollup):
+        use_numpy = True
@@ -0,0 +1,81 @@
+"""
+Tests for the cached nrvsh command index
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from nerve import commands
+from nerve.commands import EntryPoint
+
+
+class TestIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cache', 'nrv.commands.json')
+        self.scans = 0
+        self.times = [['/lib', 1.0]]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def scan(self, namespace):
+        self.scans += 1
+        return {'ps': 'nerve.ps:Ps'}
+
+    def index(self):
+        return commands.index('nrv.commands', self.path, self.scan,
+                              lambda: self.times)
+
+    def test_cached(self):
+        self.assertEqual(self.index(), {'ps': 'nerve.ps:Ps'})
+        self.assertEqual(self.index(), {'ps': 'nerve.ps:Ps'})
+        self.assertEqual(self.scans, 1)
+
+    def test_stale(self):
+        self.index()
+        self.times = [['/lib', 2.0]]
+        self.index()
+        self.assertEqual(self.scans, 2)
+
+    def test_refresh(self):
+        self.index()
+        commands.index('nrv.commands', self.path, self.scan,
+                       lambda: self.times, refresh=True)
+        self.assertEqual(self.scans, 2)
+        self.index()
+        self.assertEqual(self.scans, 2)
+
+    def test_corrupt(self):
+        self.index()
+        with open(self.path, 'w') as f:
+            f.write('{')
+        self.assertEqual(self.index(), {'ps': 'nerve.ps:Ps'})
+        self.assertEqual(self.scans, 2)
+
+    def test_stamp(self):
+        times = commands.stamp([self.dir, os.path.join(self.dir, 'missing')])
+        self.assertEqual([entry for entry, _ in times], [self.dir])
+
+    def test_stamp_entry_points(self):
+        info = os.path.join(self.dir, 'nerve.egg-info')
+        os.mkdir(info)
+        filename = os.path.join(info, 'entry_points.txt')
+        open(filename, 'w').close()
+        os.utime(filename, (1, 1))
+        before = commands.stamp([self.dir])
+        self.assertEqual(before[1], [filename, 1])
+        # rewritten in place, the directory times do not change
+        os.utime(filename, (2, 2))
+        self.assertNotEqual(commands.stamp([self.dir]), before)
+
+
+class TestEntryPoint(unittest.TestCase):
+
+    def test_resolve(self):
+        from nerve.wheel import TimerWheel
+        entry = EntryPoint('wheel', 'nerve.wheel:TimerWheel')
+        self.assertTrue(entry.resolve() is TimerWheel)
+        self.assertTrue(entry.load(require=False) is TimerWheel)
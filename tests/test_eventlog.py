@@ -0,0 +1,62 @@
+"""
+Tests for the binary event log
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from nerve import eventlog
+
+
+class TestEventLog(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'nerve.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def events(self, path=None):
+        return [e[1:] for e in eventlog.read(path or self.path)]
+
+    def test_round_trip(self):
+        for compress in (False, True):
+            log = eventlog.EventLog(self.path, compress=compress)
+            log.write('id', 'ping', dict(uuid='a', pid=1))
+            log.write('id', 'out', ['a', 'hi\n'])
+            log.close()
+        self.assertEqual(self.events(), [
+            ('id', 'ping', dict(uuid='a', pid=1)),
+            ('id', 'out', ['a', 'hi\n']),
+            ] * 2)
+
+    def test_rotate(self):
+        log = eventlog.EventLog(self.path, max_bytes=1, backups=2,
+                                flush_interval=.01)
+        log.write('id', 'return', ['a', 0])
+        log.close()
+        self.assertEqual(self.events(self.path + '.1'),
+                         [('id', 'return', ['a', 0])])
+        self.assertEqual(self.events(), [])
+
+    def test_long_names(self):
+        log = eventlog.EventLog(self.path)
+        log.write('id' * 200, 'x' * 300, None)
+        log.close()
+        self.assertEqual(self.events(),
+                         [(('id' * 200)[:255], 'x' * 255, None)])
+
+    def test_error(self):
+        log = eventlog.EventLog(self.path)
+        log.write('id', 'ping', object()) # the codec can not encode it
+        log.write('id', 'ping', {})
+        log.close()
+        self.assertEqual((log.errors, log.dropped, log.written), (1, 2, 0))
+
+    def test_drop(self):
+        log = eventlog.EventLog(self.path, max_pending=0)
+        log.write('id', 'ping', {})
+        log.close()
+        self.assertEqual(log.dropped, 1)
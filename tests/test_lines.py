@@ -0,0 +1,46 @@
+"""
+Tests for the per process output line buffers
+"""
+import unittest
+
+from nerve.lines import LineRing, OutputStore
+
+
+class TestLineRing(unittest.TestCase):
+
+    def test_lines(self):
+        ring = LineRing()
+        ring.write('one\ntw')
+        ring.write('o\nthree\npart')
+        self.assertEqual(ring.lines(), ['one\n', 'two\n', 'three\n'])
+        self.assertEqual(ring.lines(2), ['two\n', 'three\n'])
+        self.assertEqual(ring.lines(0), [])
+        self.assertEqual(ring.seq, 3)
+
+    def test_budget(self):
+        ring = LineRing(max_bytes=10)
+        for i in range(100):
+            ring.write('line%02d\n' % i)
+        self.assertEqual(ring.lines(), ['line99\n'])
+        self.assertTrue(len(ring.data) <= 20)
+        self.assertEqual(ring.seq, 100)
+
+    def test_since(self):
+        ring = LineRing()
+        ring.write('a\nb\n')
+        seq = ring.seq
+        ring.write('c\nd\n')
+        self.assertEqual(ring.since(seq), ['c\n', 'd\n'])
+        self.assertEqual(ring.since(ring.seq), [])
+
+
+class TestOutputStore(unittest.TestCase):
+
+    def test_evict(self):
+        store = OutputStore(max_streams=2)
+        store.write('a', 'out', 'x\n')
+        store.write('b', 'out', 'y\n')
+        store.write('a', 'out', 'z\n')
+        store.write('c', 'out', 'w\n')
+        self.assertEqual(store.tail('b', 'out'), ([], 0))
+        self.assertEqual(store.tail('a', 'out', 1), (['z\n'], 2))
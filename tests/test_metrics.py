@@ -0,0 +1,51 @@
+"""
+Tests for center metrics
+"""
+import unittest
+
+from nerve.metrics import Histogram, Metrics
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_buckets(self):
+        h = Histogram(scale=1)
+        for value in xrange(100000):
+            index = h._index(value)
+            low = h._lowest(index)
+            self.assertTrue(low <= value)
+            self.assertTrue(value - low <= max(1, value / 8))
+            self.assertEqual(h._index(low), index)
+
+    def test_percentiles(self):
+        h = Histogram()
+        for ms in range(1, 1001):
+            h.record(ms / 1000.0)
+        self.assertEqual(h.count, 1000)
+        self.assertAlmostEqual(h.percentile(50), .5, delta=.5 / 8)
+        self.assertAlmostEqual(h.percentile(99), .99, delta=.99 / 8)
+        self.assertEqual(h.percentile(100), 1.0)
+        stats = h.as_dict()
+        self.assertEqual(stats['max'], 1.0)
+        self.assertEqual(stats['min'], .001)
+        self.assertAlmostEqual(stats['mean'], .5005)
+        self.assertTrue('p999' in stats)
+
+    def test_empty(self):
+        stats = Histogram().as_dict()
+        self.assertEqual(stats['count'], 0)
+        self.assertEqual(stats['p50'], None)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_metrics(self):
+        m = Metrics()
+        m.count('bad')
+        m.count('bad', 2)
+        m.time('router.ping', .002)
+        m.histogram('backlog', scale=1).record(5)
+        stats = m.as_dict()
+        self.assertEqual(stats['counters'], dict(bad=3))
+        self.assertEqual(stats['histograms']['router.ping']['count'], 1)
+        self.assertEqual(stats['histograms']['backlog']['max'], 5)
@@ -0,0 +1,66 @@
+"""
+Tests for structured process queries
+"""
+import unittest
+
+from nerve.query import QueryCache, parse_select, parse_where
+from nerve.table import ProcessTable
+
+
+class TestParse(unittest.TestCase):
+
+    def test_where(self):
+        self.assertEqual(
+            parse_where("pid = 3 and name == 'x y' and cpu_percent>=1.5"),
+            [('pid', '=', 3), ('name', '=', 'x y'), ('cpu_percent', '>=', 1.5)])
+        self.assertEqual(parse_where("username in (bob, 'sue')"),
+                         [('username', 'in', ['bob', 'sue'])])
+        self.assertEqual(parse_where(None), [])
+        self.assertRaises(ValueError, parse_where, 'pid ~ 3')
+
+    def test_select(self):
+        self.assertEqual(parse_select('uuid, pid'), ('uuid', 'pid'))
+        self.assertTrue('state_name' in parse_select('*'))
+
+
+class TestQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = QueryCache()
+        self.table = ProcessTable()
+        for uuid, center, pid, cpu in (('a', 'c1', 1, 5), ('b', 'c1', 2, 50),
+                                       ('c', 'c2', 3, 90)):
+            self.table.upsert(dict(uuid=uuid, center=center, pid=pid,
+                                   cpu_percent=cpu, username='bob'))
+
+    def run_table(self, select, where):
+        query, values = self.cache.compile(select, where)
+        keys, rows = query.run_table(self.table, values)
+        return keys, sorted(rows)
+
+    def test_table(self):
+        self.assertEqual(
+            self.run_table(('uuid',), [('center', '=', 'c1'), ('cpu_percent', '>', 10)]),
+            (['uuid'], [('b',)]))
+        self.assertEqual(
+            self.run_table(('uuid',), [('pid', 'in', [1, 3])]),
+            (['uuid'], [('a',), ('c',)]))
+
+    def test_cache(self):
+        self.run_table(('uuid',), [('pid', '=', 1)])
+        self.run_table(('uuid',), [('pid', '=', 2)])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, self.cache.compile, ('nope',), [])
+        self.assertRaises(ValueError, self.cache.compile, ('uuid',),
+                          [('pid', ';drop', 1)])
+        self.assertRaises(ValueError, self.cache.compile, ('uuid',),
+                          [('pid', 'in', 1)])
+
+    def test_sql(self):
+        query, values = self.cache.compile(
+            ('uuid',), [('pid', '<', 3), ('username', 'in', ['bob'])])
+        sql = str(query.statement)
+        self.assertTrue(':p0' in sql and ':p1_0' in sql)
+        self.assertEqual(query.params(values), dict(p0=3, p1_0='bob'))
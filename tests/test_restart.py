@@ -0,0 +1,50 @@
+"""
+Tests for the restart policy
+"""
+import unittest
+
+from nerve.restart import RestartPolicy
+
+
+class TestRestartPolicy(unittest.TestCase):
+
+    def policy(self, **kwargs):
+        kwargs.setdefault('autorestart', True)
+        kwargs.setdefault('random', lambda: 0)
+        return RestartPolicy(**kwargs)
+
+    def test_never(self):
+        policy = self.policy(autorestart=False)
+        self.assertEqual(policy.delay(1, 10, 0), None)
+
+    def test_unexpected(self):
+        policy = self.policy(autorestart='unexpected', exitcodes=(0,))
+        self.assertEqual(policy.delay(0, 10, 0), None)
+        self.assertEqual(policy.delay(1, 10, 0), 1)
+
+    def test_backoff(self):
+        policy = self.policy(retries=10, backoff=1, backoff_max=5, budget=100)
+        delays = [policy.delay(1, 0, t) for t in range(5)]
+        self.assertEqual(delays, [1, 2, 4, 5, 5])
+        self.assertEqual(policy.info(), dict(restarts=5, restart_attempts=5))
+        # a start that lasts resets the backoff
+        self.assertEqual(policy.delay(1, 10, 5), 1)
+        self.assertEqual(policy.info()['restart_attempts'], 0)
+
+    def test_retries(self):
+        policy = self.policy(retries=2)
+        self.assertNotEqual(policy.delay(1, 0, 0), None)
+        self.assertNotEqual(policy.delay(1, 0, 1), None)
+        self.assertEqual(policy.delay(1, 0, 2), None)
+
+    def test_jitter(self):
+        policy = self.policy(backoff=4, jitter=.5, random=lambda: 1)
+        self.assertEqual(policy.delay(1, 10, 0), 2)
+
+    def test_budget(self):
+        policy = self.policy(budget=2, window=60)
+        self.assertNotEqual(policy.delay(1, 10, 0), None)
+        self.assertNotEqual(policy.delay(1, 10, 30), None)
+        self.assertEqual(policy.delay(1, 10, 40), None)
+        # the first restart left the window
+        self.assertNotEqual(policy.delay(1, 10, 61), None)
@@ -0,0 +1,27 @@
+"""
+Tests for psutil sampling
+"""
+import os
+import unittest
+
+from nerve.sampler import Sampler
+
+
+class TestSampler(unittest.TestCase):
+
+    def test_fields(self):
+        sampler = Sampler(os.getpid(), ['pid', 'memory_rss', 'uid_real'])
+        data = sampler.sample()
+        self.assertEqual(sorted(data), ['memory_rss', 'pid', 'uid_real'])
+        self.assertEqual(data['pid'], os.getpid())
+        self.assertEqual(data['uid_real'], os.getuid())
+
+    def test_static_cached(self):
+        sampler = Sampler(os.getpid())
+        first = sampler.sample()
+        sampler.static['cmdline'] = 'cached'
+        self.assertEqual(sampler.sample()['cmdline'], 'cached')
+        self.assertTrue(first['memory_rss'] > 0)
+
+    def test_unknown_field(self):
+        self.assertRaises(ValueError, Sampler, os.getpid(), ['bogus'])
@@ -0,0 +1,56 @@
+"""
+Tests for shard placement
+"""
+import unittest
+
+from nerve.shard import HashRing, Partitioning
+
+
+class TestHashRing(unittest.TestCase):
+
+    def test_owners(self):
+        ring = HashRing(['a', 'b', 'c'])
+        owners = ring.owners('key', 2)
+        self.assertEqual(len(set(owners)), 2)
+        self.assertEqual(ring.owners('key', 2), owners)
+        self.assertEqual(sorted(ring.owners('key', 5)), ['a', 'b', 'c'])
+        self.assertEqual(HashRing([]).owners('key', 2), [])
+
+    def test_stable(self):
+        before = HashRing(['a', 'b', 'c'])
+        after = HashRing(['a', 'b', 'c', 'd'])
+        moved = sum(before.owners(str(k), 1) != after.owners(str(k), 1)
+                    for k in range(1000))
+        self.assertTrue(moved < 500)
+
+
+class TestPartitioning(unittest.TestCase):
+
+    def setUp(self):
+        names = ['a', 'b', 'c']
+        self.parts = dict((n, Partitioning(n, names, 64, replicas=2))
+                          for n in names)
+
+    def test_one_primary(self):
+        for p in range(64):
+            serving = [n for n, parts in self.parts.items() if parts.serves(p)]
+            self.assertEqual(len(serving), 1)
+            self.assertTrue(self.parts['a'].owns(p) or
+                            'a' not in self.parts['a'].owners(p))
+
+    def test_shared(self):
+        shared = self.parts['a'].shared('b')
+        self.assertEqual(shared, self.parts['b'].shared('a'))
+        for p in range(64):
+            owners = self.parts['a'].owners(p)
+            self.assertEqual(p in shared, 'a' in owners and 'b' in owners)
+
+    def test_failover(self):
+        # with 'a' down each of its partitions is served by one other center
+        for p in range(64):
+            serving = [n for n in ('b', 'c')
+                       if self.parts[n].serves(p, ['a'])]
+            if self.parts['b'].primary(p) == 'a':
+                self.assertEqual(len(serving), 1)
+            else:
+                self.assertEqual(serving, [])
@@ -0,0 +1,90 @@
+"""
+Tests for ring sync state
+"""
+import unittest
+
+from nerve.sync import Replica
+
+
+class TestReplica(unittest.TestCase):
+
+    def setUp(self):
+        self.a = Replica('a', buckets=16)
+        self.b = Replica('b', buckets=16)
+        self.rows = {'a': {}, 'b': {}}
+
+    def exchange(self, source, target):
+        """
+        Run one digest round from `source` to `target` and back.
+        """
+        buckets = target.diff(source.digest())
+        newer, wanted = source.compare(buckets, target.versions_in(buckets))
+        for sender, receiver, uuids in ((source, target, newer),
+                                        (target, source, wanted)):
+            rows = self.rows[sender.name]
+            entries = sender.entries(uuids, rows.get)
+            for uuid, version, row in receiver.merge(entries):
+                if row is None:
+                    self.rows[receiver.name].pop(uuid, None)
+                else:
+                    self.rows[receiver.name][uuid] = row
+
+    def update(self, replica, uuid, row):
+        self.rows[replica.name][uuid] = row
+        replica.touch(uuid)
+
+    def test_converge(self):
+        for i in range(20):
+            self.update(self.a, 'p%d' % i, dict(uuid='p%d' % i, pid=i))
+        self.update(self.b, 'q', dict(uuid='q', pid=100))
+        self.assertNotEqual(self.a.digest(), self.b.digest())
+        self.exchange(self.a, self.b)
+        self.assertEqual(self.a.digest(), self.b.digest())
+        self.assertEqual(self.rows['a'], self.rows['b'])
+        self.assertEqual(self.b.diff(self.a.digest()), [])
+
+    def test_newer_wins(self):
+        self.update(self.a, 'p', dict(uuid='p', pid=1))
+        self.exchange(self.a, self.b)
+        self.update(self.b, 'p', dict(uuid='p', pid=2))
+        self.exchange(self.a, self.b)
+        self.assertEqual(self.rows['a']['p']['pid'], 2)
+        self.assertEqual(self.b.merge([('p', [1, 'a'], dict(uuid='p'))]), [])
+
+    def test_tombstone(self):
+        self.update(self.a, 'p', dict(uuid='p', pid=1))
+        self.exchange(self.a, self.b)
+        self.a.delete('p')
+        del self.rows['a']['p']
+        self.exchange(self.b, self.a)
+        self.assertFalse('p' in self.rows['b'])
+        self.assertEqual(self.a.digest(), self.b.digest())
+        self.a.expire(now=1e12)
+        self.assertEqual(self.a.stats()['tombstones'], 0)
+        self.assertEqual(self.a.digests, [0] * 16)
+
+    def test_tombstone_time(self):
+        self.update(self.a, 'p', dict(uuid='p', pid=1))
+        self.exchange(self.a, self.b)
+        self.a.delete('p')
+        deleted = self.a.tombstones['p'][1]
+        entries = self.a.entries(['p'], self.rows['a'].get)
+        self.b.merge(entries)
+        self.assertEqual(self.b.tombstones['p'][1], deleted)
+        self.a.expire(now=deleted + 3600)
+        self.b.expire(now=deleted + 3600)
+        self.assertEqual(self.a.digest(), self.b.digest())
+        self.assertEqual(self.b.stats()['tombstones'], 0)
+
+    def test_partial_digest(self):
+        self.update(self.a, 'p', dict(uuid='p', pid=1))
+        bucket = self.a.bucket('p')
+        other = (bucket + 1) % 16
+        self.assertEqual(self.b.diff(self.a.digest([bucket, other])), [bucket])
+        self.assertEqual(self.b.diff(self.a.digest([other])), [])
+
+    def test_dirty(self):
+        self.a.touch('x')
+        self.a.touch('y')
+        self.assertEqual(sorted(self.a.take_dirty(10)), ['x', 'y'])
+        self.assertEqual(self.a.take_dirty(10), [])
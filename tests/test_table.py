@@ -0,0 +1,37 @@
+"""
+Tests for the in-memory process table
+"""
+import unittest
+
+from nerve.table import ProcessTable
+
+
+class TestProcessTable(unittest.TestCase):
+
+    def setUp(self):
+        self.table = ProcessTable()
+        self.table.upsert(dict(uuid='a', center='c1', state=20, username='bob', pid=1))
+        self.table.upsert(dict(uuid='b', center='c1', state=100, username='sue', pid=2))
+        self.table.upsert(dict(uuid='c', center='c2', state=20, username='bob', pid=3))
+
+    def test_lookup(self):
+        self.assertEqual(self.table.lookup('center', 'c1'), set(['a', 'b']))
+        self.assertEqual(self.table.lookup('state', 20), set(['a', 'c']))
+
+    def test_reindex_on_update(self):
+        self.table.upsert(dict(uuid='a', state=100))
+        self.assertEqual(self.table.lookup('state', 20), set(['c']))
+        self.assertEqual(self.table.lookup('state', 100), set(['a', 'b']))
+        self.assertEqual(self.table.get('a')['username'], 'bob')
+
+    def test_delete(self):
+        self.table.delete('a')
+        self.assertEqual(len(self.table), 2)
+        self.assertEqual(self.table.lookup('center', 'c1'), set(['b']))
+        self.assertEqual(self.table.lookup('pid', 1), set())
+
+    def test_find(self):
+        rows = self.table.find(dict(username='bob', center='c1'))
+        self.assertEqual([r['uuid'] for r in rows], ['a'])
+        self.assertEqual(list(self.table.select(('uuid', 'pid'), dict(pid=2))),
+                         [('b', 2)])
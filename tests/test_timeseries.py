@@ -0,0 +1,91 @@
+"""
+Tests for process resource history
+"""
+import unittest
+
+from nerve.timeseries import History, Tier, parse_tiers, series_bytes
+
+
+class TestTier(unittest.TestCase):
+
+    def test_slots(self):
+        tier = Tier(10, 4, ('cpu_percent',))
+        tier.add(100, dict(cpu_percent=1.0))
+        tier.add(105, dict(cpu_percent=3.0))
+        tier.add(110, dict(cpu_percent=8.0))
+        self.assertEqual(tier.points('cpu_percent', 100, 119),
+                         [(100, 2.0, 3.0, 2), (110, 8.0, 8.0, 1)])
+        # slots older than the ring are gone
+        tier.add(130, dict(cpu_percent=4.0))
+        tier.add(150, dict(cpu_percent=5.0))
+        self.assertEqual(tier.points('cpu_percent', 0, 159),
+                         [(130, 4.0, 4.0, 1), (150, 5.0, 5.0, 1)])
+
+    def test_grow(self):
+        tier = Tier(1, 600, ('cpu_percent',))
+        self.assertEqual(len(tier.slots), 0)
+        for t in range(1000, 1010):
+            tier.add(t, dict(cpu_percent=1.0))
+        self.assertEqual(len(tier.slots), 16)
+        self.assertEqual(len(tier.points('cpu_percent', 0, 1009)), 10)
+        # a gap grows it to the slot written
+        tier.add(1100, dict(cpu_percent=2.0))
+        self.assertEqual(len(tier.slots), 101)
+        tier.add(1599, dict(cpu_percent=3.0))
+        self.assertEqual(len(tier.slots), 600)
+        # and no further, the next slot takes the place of the first
+        tier.add(1600, dict(cpu_percent=4.0))
+        self.assertEqual(len(tier.slots), 600)
+        self.assertEqual(tier.points('cpu_percent', 1000, 1600),
+                         [(t, 1.0, 1.0, 1) for t in range(1001, 1010)] +
+                         [(1100, 2.0, 2.0, 1), (1599, 3.0, 3.0, 1),
+                          (1600, 4.0, 4.0, 1)])
+
+
+class TestHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.history = History(tiers=((1, 60), (60, 60)), max_series=2)
+
+    def test_summary(self):
+        for t in range(1000, 1100):
+            self.history.record('a', dict(cpu_percent=t - 1000), t)
+        summary = self.history.summary('a', 'cpu_percent', 20, now=1099)
+        self.assertEqual(summary['step'], 1)
+        self.assertEqual(summary['max'], 99)
+        self.assertEqual(summary['count'], 21)
+        self.assertEqual(summary['avg'], 89)
+        self.assertEqual(summary['p95'], 98)
+        # past the fine tier the coarse one answers
+        step, points = self.history.points('a', 'cpu_percent', 900, now=1099)
+        self.assertEqual(step, 60)
+        self.assertEqual(max(p[2] for p in points), 99)
+
+    def test_deltas(self):
+        self.history.record('a', dict(cpu_percent=5, memory_rss=10), 1000)
+        self.history.record('a', dict(cpu_percent=7), 1001)
+        step, points = self.history.points('a', 'memory_rss', 999, now=1001)
+        self.assertEqual([p[1] for p in points], [10, 10])
+
+    def test_evict(self):
+        for uuid in 'abc':
+            self.history.record(uuid, dict(cpu_percent=1), 1000)
+        # full of live series, the new one is turned away
+        self.assertEqual(len(self.history), 2)
+        self.assertEqual(self.history.refused, 1)
+        self.assertRaises(KeyError, self.history.points, 'c', 'cpu_percent', 0)
+        self.history.record('b', dict(cpu_percent=1), 1050)
+        # 'a' has been idle for the span of the fine tier
+        self.history.record('c', dict(cpu_percent=1), 1060)
+        self.assertEqual(sorted(self.history.series), ['b', 'c'])
+        self.assertRaises(KeyError, self.history.points, 'a', 'cpu_percent', 0)
+        self.assertRaises(ValueError, self.history.points, 'b', 'nope', 0)
+
+    def test_max_bytes(self):
+        tiers = ((1, 60), (60, 60))
+        history = History(tiers=tiers, max_bytes=series_bytes(tiers=tiers) * 3)
+        self.assertEqual(history.max_series, 3)
+        self.assertEqual(series_bytes(), 2040 * 8 * 12)
+
+    def test_parse(self):
+        self.assertEqual(parse_tiers('1x600,60x1440'), ((1, 600), (60, 1440)))
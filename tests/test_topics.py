@@ -0,0 +1,30 @@
+"""
+Tests for watch topics
+"""
+import unittest
+
+from nerve import topics
+
+
+class TestTopics(unittest.TestCase):
+
+    def test_topic(self):
+        t = topics.topic('state', 'c1', 'RUNNING', 'abc')
+        self.assertEqual(t, 'state:c1:RUNNING:abc')
+        self.assertEqual(topics.split(t)['uuid'], 'abc')
+        self.assertEqual(topics.topic('return', 'c1', None, 'abc'),
+                         'return:c1::abc')
+
+    def test_subscriptions(self):
+        self.assertEqual(topics.subscriptions('state', 'c1'), ['state:c1:'])
+        self.assertEqual(topics.subscriptions('state', 'c1', 'RUNNING', 'abc'),
+                         ['state:c1:RUNNING:abc'])
+        self.assertEqual(topics.subscriptions(center='c1'),
+                         [k + ':c1:' for k in topics.kinds])
+        self.assertEqual(topics.subscriptions(), [k + ':' for k in topics.kinds])
+
+    def test_matches(self):
+        t = topics.topic('state', 'c1', 'RUNNING', 'abc')
+        self.assertTrue(topics.matches(t, kind=None, uuid='abc'))
+        self.assertFalse(topics.matches(t, uuid='abd'))
+        self.assertFalse(topics.matches(t, center='c2', uuid='abc'))
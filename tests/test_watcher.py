@@ -0,0 +1,160 @@
+"""
+Tests for the reports a process watcher sends its center
+"""
+import gevent
+import signal
+import subprocess
+import unittest
+from gevent.event import Event
+
+from nerve import codec
+from nerve.process import Process
+from nerve.states import state
+
+
+class Done(Exception):
+    pass
+
+
+class FakeLink(object):
+    """
+    Stands in for the watcher's connection, giving it `messages` and
+    keeping what it sends.
+    """
+    closed = False
+
+    def __init__(self):
+        self.messages = []
+        self.sent = []
+
+    def send_multipart(self, frames, **kwargs):
+        empty, typ, cmd, data = frames
+        self.sent.append((cmd, codec.loads(data)))
+
+    def recv_multipart(self):
+        if not self.messages:
+            raise Done()
+        return self.messages.pop(0)
+
+
+class WatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.link = FakeLink()
+        self.process = Process(['true'], nrv_link=self.link, nrv_keyframe_interval=2)
+        self.process.uuid = 'a'
+
+    def receive(self, *messages):
+        self.link.messages.extend(messages)
+        self.assertRaises(Done, self.process._write_stdin)
+
+    def info(self, **kw):
+        info = dict(uuid='a', state=20, state_name='RUNNING', cpu_percent=1.0,
+                    memory_rss=100)
+        info.update(kw)
+        return info
+
+
+class TestDelta(WatcherTest):
+
+    def test_keyframes(self):
+        report = self.process._report_delta
+        report(self.info())
+        report(self.info(cpu_percent=2.0))
+        report(self.info(cpu_percent=2.0))
+        report(self.info(cpu_percent=3.0))
+        self.assertEqual(self.link.sent, [
+            ('ping', self.info()),
+            ('delta', dict(uuid='a', cpu_percent=2.0)),
+            ('delta', dict(uuid='a')),
+            # after keyframe_interval deltas, a full record
+            ('ping', self.info(cpu_percent=3.0)),
+            ])
+
+    def test_keyframe_request(self):
+        self.process._report_delta(self.info())
+        # the center has no base row, the next report is in full
+        self.receive(['', 'keyframe', '', 'a'])
+        self.process._report_delta(self.info(memory_rss=200))
+        self.assertEqual(self.link.sent[-1], ('ping', self.info(memory_rss=200)))
+
+
+class TestKill(WatcherTest):
+
+    def test_kill(self):
+        self.process.process = child = subprocess.Popen(['sleep', '10'])
+        sig = codec.dumps(signal.SIGTERM)
+        self.receive(['', 'kill', sig, 'b'], ['', 'kill', sig, 'c', 'a'])
+        self.assertEqual(child.wait(), -signal.SIGTERM)
+        self.assertEqual(self.link.sent, [('ack', ['a', 'kill', None])])
+
+    def test_error(self):
+        self.process.process = child = subprocess.Popen(['true'])
+        child.wait()
+        self.receive(['', 'kill', codec.dumps(signal.SIGTERM), 'a'])
+        (cmd, (uuid, _, error)), = self.link.sent
+        self.assertEqual((cmd, uuid), ('ack', 'a'))
+        self.assertTrue(error)
+
+
+class TestInterval(WatcherTest):
+
+    def setUp(self):
+        WatcherTest.setUp(self)
+        self.process.ping_interval = self.process.next_ping = 1
+        self.process.ping_interval_max = 8
+
+    def test_back_off(self):
+        waits = []
+        for _ in xrange(5):
+            self.process._ping(self.info())
+            waits.append(self.process._ping_wait())
+        self.assertEqual(waits, [1, 2, 4, 8, 8])
+
+    def test_change(self):
+        for _ in xrange(3):
+            self.process._ping(self.info())
+        self.assertEqual(self.process._ping_wait(), 4)
+        # a small move is not news, a big one is
+        self.process._ping(self.info(cpu_percent=1.1))
+        self.assertEqual(self.process._ping_wait(), 8)
+        self.process._ping(self.info(cpu_percent=2.0))
+        self.assertEqual(self.process._ping_wait(), 1)
+        # and so is a state change, reported at once
+        self.process._ping(self.info(cpu_percent=2.0))
+        self.process._report('state', self.info(state=100, state_name='EXITED'))
+        self.assertEqual(self.process._ping_wait(), 1)
+
+    def center(self, **info):
+        info.setdefault('name', 'center')
+        self.receive(['', 'center', codec.dumps(info), 'a'])
+
+    def test_center_bounds(self):
+        self.center(interval=2, max_interval=5)
+        self.assertEqual(self.process._ping_wait(), 2)
+        for _ in xrange(4):
+            self.process._ping(self.info())
+        # backed off to 8, but the center marks it lost after 15
+        self.assertEqual(self.process._ping_wait(), 5)
+        # older centers send neither
+        self.center()
+        self.assertEqual(self.process._ping_wait(), 8)
+
+
+class TestWaiting(unittest.TestCase):
+
+    def test_no_args(self):
+        link = FakeLink()
+        link.recv_multipart = Event().wait
+        process = Process(nrv_link=link)
+        running = gevent.spawn(process.start)
+        gevent.sleep(.01)
+        try:
+            self.assertFalse(running.ready())
+            self.assertEqual(process.state, state.WAITING)
+        finally:
+            running.kill()
+
+
+if __name__ == '__main__':
+    unittest.main()
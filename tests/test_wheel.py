@@ -0,0 +1,40 @@
+"""
+Tests for the timer wheel
+"""
+import unittest
+
+from nerve.wheel import TimerWheel
+
+
+class TestTimerWheel(unittest.TestCase):
+
+    def setUp(self):
+        self.wheel = TimerWheel(tick=1.0, slots=8, now=100)
+
+    def test_expire(self):
+        self.wheel.schedule('a', 103)
+        self.wheel.schedule('b', 105)
+        self.assertEqual(self.wheel.advance(102), [])
+        self.assertEqual(self.wheel.advance(103), ['a'])
+        self.assertEqual(self.wheel.advance(110), ['b'])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_reschedule(self):
+        self.wheel.schedule('a', 103)
+        self.wheel.schedule('a', 106)
+        self.assertEqual(self.wheel.advance(104), [])
+        self.assertEqual(self.wheel.advance(106), ['a'])
+
+    def test_cancel(self):
+        self.wheel.schedule('a', 103)
+        self.wheel.cancel('a')
+        self.assertFalse('a' in self.wheel)
+        self.assertEqual(self.wheel.advance(110), [])
+
+    def test_rounds(self):
+        # past the wheel size, keys share slots with nearer deadlines
+        self.wheel.schedule('far', 120)
+        self.wheel.schedule('near', 104)
+        self.assertEqual(self.wheel.advance(115), ['near'])
+        self.assertEqual(self.wheel.advance(119), [])
+        self.assertEqual(self.wheel.advance(150), ['far'])
@@ -0,0 +1,74 @@
+"""
+Tests for the coalescing row writer
+"""
+import unittest
+from sqlalchemy.orm import sessionmaker
+
+from nerve import db
+from nerve.writebehind import WriteBehind
+
+
+class TestWriteBehind(unittest.TestCase):
+
+    def setUp(self):
+        db.setup()
+        db.create_all()
+        self.session = sessionmaker(bind=db.engine)()
+        self.wb = WriteBehind(self.session, window=10, size=100)
+
+    def tearDown(self):
+        self.session.query(db.Process).delete()
+        self.session.commit()
+
+    def row(self, uuid, **kw):
+        row = dict(uuid=uuid, state=20, state_name='RUNNING')
+        row.update(kw)
+        return row
+
+    def test_coalesce(self):
+        self.wb.add(self.row('a', cpu_percent=1))
+        self.wb.add(self.row('a', cpu_percent=2))
+        self.wb.add(self.row('b'))
+        self.assertEqual(self.wb.flush(), 2)
+        a = self.session.query(db.Process).get('a')
+        self.assertEqual(a.cpu_percent, 2)
+        stats = self.wb.stats.as_dict()
+        self.assertEqual(stats['coalesced'], 1)
+        self.assertEqual(stats['last_size'], 2)
+
+    def test_delete(self):
+        self.wb.add(self.row('a'))
+        self.wb.flush()
+        self.wb.add(self.row('a', cpu_percent=3))
+        self.wb.delete('a')
+        self.assertEqual(self.wb.pending, {})
+        self.wb.flush()
+        self.assertEqual(self.session.query(db.Process).count(), 0)
+
+    def test_delta(self):
+        self.wb.add(self.row('a', cpu_percent=1))
+        self.wb.flush()
+        self.wb.add(dict(uuid='a', cpu_percent=5))
+        self.assertEqual(self.wb.flush(), 1)
+        self.session.expire_all()
+        a = self.session.query(db.Process).get('a')
+        self.assertEqual((a.state_name, a.cpu_percent), ('RUNNING', 5))
+
+    def test_orphan(self):
+        orphans = []
+        self.wb.on_orphan = orphans.append
+        self.wb.add(dict(uuid='a', cpu_percent=5))
+        self.wb.add(self.row('b'))
+        self.assertEqual(self.wb.flush(), 1)
+        self.assertEqual(orphans, ['a'])
+        self.assertEqual(self.wb.stats.as_dict()['orphans'], 1)
+        self.assertEqual([p.uuid for p in self.session.query(db.Process)], ['b'])
+
+    def test_bad_row(self):
+        self.wb.add(self.row('a', state=None))
+        self.wb.add(self.row('b'))
+        self.wb.delete('c')
+        self.assertEqual(self.wb.flush(), 1)
+        stats = self.wb.stats.as_dict()
+        self.assertEqual((stats['errors'], stats['dropped']), (1, 1))
+        self.assertEqual([p.uuid for p in self.session.query(db.Process)], ['b'])